@@ -0,0 +1,47 @@
+import json
+from functools import wraps
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+
+
+def async_api_view(http_method_names):
+    """
+    Decorator for async API views, the counterpart of DRF's api_view, which
+    only runs views synchronously.
+
+    Like api_view, the view is exempt from CSRF checks, other methods are
+    answered with 405, and a JSON request body is parsed into request.data.
+    Views return Django responses, usually JsonResponse.
+
+    Args:
+        http_method_names (list): Allowed methods, e.g. ['POST']
+    """
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            if request.method not in http_method_names:
+                response = JsonResponse(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED
+                )
+                response['Allow'] = ', '.join(http_method_names)
+                return response
+
+            try:
+                data = json.loads(request.body) if request.body else {}
+            except ValueError as e:
+                return JsonResponse(
+                    {'detail': f'JSON parse error - {str(e)}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if not isinstance(data, dict):
+                return JsonResponse(
+                    {'error': 'Request body must be a JSON object'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            request.data = data
+            return await view(request, *args, **kwargs)
+        return wrapped
+    return decorator
@@ -0,0 +1,60 @@
+import uuid
+from django.db import models
+
+
+class Job(models.Model):
+    """
+    A background job, run by the worker pool in common.jobs.
+
+    active_key identifies the work a job does (kind, repository, commit and
+    parameters) while it is queued or running, and is cleared when it
+    finishes. Its unique constraint coalesces duplicate submissions into one
+    job, across server processes.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUSES = [(status, status) for status in (QUEUED, RUNNING, SUCCEEDED, FAILED)]
+    ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=32)
+    repository = models.CharField(max_length=255)
+    commit = models.CharField(max_length=64, blank=True)
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=16, choices=STATUSES, default=QUEUED)
+    active_key = models.CharField(max_length=512, null=True, unique=True)
+    worker = models.CharField(max_length=255, blank=True)
+    progress = models.JSONField(null=True)
+    result = models.JSONField(null=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status'])]
+
+    def as_dict(self):
+        """
+        Describe the job for API responses, without its result.
+        """
+        def seconds(start, end):
+            return round((end - start).total_seconds(), 3) if start and end else None
+
+        return {
+            'id': str(self.id),
+            'kind': self.kind,
+            'repository': self.repository,
+            'commit': self.commit,
+            'params': self.params,
+            'status': self.status,
+            'progress': self.progress,
+            'error': self.error or None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'queued_seconds': seconds(self.created_at, self.started_at),
+            'run_seconds': seconds(self.started_at, self.finished_at)
+        }
@@ -0,0 +1,44 @@
+from unittest import mock
+from django.test import TestCase
+from common.llm.answer_cache import SemanticAnswerCache, answer_cache_key
+
+
+class SemanticAnswerCacheTests(TestCase):
+    def setUp(self):
+        """Create an answer cache and pin the index version of every namespace."""
+        self.cache = SemanticAnswerCache(threshold=0.98, max_entries=16)
+        self.version = 'abc@1'
+        patcher = mock.patch('common.llm.answer_cache.index_version', lambda namespace: self.version)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def key(self, model='gpt-4o-mini', temperature=0.0, prompt='system prompt', k=3):
+        return answer_cache_key('owner/repo/main', model, temperature, prompt, k)
+
+    def test_similar_prompt_hits(self):
+        """Test that a prompt above the threshold returns the stored answer."""
+        self.cache.store(self.key(), [1.0, 0.0], 'prompt', 'answer')
+        cached = self.cache.lookup(self.key(), [1.0, 0.01])
+
+        self.assertEqual(cached['answer'], 'answer')
+        self.assertIsNone(self.cache.lookup(self.key(), [1.0, 0.5]))
+
+    def test_answers_are_not_shared_across_configs(self):
+        """Test that a different model, temperature, retrieval prompt or k misses."""
+        self.cache.store(self.key(), [1.0, 0.0], 'prompt', 'answer')
+
+        for key in [self.key(model='gpt-4o'), self.key(temperature=0.7),
+                    self.key(prompt='other prompt'), self.key(k=5)]:
+            self.assertIsNone(self.cache.lookup(key, [1.0, 0.0]))
+        self.assertIsNotNone(self.cache.lookup(self.key(), [1.0, 0.0]))
+
+    def test_new_index_version_retires_answers(self):
+        """Test that storing under a new index version drops answers of the old one."""
+        old = self.key()
+        self.cache.store(old, [1.0, 0.0], 'prompt', 'answer')
+        self.cache.store(self.key(model='gpt-4o'), [1.0, 0.0], 'prompt', 'other answer')
+        self.version = 'def@2'
+        self.cache.store(self.key(), [0.0, 1.0], 'prompt', 'new answer')
+
+        self.assertIsNone(self.cache.lookup(old, [1.0, 0.0]))
+        self.assertEqual(self.cache._size, 1)
@@ -0,0 +1,123 @@
+from django.test import TestCase
+from common.llm.embeddings import count_tokens
+from common.ragindex.chunking import chunk_file
+
+PYTHON_SOURCE = '''import os
+
+
+@staticmethod
+def first(path):
+    value = os.path.abspath(path)
+    return value
+
+
+# build a greeting
+def second(name):
+    message = "hello " + name
+    return message
+
+
+class Greeter:
+    """Greets people."""
+
+    def hello(self, name):
+        return "hello " + name
+
+    def goodbye(self, name):
+        return "goodbye " + name
+'''
+
+MARKDOWN_SOURCE = '''# Title
+
+Intro paragraph.
+
+## Install
+
+```bash
+# not a heading
+pip install package
+```
+
+## Usage
+
+Run the command.
+'''
+
+
+def tokens(lines):
+    return sum(count_tokens(line + '\n') for line in lines)
+
+
+def text_lines(content, start, end):
+    return content.splitlines()[start - 1:end]
+
+
+class ChunkFileTests(TestCase):
+    def test_python_splits_on_definitions(self):
+        """Test that Python chunks start at definitions, with their comments and decorators."""
+        lines = PYTHON_SOURCE.splitlines()
+        # room for the largest definition but not for two of them
+        max_tokens = tokens(lines[15:]) + 1
+        chunks = chunk_file('module.py', PYTHON_SOURCE, max_tokens=max_tokens, overlap_tokens=0)
+
+        self.assertEqual([chunk['start_line'] for chunk in chunks], [1, 10, 16])
+        self.assertTrue(chunks[0]['text'].endswith('return value'))
+        self.assertTrue(chunks[1]['text'].startswith('# build a greeting\ndef second'))
+        for chunk in chunks:
+            self.assertLessEqual(tokens(text_lines(PYTHON_SOURCE, chunk['start_line'], chunk['end_line'])),
+                                 max_tokens)
+
+    def test_large_class_splits_on_methods(self):
+        """Test that a class too large for one chunk splits on its methods, keeping the header with the first."""
+        lines = PYTHON_SOURCE.splitlines()
+        max_tokens = tokens(lines[15:21]) + 1
+        chunks = chunk_file('module.py', PYTHON_SOURCE, max_tokens=max_tokens, overlap_tokens=0)
+
+        class_chunks = [chunk for chunk in chunks if chunk['start_line'] >= 16]
+        self.assertEqual(len(class_chunks), 2)
+        self.assertTrue(class_chunks[0]['text'].startswith('class Greeter:'))
+        self.assertIn('def hello', class_chunks[0]['text'])
+        self.assertTrue(class_chunks[1]['text'].startswith('def goodbye'))
+
+    def test_oversize_definition_splits_into_overlapping_windows(self):
+        """Test that a definition larger than max_tokens becomes bounded, overlapping line windows."""
+        body = '\n'.join(f'    value_{n} = compute({n})' for n in range(40))
+        content = f'def big():\n{body}\n    return value_0\n'
+        line_tokens = [count_tokens(line + '\n') for line in content.splitlines()]
+        max_tokens = 8 * max(line_tokens)
+        overlap_tokens = 2 * max(line_tokens)
+        chunks = chunk_file('big.py', content, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(chunks[0]['start_line'], 1)
+        self.assertEqual(chunks[-1]['end_line'], len(line_tokens))
+        for previous, chunk in zip(chunks, chunks[1:]):
+            self.assertLessEqual(chunk['start_line'], previous['end_line'])
+            self.assertGreater(chunk['start_line'], previous['start_line'])
+        for chunk in chunks:
+            self.assertLessEqual(sum(line_tokens[chunk['start_line'] - 1:chunk['end_line']]), max_tokens)
+
+    def test_markdown_splits_on_headings_outside_fences(self):
+        """Test that Markdown chunks start at headings, ignoring heading-like lines in code fences."""
+        lines = MARKDOWN_SOURCE.splitlines()
+        max_tokens = tokens(lines[4:10]) + 1
+        chunks = chunk_file('README.md', MARKDOWN_SOURCE, max_tokens=max_tokens, overlap_tokens=0)
+
+        self.assertEqual([chunk['start_line'] for chunk in chunks], [1, 5, 12])
+        self.assertIn('# not a heading', chunks[1]['text'])
+
+    def test_small_files_stay_whole(self):
+        """Test that segments are packed together while they fit."""
+        chunks = chunk_file('README.md', MARKDOWN_SOURCE, max_tokens=10000)
+
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual((chunks[0]['start_line'], chunks[0]['end_line']), (1, 14))
+
+    def test_invalid_python_falls_back_to_line_windows(self):
+        """Test that unparsable Python is still chunked."""
+        content = 'def broken(:\n' + '\n'.join(f'x_{n} = {n}' for n in range(30))
+        chunks = chunk_file('broken.py', content, max_tokens=40, overlap_tokens=0)
+
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(chunks[0]['start_line'], 1)
+        self.assertEqual(chunks[-1]['end_line'], 31)
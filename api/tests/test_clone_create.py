@@ -0,0 +1,58 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest import skipUnless
+import pygit2
+from django.test import TestCase, override_settings
+from common.clone.create import create_clone
+
+
+def git(*args, cwd):
+    subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                   cwd=cwd, check=True, capture_output=True)
+
+
+@skipUnless(shutil.which('git'), 'needs the git command line client')
+class LocalOriginCloneTests(TestCase):
+    def setUp(self):
+        """Create a local origin repository with three commits on main."""
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        origin = os.path.join(self.root, 'origin', 'owner', 'repo.git')
+        os.makedirs(origin)
+        git('init', '--quiet', '--initial-branch=main', cwd=origin)
+        for n in range(3):
+            with open(os.path.join(origin, 'file.txt'), 'w') as f:
+                f.write(f'version {n}\n')
+            git('add', 'file.txt', cwd=origin)
+            git('commit', '--quiet', '-m', f'commit {n}', cwd=origin)
+        override = override_settings(
+            GITHUB_CLONE_URL=os.path.join(self.root, 'origin'),
+            GITHUB_CLONE_DIR=os.path.join(self.root, 'clones'),
+            CLONE_MIRRORS=False
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def history(self):
+        repo = pygit2.Repository(os.path.join(self.root, 'clones', 'owner', 'repo', 'main'))
+        return repo, list(repo.walk(repo.head.target))
+
+    def test_shallow_clone_of_local_origin(self):
+        """Test that depth is honoured for an origin given as a local path."""
+        result = create_clone('owner/repo/main', depth=1)
+
+        self.assertEqual(result.get('status'), 'success', result)
+        repo, commits = self.history()
+        self.assertTrue(repo.is_shallow)
+        self.assertEqual(len(commits), 1)
+
+    def test_full_clone_of_local_origin(self):
+        """Test that a clone without depth gets the whole history."""
+        result = create_clone('owner/repo/main')
+
+        self.assertEqual(result.get('status'), 'success', result)
+        repo, commits = self.history()
+        self.assertFalse(repo.is_shallow)
+        self.assertEqual(len(commits), 3)
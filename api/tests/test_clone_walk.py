@@ -0,0 +1,39 @@
+import os
+import shutil
+import tempfile
+import pygit2
+from django.conf import settings
+from django.test import TestCase, override_settings
+from common.clone.walk import read_clone_files
+
+
+class ReadCloneFilesTests(TestCase):
+    def setUp(self):
+        """Create a clone directory with a git repository, an ai engineer data file and a source file."""
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.clone_dir = os.path.join(self.root, 'owner', 'repo', 'main')
+        os.makedirs(os.path.join(self.clone_dir, settings.CLONE_AI_ENGINEER_DIR))
+        pygit2.init_repository(self.clone_dir)
+        with open(os.path.join(self.clone_dir, 'app.py'), 'w') as f:
+            f.write('print("hello")\n')
+        with open(os.path.join(self.clone_dir, settings.CLONE_AI_ENGINEER_DIR, 'notes.md'), 'w') as f:
+            f.write('# notes\n')
+        override = override_settings(GITHUB_CLONE_DIR=self.root, CLONE_SNAPSHOT_CACHE=False)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_explicit_files_exclude_git_and_data_directories(self):
+        """Test that named files under .git or the data directory are not read."""
+        files = ['.git/config', 'src/../.git/HEAD', f'{settings.CLONE_AI_ENGINEER_DIR}/notes.md', 'app.py']
+        read, skipped = read_clone_files('owner/repo/main', files=files)
+
+        self.assertEqual([path for path, _ in read], ['app.py'])
+        self.assertEqual([item['reason'] for item in skipped], ['excluded'] * 3)
+
+    def test_explicit_files_outside_clone(self):
+        """Test that named files outside the clone are not read."""
+        read, skipped = read_clone_files('owner/repo/main', files=['../../other/file.py'])
+
+        self.assertEqual(read, [])
+        self.assertEqual(skipped, [{'path': '../../other/file.py', 'reason': 'outside clone'}])
@@ -0,0 +1,73 @@
+from types import SimpleNamespace
+from unittest import mock
+import httpx
+import openai
+from django.test import TestCase
+from common.llm.embeddings import BatchEmbedder
+
+
+def api_error(cls, status):
+    request = httpx.Request('POST', 'https://api.openai.com/v1/embeddings')
+    return cls('error', response=httpx.Response(status, request=request), body=None)
+
+
+class FakeEmbeddings:
+    """
+    Embeddings endpoint that fails the first `transient` calls with a rate
+    limit and rejects any request containing a 'bad' input.
+    """
+
+    def __init__(self, transient=0):
+        self.transient = transient
+        self.calls = []
+
+    def create(self, input, model, **kwargs):
+        self.calls.append(list(input))
+        if self.transient:
+            self.transient -= 1
+            raise api_error(openai.RateLimitError, 429)
+        if any('bad' in text for text in input):
+            raise api_error(openai.BadRequestError, 400)
+        data = [SimpleNamespace(index=i, embedding=[float(len(text))] * 4) for i, text in enumerate(input)]
+        return SimpleNamespace(data=data)
+
+
+class BatchEmbedderRetryTests(TestCase):
+    def setUp(self):
+        """Create an embedder over a fake client without backoff delays."""
+        self.endpoint = FakeEmbeddings()
+        client = SimpleNamespace(embeddings=self.endpoint)
+        self.embedder = BatchEmbedder(model='text-embedding-ada-002', dimensions=4, client=client,
+                                      max_batch_items=8, query_cache_size=0)
+        patcher = mock.patch('common.llm.embeddings.EMBED_BACKOFF_SECONDS', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rate_limited_batch_is_retried_whole(self):
+        """Test that a rate limited request is sent again with all its inputs."""
+        self.endpoint.transient = 2
+        texts = ['a', 'bb', 'ccc']
+        embeddings, errors = self.embedder.embed_partial(texts)
+
+        self.assertEqual(errors, {})
+        self.assertEqual([e[0] for e in embeddings], [1.0, 2.0, 3.0])
+        self.assertEqual(self.endpoint.calls, [texts] * 3)
+
+    def test_rejected_batch_is_bisected(self):
+        """Test that a rejected request is split until only the bad input fails."""
+        texts = ['a', 'b', 'c', 'd', 'e', 'bad', 'g', 'h']
+        embeddings, errors = self.embedder.embed_partial(texts)
+
+        self.assertEqual(list(errors), [5])
+        self.assertIsNone(embeddings[5])
+        self.assertTrue(all(e is not None for i, e in enumerate(embeddings) if i != 5))
+        self.assertLessEqual(len(self.endpoint.calls), 7)
+
+    def test_persistent_rate_limit_fails_batch(self):
+        """Test that a batch still rate limited after every attempt fails without being split."""
+        self.endpoint.transient = 100
+        embeddings, errors = self.embedder.embed_partial(['a', 'b'])
+
+        self.assertEqual(list(errors), [0, 1])
+        self.assertEqual(embeddings, [None, None])
+        self.assertTrue(all(len(call) == 2 for call in self.endpoint.calls))
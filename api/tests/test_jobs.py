@@ -0,0 +1,98 @@
+import threading
+import time
+from unittest import mock
+from django.test import TransactionTestCase
+from api.models import Job
+from common.jobs.worker import JobQueue, get_job
+
+
+class JobQueueTests(TransactionTestCase):
+    def setUp(self):
+        """Create a one-worker queue running a fake job kind that waits to be released."""
+        self.release = threading.Event()
+        self.commit = 'a' * 40
+
+        def run(repository, params, progress):
+            progress({'files': 1})
+            self.release.wait(10)
+            if params.get('fail'):
+                return {'error': 'job failed'}
+            return {'status': 'success', 'repository': repository}
+
+        patcher = mock.patch.dict('common.jobs.worker.JOB_KINDS',
+                                  {'vectorize': (lambda repository, params: self.commit, run)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.queue = JobQueue(workers=1, max_queued=2)
+        self.addCleanup(self.queue._progress_writer.shutdown)
+        self.addCleanup(self.queue._executor.shutdown)
+        self.addCleanup(self.release.set)
+
+    def wait_for(self, job_id, status):
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            job = get_job(job_id, include_result=True)
+            if job['status'] == status:
+                return job
+            time.sleep(0.02)
+        self.fail(f'Job {job_id} did not reach {status}')
+
+    def test_duplicate_submissions_coalesce(self):
+        """Test that the same work submitted twice while active returns the first job."""
+        first = self.queue.submit('vectorize', 'owner/repo', source='clone')
+        second = self.queue.submit('vectorize', 'owner/repo/main', source='clone')
+
+        self.assertFalse(first['coalesced'])
+        self.assertTrue(second['coalesced'])
+        self.assertEqual(first['job']['id'], second['job']['id'])
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_different_parameters_or_commits_do_not_coalesce(self):
+        """Test that jobs for other parameters or another commit are separate jobs."""
+        first = self.queue.submit('vectorize', 'owner/repo/main', source='clone')
+        self.wait_for(first['job']['id'], Job.RUNNING)
+        other = self.queue.submit('vectorize', 'owner/repo/main', source='github')
+        self.commit = 'b' * 40
+        newer = self.queue.submit('vectorize', 'owner/repo/main', source='clone')
+
+        self.assertEqual([result['coalesced'] for result in (other, newer)], [False, False])
+        self.assertEqual(len({result['job']['id'] for result in (first, other, newer)}), 3)
+        self.assertEqual(newer['job']['commit'], 'b' * 40)
+
+    def test_lifecycle_clears_active_key(self):
+        """Test that a job runs, succeeds with its result and progress, and frees its key."""
+        submitted = self.queue.submit('vectorize', 'owner/repo/main', source='clone')
+        job_id = submitted['job']['id']
+        self.assertEqual(submitted['job']['status'], Job.QUEUED)
+        self.wait_for(job_id, Job.RUNNING)
+
+        self.release.set()
+        job = self.wait_for(job_id, Job.SUCCEEDED)
+        self.assertEqual(job['result'], {'status': 'success', 'repository': 'owner/repo/main'})
+        self.assertEqual(job['progress'], {'files': 1})
+        self.assertIsNotNone(job['run_seconds'])
+        self.assertIsNone(Job.objects.get(id=job_id).active_key)
+
+        again = self.queue.submit('vectorize', 'owner/repo/main', source='clone')
+        self.assertFalse(again['coalesced'])
+        self.assertNotEqual(again['job']['id'], job_id)
+
+    def test_failed_job_records_error(self):
+        """Test that a job returning an error fails with it and frees its key."""
+        self.release.set()
+        job_id = self.queue.submit('vectorize', 'owner/repo/main', fail=True)['job']['id']
+
+        job = self.wait_for(job_id, Job.FAILED)
+        self.assertEqual(job['error'], 'job failed')
+        self.assertIsNone(Job.objects.get(id=job_id).active_key)
+
+    def test_full_queue_refuses_submissions(self):
+        """Test that submissions beyond max_queued waiting jobs are refused."""
+        running = self.queue.submit('vectorize', 'owner/repo/main', source='clone')
+        self.wait_for(running['job']['id'], Job.RUNNING)
+        queued = [self.queue.submit('vectorize', f'owner/repo{n}/main', source='clone') for n in range(2)]
+        refused = self.queue.submit('vectorize', 'owner/third/main', source='clone')
+
+        self.assertEqual([result['coalesced'] for result in queued], [False, False])
+        self.assertEqual(refused, {'error': 'Job queue is full', 'queue_full': True})
+        self.assertEqual(self.queue.submit('unknown', 'owner/repo/main'), {'error': 'Unknown job kind: unknown'})
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from django.test import TestCase, override_settings
+from langchain_core.documents import Document
+from common.llm.embeddings import BatchEmbedder
+from common.ragindex.hybrid import fuse, RRF_K
+from common.ragindex.lexical import (
+    build_lexical_index, get_lexical_index, get_current_lexical_index, tokenize
+)
+
+FILES = {
+    'app/repository.py': (
+        'def parse_repository_string(repository):\n'
+        '    """Split a repository string into owner, repo and branch."""\n'
+        '    owner, repo, branch = repository.split("/")\n'
+        '    return owner, repo, branch\n'
+    ),
+    'app/clone.py': (
+        'def create_clone(repository):\n'
+        '    """Clone a repository."""\n'
+        '    return parse_repository_string(repository)\n'
+    ),
+    'README.md': (
+        '# Project\n\n'
+        'Vectorize a repository branch and ask questions about it.\n'
+    ),
+}
+
+
+def git(*args, cwd):
+    subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                   cwd=cwd, check=True, capture_output=True)
+
+
+def document(path, chunk=0):
+    return Document(page_content=path, metadata={'path': path, 'chunk': chunk})
+
+
+class FakeEmbeddings:
+    """
+    Embeddings endpoint returning a deterministic vector per input.
+    """
+
+    def create(self, input, model, **kwargs):
+        data = []
+        for i, text in enumerate(input):
+            digest = hashlib.sha256(text.encode('utf-8')).digest()
+            data.append(SimpleNamespace(index=i, embedding=[b / 255 for b in digest[:8]]))
+        return SimpleNamespace(data=data)
+
+
+class FuseTests(TestCase):
+    def test_documents_in_both_rankings_rank_first(self):
+        """Test that reciprocal rank fusion favours documents ranked by both retrievers."""
+        lexical = [document('a'), document('b'), document('c')]
+        dense = [document('d'), document('c'), document('a')]
+        fused = fuse([lexical, dense], 4)
+
+        self.assertEqual([d.metadata['path'] for d in fused], ['a', 'c', 'd', 'b'])
+
+    def test_documents_match_on_path_and_chunk(self):
+        """Test that chunks of the same file are fused separately."""
+        fused = fuse([[document('a', 0)], [document('a', 1)]], 3)
+
+        self.assertEqual([d.metadata['chunk'] for d in fused], [0, 1])
+        self.assertEqual(RRF_K, 60)
+
+
+class TokenizeTests(TestCase):
+    def test_identifiers_are_split(self):
+        """Test that identifiers are indexed whole and by their snake_case and camelCase parts."""
+        terms = tokenize('parse_repository_string getHTTPResponse')
+
+        for term in ['parse_repository_string', 'parse', 'repository', 'string',
+                     'gethttpresponse', 'get', 'http', 'response']:
+            self.assertIn(term, terms)
+
+
+@skipUnless(shutil.which('git'), 'needs the git command line client')
+class LexicalIndexTests(TestCase):
+    def setUp(self):
+        """Create a clone of a small repository and point the caches and local vector store at a temp dir."""
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.clone_dir = os.path.join(self.root, 'clones', 'owner', 'repo', 'main')
+        os.makedirs(self.clone_dir)
+        git('init', '--quiet', '--initial-branch=main', cwd=self.clone_dir)
+        for path, content in FILES.items():
+            self.write(path, content)
+        self.commit('initial')
+
+        override = override_settings(
+            GITHUB_CLONE_DIR=os.path.join(self.root, 'clones'),
+            CACHE_DIR=self.root,
+            LEXICAL_INDEX_DIR=os.path.join(self.root, 'lexical'),
+            RAGINDEX_STATE_PATH=os.path.join(self.root, 'ragindex.sqlite3'),
+            LOCAL_VECTOR_DIR=os.path.join(self.root, 'vectors'),
+            VECTOR_BACKEND='local',
+            EMBEDDING_DIMENSIONS=8,
+            CLONE_SNAPSHOT_CACHE=False
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        embedder = BatchEmbedder(client=SimpleNamespace(embeddings=FakeEmbeddings()),
+                                 dimensions=8, cache=None)
+        for target, value in [('common.llm.embeddings._embedder', embedder),
+                              ('common.ragindex.store._local_index', None),
+                              ('common.ragindex.catalog._catalog', None)]:
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write(self, path, content):
+        full_path = os.path.join(self.clone_dir, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'w') as f:
+            f.write(content)
+
+    def commit(self, message):
+        git('add', '--all', cwd=self.clone_dir)
+        git('commit', '--quiet', '-m', message, cwd=self.clone_dir)
+
+    def test_bm25_ranks_by_term_weight(self):
+        """Test that chunks repeating a rare term rank above chunks mentioning it once."""
+        result = build_lexical_index('owner/repo/main')
+        self.assertEqual(result.get('status'), 'success', result)
+        index = get_lexical_index('owner/repo/main')
+
+        ranked = [doc['path'] for _, doc in index.search('branch')]
+        self.assertEqual(ranked, ['app/repository.py', 'README.md'])
+        self.assertEqual(index.search('unrelated words'), [])
+        self.assertTrue(index.covers('where is `create_clone` defined?'))
+        self.assertFalse(index.covers('how do I clone a repository?'))
+
+    def test_index_follows_vectorize_update_and_delete(self):
+        """Test that an existing lexical index is rebuilt by vectorize and update, and deleted with the vectors."""
+        from common.ragindex.vectorize import vectorize_repository
+        from common.ragindex.update import update_repository
+        from common.ragindex.delete import delete_repository
+
+        self.assertEqual(build_lexical_index('owner/repo/main').get('status'), 'success')
+        result = vectorize_repository('owner/repo/main', source='clone')
+        self.assertEqual(result.get('lexical_index'), 'rebuilt', result)
+        index = get_current_lexical_index('owner/repo/main')
+        self.assertEqual(index.commit, result['commit'])
+
+        self.write('app/branches.py', 'def list_remote_branches(repository):\n    return []\n')
+        self.commit('add branches')
+        self.assertEqual(get_current_lexical_index('owner/repo/main').search('list_remote_branches'), [])
+        result = update_repository('owner/repo/main', source='clone')
+        self.assertEqual((result.get('mode'), result.get('lexical_index')), ('incremental', 'rebuilt'), result)
+        index = get_current_lexical_index('owner/repo/main')
+        self.assertEqual(index.commit, result['commit'])
+        self.assertEqual([doc['path'] for _, doc in index.search('list_remote_branches')], ['app/branches.py'])
+
+        self.assertEqual(delete_repository('owner/repo/main').get('status'), 'success')
+        self.assertIsNone(get_lexical_index('owner/repo/main'))
@@ -0,0 +1,154 @@
+import shutil
+import tempfile
+import threading
+import numpy as np
+from django.test import TestCase
+from common.ragindex.local_store import LocalIndex
+
+
+def clustered_vectors(count, dimension, rng, clusters=20):
+    centers = rng.standard_normal((clusters, dimension))
+    vectors = centers[rng.integers(0, clusters, count)] + 0.5 * rng.standard_normal((count, dimension))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def wait_for_graph_builds():
+    for thread in threading.enumerate():
+        if thread.name.startswith('hnsw-build-'):
+            thread.join()
+
+
+class LocalIndexTests(TestCase):
+    def setUp(self):
+        """Create an index without graphs, so every query is exact."""
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.index = LocalIndex(self.root, 4)
+
+    def test_query_ranks_by_cosine_similarity(self):
+        """Test that matches come back best first, with their metadata."""
+        self.index.upsert([
+            {'id': 'a', 'values': [1, 0, 0, 0], 'metadata': {'path': 'a.py'}},
+            {'id': 'b', 'values': [1, 1, 0, 0], 'metadata': {'path': 'b.py'}},
+            {'id': 'c', 'values': [0, 0, 1, 0], 'metadata': {'path': 'c.py'}}
+        ], namespace='ns')
+        matches = self.index.query(vector=[2, 0, 0, 0], top_k=2, namespace='ns').matches
+
+        self.assertEqual([m.id for m in matches], ['a', 'b'])
+        self.assertAlmostEqual(matches[0].score, 1.0, places=5)
+        self.assertAlmostEqual(matches[1].score, 2 ** -0.5, places=5)
+        self.assertEqual(matches[0].metadata, {'path': 'a.py'})
+        self.assertEqual(self.index.query(vector=[1, 0, 0, 0], namespace='other').matches, [])
+
+    def test_upsert_replaces_existing_ids(self):
+        """Test that upserting an existing id replaces its vector and metadata in place."""
+        self.index.upsert([{'id': 'a', 'values': [1, 0, 0, 0], 'metadata': {'v': 1}}], namespace='ns')
+        self.index.upsert([{'id': 'a', 'values': [0, 1, 0, 0], 'metadata': {'v': 2}}], namespace='ns')
+        matches = self.index.query(vector=[0, 1, 0, 0], top_k=5, namespace='ns').matches
+
+        self.assertEqual([(m.id, m.metadata) for m in matches], [('a', {'v': 2})])
+        self.assertAlmostEqual(matches[0].score, 1.0, places=5)
+        self.assertEqual(self.index.describe_index_stats().namespaces['ns'].vector_count, 1)
+
+    def test_delete_frees_rows_for_reuse(self):
+        """Test that deleted ids are no longer matched and their rows are reused."""
+        self.index.upsert([{'id': f'v{i}', 'values': [1, i, 0, 0]} for i in range(4)], namespace='ns')
+        self.index.delete(ids=['v1', 'v2', 'missing'], namespace='ns')
+        matches = self.index.query(vector=[1, 1, 0, 0], top_k=10, namespace='ns').matches
+        self.assertEqual(sorted(m.id for m in matches), ['v0', 'v3'])
+
+        size = self.index._matrix('ns')[0].shape[0]
+        self.index.upsert([{'id': 'w1', 'values': [0, 0, 1, 0]}, {'id': 'w2', 'values': [0, 0, 0, 1]}],
+                          namespace='ns')
+        self.assertEqual(self.index._matrix('ns')[0].shape[0], size)
+        self.assertEqual(self.index.describe_index_stats().total_vector_count, 4)
+
+    def test_list_pages_ids_by_prefix(self):
+        """Test that listing returns ids with the prefix in pages."""
+        self.index.upsert([{'id': f'ns/a.py#{i}', 'values': [1, 0, 0, 0]} for i in range(5)] +
+                          [{'id': 'ns/b.py#0', 'values': [0, 1, 0, 0]}], namespace='ns')
+        pages = list(self.index.list(prefix='ns/a.py#', namespace='ns', limit=2))
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), [f'ns/a.py#{i}' for i in range(5)])
+
+    def test_delete_all_removes_namespace(self):
+        """Test that deleting a namespace removes it from the stats."""
+        self.index.upsert([{'id': 'a', 'values': [1, 0, 0, 0]}], namespace='ns')
+        self.index.upsert([{'id': 'a', 'values': [1, 0, 0, 0]}], namespace='other')
+        self.index.delete(delete_all=True, namespace='ns')
+
+        self.assertEqual(list(self.index.describe_index_stats().namespaces), ['other'])
+        self.assertEqual(self.index.query(vector=[1, 0, 0, 0], namespace='ns').matches, [])
+
+    def test_dimension_mismatch_raises(self):
+        """Test that vectors of the wrong dimension are rejected."""
+        with self.assertRaises(ValueError):
+            self.index.upsert([{'id': 'a', 'values': [1, 0, 0]}], namespace='ns')
+
+
+class LocalIndexGraphTests(TestCase):
+    def setUp(self):
+        """Create an index that builds a graph once a namespace holds 300 vectors."""
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.index = LocalIndex(self.root, 16, hnsw_threshold=300,
+                                hnsw_params={'M': 8, 'ef_construction': 48, 'ef_search': 32, 'seed': 0})
+        self.rng = np.random.default_rng(0)
+        self.vectors = clustered_vectors(800, 16, self.rng)
+        self.queries = clustered_vectors(40, 16, self.rng)
+
+    def upsert(self, vectors, batch=200):
+        for start in range(0, len(vectors), batch):
+            self.index.upsert([{'id': f'v{i}', 'values': vectors[i].tolist()}
+                               for i in range(start, min(start + batch, len(vectors)))], namespace='ns')
+        wait_for_graph_builds()
+
+    def recall(self, k=10):
+        hits = 0
+        for query in self.queries:
+            exact = self.index.query(vector=query.tolist(), top_k=k, namespace='ns', exact=True)
+            approximate = self.index.query(vector=query.tolist(), top_k=k, namespace='ns')
+            hits += len({m.id for m in exact.matches} & {m.id for m in approximate.matches})
+        return hits / (k * len(self.queries))
+
+    def test_graph_is_built_over_threshold(self):
+        """Test that a graph covering every vector is built in the background."""
+        self.upsert(self.vectors)
+        graph = self.index._graph('ns')
+        self.assertIsNotNone(graph)
+        self.assertEqual(len(graph), len(self.vectors))
+        self.assertGreater(self.recall(), 0.9)
+
+    def test_reupsert_same_vectors_keeps_recall(self):
+        """Test that upserting the same vectors again does not degrade the graph."""
+        self.upsert(self.vectors)
+        before = self.recall()
+        self.upsert(self.vectors)
+        self.assertGreaterEqual(self.recall(), before)
+
+    def test_reupsert_changed_vectors_keeps_entry_links(self):
+        """Test that re-linking every node, entry point included, keeps the graph searchable."""
+        self.upsert(self.vectors)
+        before = self.recall()
+        changed = self.vectors + 0.05 * self.rng.standard_normal(self.vectors.shape)
+        self.upsert(changed / np.linalg.norm(changed, axis=1, keepdims=True))
+        graph = self.index._graph('ns')
+        for level in range(1, graph.max_level + 1):
+            self.assertTrue(graph.upper[level].get(graph.entry) or len(graph.upper[level]) == 1)
+        self.assertGreater(self.recall(), before - 0.05)
+
+    def test_deletes_compact_graph(self):
+        """Test that deleting over HNSW_COMPACT_RATIO of the nodes rebuilds the graph over the live rows."""
+        self.upsert(self.vectors)
+        deleted = [f'v{i}' for i in range(0, len(self.vectors), 3)]
+        self.index.delete(ids=deleted, namespace='ns')
+        wait_for_graph_builds()
+
+        graph = self.index._graph('ns')
+        self.assertEqual(len(graph), len(self.vectors) - len(deleted))
+        self.assertEqual(graph.count_deleted(self.index._matrix('ns')[1]), 0)
+        self.assertGreater(self.recall(), 0.9)
+        for query in self.queries:
+            matches = self.index.query(vector=query.tolist(), top_k=10, namespace='ns').matches
+            self.assertFalse({m.id for m in matches} & set(deleted))
@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest import skipUnless
+from django.test import TestCase, override_settings
+from common.clone.packer import (
+    summarize_lockfile, pack_clone_context, shard_clone_context, _directory_shards, _count_tokens
+)
+
+POETRY_LOCK = '''[[package]]
+name = "django"
+version = "5.0.1"
+
+[[package]]
+name = "numpy"
+version = "1.26.4"
+'''
+
+
+def git(*args, cwd):
+    subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+                   cwd=cwd, check=True, capture_output=True)
+
+
+class SummarizeLockfileTests(TestCase):
+    def test_poetry_lock(self):
+        """Test that a poetry.lock is summarized as its package versions."""
+        summary = summarize_lockfile('poetry.lock', POETRY_LOCK)
+
+        self.assertEqual(summary, 'Lockfile pinning 2 packages:\ndjango 5.0.1\nnumpy 1.26.4')
+
+    def test_package_lock(self):
+        """Test that a package-lock.json is summarized as its package versions, without the root entry."""
+        content = json.dumps({'packages': {
+            '': {'name': 'app'},
+            'node_modules/react': {'version': '18.2.0'},
+            'node_modules/a/node_modules/b': {'version': '1.0.0'}
+        }})
+        summary = summarize_lockfile('package-lock.json', content)
+
+        self.assertEqual(summary, 'Lockfile pinning 2 packages:\nreact 18.2.0\nb 1.0.0')
+
+    def test_unparsable_lockfile(self):
+        """Test that a lockfile that cannot be parsed is reduced to its line count."""
+        summary = summarize_lockfile('poetry.lock', 'not = [toml\nat all\n')
+
+        self.assertEqual(summary, 'Lockfile with 2 lines, contents omitted.')
+
+
+class DirectoryShardsTests(TestCase):
+    def test_small_directories_stay_whole(self):
+        """Test that directories under the shard size are one shard each, top level files under '.'."""
+        shards = _directory_shards([('README.md', 10), ('app/a.py', 10), ('docs/b.md', 10)], 100)
+
+        self.assertEqual([(key, [path for path, _ in members]) for key, members in shards],
+                         [('.', ['README.md']), ('app', ['app/a.py']), ('docs', ['docs/b.md'])])
+
+    def test_large_directories_split_by_subdirectory(self):
+        """Test that a directory over the shard size is split by its subdirectories."""
+        sized = [('app/api/a.py', 60), ('app/api/b.py', 30), ('app/core/c.py', 60), ('app/d.py', 10)]
+        shards = _directory_shards(sized, 100)
+
+        self.assertEqual([key for key, _ in shards], ['app', 'app/api', 'app/core'])
+
+    def test_flat_directories_split_into_parts(self):
+        """Test that a directory of files over the shard size is split into numbered parts."""
+        sized = [(f'app/{n}.py', 40) for n in range(5)]
+        shards = _directory_shards(sized, 100)
+
+        self.assertEqual([key for key, _ in shards], ['app (1/3)', 'app (2/3)', 'app (3/3)'])
+        self.assertEqual(sum(len(members) for _, members in shards), 5)
+
+
+@skipUnless(shutil.which('git'), 'needs the git command line client')
+class PackCloneContextTests(TestCase):
+    def setUp(self):
+        """Create a clone with source files in several directories, a lockfile and a generated file."""
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        clone_dir = os.path.join(self.root, 'owner', 'repo', 'main')
+        files = {
+            'README.md': '# Project\n\nA small project.\n',
+            'poetry.lock': POETRY_LOCK,
+            'app/migrations/0001_initial.py': '# Generated by Django 5.0\n',
+        }
+        for directory in ('app', 'core', 'docs'):
+            for n in range(4):
+                files[f'{directory}/module_{n}.py'] = ''.join(
+                    f'def {directory}_function_{n}_{i}(value):\n    return value + {i}\n\n' for i in range(30))
+        for path, content in files.items():
+            os.makedirs(os.path.dirname(os.path.join(clone_dir, path)), exist_ok=True)
+            with open(os.path.join(clone_dir, path), 'w') as f:
+                f.write(content)
+        git('init', '--quiet', '--initial-branch=main', cwd=clone_dir)
+        git('add', '--all', cwd=clone_dir)
+        git('commit', '--quiet', '-m', 'initial', cwd=clone_dir)
+        self.files = files
+        override = override_settings(GITHUB_CLONE_DIR=self.root, CLONE_SNAPSHOT_CACHE=False)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_pack_fits_budget(self):
+        """Test that the packed context fits its budget and lists the files that did not fit."""
+        packed = pack_clone_context('owner/repo/main', budget=2000, file_max_tokens=800)
+
+        self.assertLessEqual(packed['tokens'], 2000)
+        self.assertEqual(packed['included'][0], 'README.md')
+        self.assertIn('poetry.lock', packed['summarized'])
+        self.assertIn({'path': 'app/migrations/0001_initial.py', 'reason': 'generated'}, packed['dropped'])
+        dropped = [item['path'] for item in packed['dropped'] if item['reason'] == 'budget']
+        self.assertTrue(dropped)
+        self.assertIn('Files omitted to fit the context:', packed['text'])
+        for path in packed['truncated']:
+            self.assertIn(path, packed['included'])
+
+    def test_shards_cover_every_file_once(self):
+        """Test that shards fit their token budget and together hold every packed file once."""
+        shards = shard_clone_context('owner/repo/main', shard_tokens=3000, file_max_tokens=1000)
+
+        self.assertGreater(len(shards), 1)
+        included = [path for shard in shards for path in shard['included']]
+        expected = [path for path in self.files if path != 'app/migrations/0001_initial.py']
+        self.assertEqual(sorted(included), sorted(expected))
+        for shard in shards:
+            self.assertLessEqual(shard['tokens'], 3000)
+            self.assertEqual(shard['tokens'], _count_tokens(shard['text']))
+        self.assertIn('poetry.lock', shards[0]['summarized'])
+        self.assertIn('Lockfile pinning 2 packages', ''.join(shard['text'] for shard in shards))
@@ -0,0 +1,107 @@
+import json
+from unittest import mock
+from django.test import TestCase
+from django.urls import reverse
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+ANSWER = 'Hello there world'
+
+
+def fake_chat_model(*args, **kwargs):
+    return GenericFakeChatModel(messages=iter([AIMessage(content=ANSWER)]))
+
+
+def parse_events(body):
+    """
+    Parse a text/event-stream body into (event type, data) pairs.
+    """
+    events = []
+    for block in body.decode('utf-8').strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+class PromptViewTests(TestCase):
+    def setUp(self):
+        """Answer prompts with a fake chat model instead of OpenAI."""
+        self.url = reverse('chat_with_gpt')
+        for target in ('common.llm.prompt.get_chat_model', 'common.llm.prompt.get_async_chat_model'):
+            patcher = mock.patch(target, side_effect=fake_chat_model)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def assertStreamedAnswer(self, events):
+        self.assertEqual([event for event, _ in events], ['token'] * 5 + ['done'])
+        self.assertEqual(''.join(data['content'] for event, data in events if event == 'token'), ANSWER)
+        self.assertEqual(events[-1][1], {'response': ANSWER, 'cached': False})
+
+    def test_prompt_returns_response(self):
+        """Test that a prompt without stream returns the whole answer as JSON."""
+        response = self.client.post(self.url, {'prompt': 'Say hello'}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'response': ANSWER})
+
+    def test_stream_under_wsgi(self):
+        """Test that a streamed prompt is served from a sync iterator under WSGI."""
+        response = self.client.post(self.url, {'prompt': 'Say hello', 'stream': True},
+                                    content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertFalse(response.is_async)
+        self.assertStreamedAnswer(parse_events(b''.join(response.streaming_content)))
+
+    def test_accept_header_streams(self):
+        """Test that an Accept: text/event-stream header asks for a stream."""
+        response = self.client.post(self.url, {'prompt': 'Say hello'}, content_type='application/json',
+                                    headers={'Accept': 'text/event-stream'})
+
+        self.assertTrue(response.streaming)
+        self.assertStreamedAnswer(parse_events(b''.join(response.streaming_content)))
+
+    async def test_stream_under_asgi(self):
+        """Test that a streamed prompt is served from an async iterator under ASGI."""
+        response = await self.async_client.post(self.url, {'prompt': 'Say hello', 'stream': True},
+                                                content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertStreamedAnswer(parse_events(body))
+
+    async def test_async_prompt_returns_response(self):
+        """Test that the async view answers a prompt without stream as JSON."""
+        response = await self.async_client.post(self.url, {'prompt': 'Say hello'},
+                                                content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), {'response': ANSWER})
+
+    def test_stream_reports_errors_as_events(self):
+        """Test that a prompt failing after the stream started ends with an error event."""
+        with mock.patch('common.llm.prompt.get_chat_model', side_effect=Exception('Model unavailable')):
+            response = self.client.post(self.url, {'prompt': 'Say hello', 'stream': True},
+                                        content_type='application/json')
+            events = parse_events(b''.join(response.streaming_content))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(events, [('error', {'error': 'Model unavailable'})])
+
+    def test_invalid_stream_field(self):
+        """Test that a non-boolean stream field is rejected."""
+        response = self.client.post(self.url, {'prompt': 'Say hello', 'stream': 'yes'},
+                                    content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Stream field must be a boolean'})
+
+    def test_method_not_allowed(self):
+        """Test that only POST is accepted."""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response['Allow'], 'POST')
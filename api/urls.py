@@ -11,6 +11,7 @@ This module defines the URL patterns for the API endpoints:
         Accepts text strings and returns llm responses
         Handles input validation and error responses
         Maximum text length: 1024 characters
+        With "stream": true, returns server-sent events: sources, tokens, done
 
 - /api/ragindex/vectorize/ (POST):
         Vectorizes GitHub repository contents and stores them in Pinecone
@@ -25,6 +26,13 @@ This module defines the URL patterns for the API endpoints:
         Processes .md and .py files
         Returns success status and number of processed files
         Handles invalid inputs and processing errors
+        With "background": true, returns 202 with a job to poll at /api/jobs/<id>/
+
+- /api/ragindex/update/ (POST):
+        Updates a vectorized repository with changes since it was last indexed
+        Re-embeds added and modified files and deletes vectors for removed files
+        Falls back to a full vectorize if no indexed commit is recorded
+        Accepts repository string as for vectorize, and optional source
 
 - /api/ragindex/list/ (GET):
         Lists all repositories (namespaces) stored in the Pinecone database
@@ -38,6 +46,14 @@ This module defines the URL patterns for the API endpoints:
         The leading '/' is optional
         Returns success status on completion
         Returns 404 if repository not found
+
+- /api/jobs/<id>/ (GET):
+        Reports the status, progress and timings of a background job, as
+        submitted with "background": true to vectorize or codereview
+
+- /api/jobs/<id>/result/ (GET):
+        Returns the result of a finished background job
+        Returns 202 while the job is queued or running
 """
 
 from django.urls import path
@@ -46,8 +62,11 @@ from . import views
 urlpatterns = [
     path('ping/', views.ping, name='ping'),
     path('ragindex/vectorize/', views.ragindex.vectorize.vectorize_repository_view, name='vectorize_repository'),
+    path('ragindex/update/', views.ragindex.update.update_repository_view, name='update_repository'),
     path('ragindex/list/', views.ragindex.list.list_repositories_view, name='list_repositories'),
     path('ragindex/delete/', views.ragindex.delete.delete_repository_view, name='delete_repository'),
     path('llm/prompt/', views.llm.prompt.chat_with_gpt_view, name='chat_with_gpt'),
     path('agent/analyze/codereview/', views.agent.analyze.analyze_code_review_view, name='analyze_code_review'),
+    path('jobs/<uuid:job_id>/', views.jobs.detail.job_status_view, name='job_status'),
+    path('jobs/<uuid:job_id>/result/', views.jobs.result.job_result_view, name='job_result'),
 ]
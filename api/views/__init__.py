@@ -2,3 +2,4 @@ from .ping import *
 from .ragindex import *
 from .llm import *
 from .agent import *
+from .jobs import *
@@ -1,18 +1,29 @@
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
+import asyncio
+from django.http import JsonResponse
 from rest_framework import status
-from common.agent.analyze import agent_analyze
+from api.decorators import async_api_view
+from common.agent.analyze import agent_analyze, MODES
+from api.views.jobs.submit import submit_job_response
 
-@api_view(['POST'])
-def analyze_code_review_view(request):
+@async_api_view(['POST'])
+async def analyze_code_review_view(request):
     """
     Analyze a local repository clone and return the code review.
 
     Accepts POST requests with a JSON body containing:
     {
-        'repo': 'owner/repo/branch'  # branch is optional, defaults to 'main'
+        'repo': 'owner/repo/branch',  # branch is optional, defaults to 'main'
+        'background': false,          # optional, run as a background job
+        'thread_id': '<thread id>',   # optional, resume a checkpointed run
+        'mode': 'chain'               # optional, 'chain' or 'mapreduce'
     }
     The repository string can optionally start with a forward slash.
+    With 'background' set to true, the review is run by the job queue and the
+    job is returned at once, to be polled at /api/jobs/<id>/.
+    With AGENT_CHECKPOINT_DB set, a review that failed is resumed from its
+    last checkpoint by passing the thread_id it returned.
+    The 'mapreduce' mode reviews directory shards of the repository
+    concurrently and merges the reviews; it defaults to AGENT_MODE.
 
     Examples:
         {
@@ -26,10 +37,17 @@ def analyze_code_review_view(request):
         }
 
     Returns:
+    202 Accepted: Background job submitted (or an identical active job found)
+    {
+        'job': {'id': '<job id>', 'status': 'queued', ...},
+        'coalesced': false
+    }
+
     200 OK: Successfully generated code review
     {
         'status': 'success',
-        'content': 'Code review content here...'
+        'content': 'Code review content here...',
+        'thread_id': '<thread id>'
     }
 
     400 Bad Request: Invalid input
@@ -39,44 +57,71 @@ def analyze_code_review_view(request):
 
     500 Internal Server Error: Processing error
     {
-        'error': '<error message>'
+        'error': '<error message>',
+        'thread_id': '<thread id>'  # when the run can be resumed
     }
     """
     if not request.data:
-        return Response(
+        return JsonResponse(
             {'error': 'Please provide repository string in the request body'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
     repo = request.data.get('repo')
     if not repo:
-        return Response(
+        return JsonResponse(
             {'error': 'Repository parameter is required'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    background = request.data.get('background', False)
+    if not isinstance(background, bool):
+        return JsonResponse(
+            {'error': 'Background field must be a boolean'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    thread_id = request.data.get('thread_id')
+    if thread_id is not None and not isinstance(thread_id, str):
+        return JsonResponse(
+            {'error': 'Thread id field must be a string'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    mode = request.data.get('mode')
+    if mode is not None and mode not in MODES:
+        return JsonResponse(
+            {'error': f"Mode must be one of: {', '.join(MODES)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if background:
+        params = {key: value for key, value in (('thread_id', thread_id), ('mode', mode)) if value}
+        return await submit_job_response('codereview', repo, **params)
+
     try:
-        analysis = agent_analyze('code_review', repo)
+        analysis = await asyncio.to_thread(agent_analyze, 'code_review', repo,
+                                           thread_id=thread_id, mode=mode)
 
         if 'error' in analysis:
-            return Response(
-                {'error': analysis['error']},
+            return JsonResponse(
+                {key: analysis[key] for key in ('error', 'thread_id') if key in analysis},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
         if 'content' not in analysis:
-            return Response(
+            return JsonResponse(
                 {'error': 'Analyze content not found'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-        return Response({
+        return JsonResponse({
             'status': 'success',
-            'content': analysis['content']
+            'content': analysis['content'],
+            'thread_id': analysis['thread_id']
         })
 
     except Exception as e:
-        return Response(
+        return JsonResponse(
             {'error': str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
@@ -0,0 +1,2 @@
+from .detail import *
+from .result import *
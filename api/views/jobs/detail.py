@@ -0,0 +1,44 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework import status
+from api.decorators import async_api_view
+from common.jobs import get_job
+
+
+@async_api_view(['GET'])
+async def job_status_view(request, job_id):
+    """
+    Report the status of a background job.
+
+    Returns:
+    200 OK: The job, without its result
+    {
+        'id': '<job id>',
+        'kind': 'vectorize' or 'codereview',
+        'repository': 'owner/repo/branch',
+        'commit': '<commit sha the job works on>',
+        'params': {...},
+        'status': 'queued', 'running', 'succeeded' or 'failed',
+        'progress': <latest progress reported by the job, or null>,
+        'error': <error message, or null>,
+        'created_at': '<iso time>',
+        'started_at': '<iso time or null>',
+        'finished_at': '<iso time or null>',
+        'queued_seconds': <seconds from submission to start, or null>,
+        'run_seconds': <seconds from start to finish, or null>
+    }
+
+    404 Not Found: No such job
+    {
+        'error': 'Job not found'
+    }
+    """
+    job = await sync_to_async(get_job)(job_id)
+
+    if job is None:
+        return JsonResponse(
+            {'error': 'Job not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    return JsonResponse(job)
@@ -0,0 +1,54 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework import status
+from api.decorators import async_api_view
+from common.jobs import get_job
+
+
+@async_api_view(['GET'])
+async def job_result_view(request, job_id):
+    """
+    Return the result of a background job.
+
+    Returns:
+    200 OK: The job succeeded; its result is the response the endpoint that
+            submitted it would have returned
+    {
+        'job': <job status, as from /api/jobs/<id>/>,
+        'result': {...}
+    }
+
+    202 Accepted: The job is queued or running
+    {
+        'job': <job status>
+    }
+
+    404 Not Found: No such job
+    {
+        'error': 'Job not found'
+    }
+
+    500 Internal Server Error: The job failed
+    {
+        'error': '<error message>',
+        'job': <job status>
+    }
+    """
+    job = await sync_to_async(get_job)(job_id, include_result=True)
+
+    if job is None:
+        return JsonResponse(
+            {'error': 'Job not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    result = job.pop('result')
+    if job['status'] == 'failed':
+        return JsonResponse(
+            {'error': job['error'], 'job': job},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    if job['status'] != 'succeeded':
+        return JsonResponse({'job': job}, status=status.HTTP_202_ACCEPTED)
+
+    return JsonResponse({'job': job, 'result': result})
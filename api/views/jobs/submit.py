@@ -0,0 +1,27 @@
+import asyncio
+from django.http import JsonResponse
+from rest_framework import status
+from common.jobs import submit_job
+
+
+async def submit_job_response(kind, repository, **params):
+    """
+    Submit a background job and return the response for the submitting view.
+
+    Returns:
+        JsonResponse:
+            202 Accepted with {'job': <job>, 'coalesced': <bool>}
+            400 Bad Request if the repository or commit cannot be resolved
+            503 Service Unavailable if the job queue is full
+    """
+    result = await asyncio.to_thread(submit_job, kind, repository, **params)
+
+    if 'error' in result:
+        return JsonResponse(
+            {'error': result['error']},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+            if result.get('queue_full')
+            else status.HTTP_400_BAD_REQUEST
+        )
+
+    return JsonResponse(result, status=status.HTTP_202_ACCEPTED)
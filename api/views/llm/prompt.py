@@ -1,10 +1,42 @@
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
+import json
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework import status
-from common.llm.prompt import process_chat_prompt
+from api.decorators import async_api_view
+from common.llm.prompt import aprocess_chat_prompt, astream_chat_prompt, stream_chat_prompt
 
-@api_view(['POST'])
-def chat_with_gpt_view(request):
+EVENT_STREAM = 'text/event-stream'
+
+
+def server_sent_event(event_type, data):
+    """
+    Format one server-sent event with a JSON payload.
+    """
+    return f'event: {event_type}\ndata: {json.dumps(data)}\n\n'
+
+
+def event_stream(prompt, repository, context):
+    """
+    Yield the events of stream_chat_prompt as server-sent events. Used under
+    WSGI, where Django would consume an async iterator in full before
+    sending any of it.
+    """
+    for event in stream_chat_prompt(prompt, repository, context):
+        event_type = event.pop('type')
+        yield server_sent_event(event_type, event)
+
+
+async def aevent_stream(prompt, repository, context):
+    """
+    Yield the events of astream_chat_prompt as server-sent events, for ASGI.
+    """
+    async for event in astream_chat_prompt(prompt, repository, context):
+        event_type = event.pop('type')
+        yield server_sent_event(event_type, event)
+
+
+@async_api_view(['POST'])
+async def chat_with_gpt_view(request):
     """
     Chat with OpenAI's GPT model.
 
@@ -12,19 +44,28 @@ def chat_with_gpt_view(request):
     and returns the GPT model's response.
 
     Args:
-        request: DRF Request object containing POST data
+        request: HttpRequest with a JSON body
             {
                 "prompt": "text to send to GPT",
                 "repository": "optional repository name" (optional),
-                "context": ["optional array of context strings"] (optional)
+                "context": ["optional array of context strings"] (optional),
+                "stream": true (optional)
             }
 
     Returns:
-        Response: JSON response containing GPT's response
+        JsonResponse: JSON response containing GPT's response
             {
                 "response": "GPT's response"
             }
 
+        With "stream": true, or an Accept: text/event-stream header, a
+        text/event-stream of server-sent events instead:
+            event: sources  data: {"sources": [{"path", "start_line", "end_line"}, ...]}
+            event: token    data: {"content": "<text>"}  (repeated)
+            event: done     data: {"response": "<full answer>", "cached": <bool>}
+        or, if the prompt fails once streaming has started:
+            event: error    data: {"error": "<error message>"}
+
     Raises:
         400 Bad Request: If the request body is missing, text field is missing,
                         text is not a string, or text exceeds 2048 characters.
@@ -33,20 +74,20 @@ def chat_with_gpt_view(request):
             }
     """
     if not request.data or 'prompt' not in request.data:
-        return Response(
+        return JsonResponse(
             {'error': 'Please provide a prompt field in the request body'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
     prompt = request.data['prompt']
     if not isinstance(prompt, str):
-        return Response(
+        return JsonResponse(
             {'error': 'Prompt field must be a string'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
     if len(prompt) > 2048:
-        return Response(
+        return JsonResponse(
             {'error': 'Prompt must not exceed 2048 characters'},
             status=status.HTTP_400_BAD_REQUEST
         )
@@ -54,12 +95,12 @@ def chat_with_gpt_view(request):
     repository = request.data.get('repository')
     if repository is not None:
         if not isinstance(repository, str):
-            return Response(
+            return JsonResponse(
                 {'error': 'Repository field must be a string'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         if len(repository) > 255:
-            return Response(
+            return JsonResponse(
                 {'error': 'Repository must not exceed 255 characters'},
                 status=status.HTTP_400_BAD_REQUEST
             )
@@ -67,40 +108,58 @@ def chat_with_gpt_view(request):
     context = request.data.get('context')
     if context is not None:
         if not isinstance(context, list):
-            return Response(
+            return JsonResponse(
                 {'error': 'Context must be an array'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         for item in context:
             if not isinstance(item, str):
-                return Response(
+                return JsonResponse(
                     {'error': 'All context items must be strings'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
             if len(item) > 255:
-                return Response(
+                return JsonResponse(
                     {'error': 'Context items must not exceed 255 characters'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
+    stream = request.data.get('stream', False)
+    if not isinstance(stream, bool):
+        return JsonResponse(
+            {'error': 'Stream field must be a boolean'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if stream or EVENT_STREAM in request.headers.get('Accept', ''):
+        stream_events = aevent_stream if isinstance(request, ASGIRequest) else event_stream
+        response = StreamingHttpResponse(
+            stream_events(prompt, repository, context),
+            content_type=EVENT_STREAM
+        )
+        response['Cache-Control'] = 'no-cache'
+        # keep reverse proxies from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
     try:
-        result = process_chat_prompt(prompt, repository, context)
+        result = await aprocess_chat_prompt(prompt, repository, context)
 
         if 'error' in result:
-            return Response(
+            return JsonResponse(
                 {'error': result['error']},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        return Response(result)
+        return JsonResponse(result)
 
     except ValueError as e:
-        return Response(
+        return JsonResponse(
             {'error': str(e)},
             status=status.HTTP_400_BAD_REQUEST
         )
     except Exception as e:
-        return Response(
+        return JsonResponse(
             {'error': str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
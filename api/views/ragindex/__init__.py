@@ -1,3 +1,4 @@
 from .list import *
 from .delete import *
 from .vectorize import *
+from .update import *
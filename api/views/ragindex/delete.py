@@ -1,11 +1,12 @@
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
+import asyncio
+from django.http import JsonResponse
 from rest_framework import status
+from api.decorators import async_api_view
 from common.ragindex.delete import delete_repository
 
 
-@api_view(['DELETE'])
-def delete_repository_view(request):
+@async_api_view(['DELETE'])
+async def delete_repository_view(request):
     """
     Delete all vectors for a repository from the Pinecone database.
 
@@ -49,34 +50,34 @@ def delete_repository_view(request):
             }
     """
     if not request.data:
-        return Response(
+        return JsonResponse(
             {'error': 'Please provide repository string in the request body'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
     repository = request.data.get('repository')
     if not repository:
-        return Response(
+        return JsonResponse(
             {'error': 'Repository parameter is required'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    result = delete_repository(repository)
+    result = await asyncio.to_thread(delete_repository, repository)
 
     if 'error' in result:
         if 'Repository namespace not found' in result['error']:
-            return Response(
+            return JsonResponse(
                 {'error': result['error']},
                 status=status.HTTP_404_NOT_FOUND
             )
         if any(err in result['error'] for err in ['Invalid repository', 'must be in format']):
-            return Response(
+            return JsonResponse(
                 {'error': result['error']},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        return Response(
+        return JsonResponse(
             {'error': result['error']},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
-    return Response(result)
+    return JsonResponse(result)
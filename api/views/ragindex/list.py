@@ -1,18 +1,21 @@
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
+import asyncio
+from django.http import JsonResponse
 from rest_framework import status
+from api.decorators import async_api_view
 from common.ragindex.list import list_repositories
 
-@api_view(['GET'])
-def list_repositories_view(request):
+@async_api_view(['GET'])
+async def list_repositories_view(request):
     """
     List all repositories (namespaces) stored in the Pinecone database.
 
     This endpoint accepts GET requests and returns a list of all available
-    repository namespaces in the format owner/repo/branch.
+    repository namespaces in the format owner/repo/branch. With the query
+    parameter details=true, each entry is an object with the namespace, its
+    vector count, and the commit, source and time it was last indexed.
 
     Returns:
-        Response: JSON response containing the list of repositories
+        JsonResponse: JSON response containing the list of repositories
             {
                 'repositories': [
                     'owner1/repo1/branch1',
@@ -27,12 +30,13 @@ def list_repositories_view(request):
                 'error': '<error message>'
             }
     """
-    result = list_repositories()
+    details = request.GET.get('details', '').lower() in ('true', '1')
+    result = await asyncio.to_thread(list_repositories, details)
 
     if 'error' in result:
-        return Response(
+        return JsonResponse(
             {'error': result['error']},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
-    return Response(result)
+    return JsonResponse(result, safe=False)
@@ -0,0 +1,83 @@
+import asyncio
+from django.http import JsonResponse
+from rest_framework import status
+from api.decorators import async_api_view
+from common.ragindex.vectorize import VECTORIZE_SOURCES
+from common.ragindex.update import update_repository
+
+@async_api_view(['POST'])
+async def update_repository_view(request):
+    """
+    Update a vectorized repository with changes since it was last indexed.
+
+    Only files added or modified since the recorded commit are re-embedded,
+    and vectors for removed files are deleted. Repositories with no recorded
+    commit are vectorized in full.
+
+    Accepts POST requests with a JSON body containing:
+    {
+        'repository': 'owner/repo/branch',  # branch is optional, defaults to 'main'
+        'source': 'github'                  # optional, 'github' or 'clone'
+    }
+    The repository string can optionally start with a forward slash.
+
+    Returns:
+    200 OK: Successfully updated repository
+    {
+        'status': 'success',
+        'mode': 'incremental',
+        'previous_commit': '<sha>',
+        'commit': '<sha>',
+        'processed_files': 3,
+        'deleted_files': 1,
+        ...
+    }
+
+    400 Bad Request: Invalid input
+    {
+        'error': '<error message>'
+    }
+
+    500 Internal Server Error: Processing error
+    {
+        'error': '<error message>'
+    }
+    """
+    if not request.data:
+        return JsonResponse(
+            {'error': 'Please provide repository string in the request body'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    repository = request.data.get('repository')
+    if not repository:
+        return JsonResponse(
+            {'error': 'Repository parameter is required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    source = request.data.get('source', 'github')
+    if source not in VECTORIZE_SOURCES:
+        return JsonResponse(
+            {'error': f'Source must be one of: {", ".join(VECTORIZE_SOURCES)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        result = await asyncio.to_thread(update_repository, repository, source)
+
+        if 'error' in result:
+            return JsonResponse(
+                {'error': result['error']},
+                status=status.HTTP_400_BAD_REQUEST
+                if 'github_contents' in result
+                else status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        return JsonResponse(result)
+
+    except ValueError as e:
+        return JsonResponse(
+            {'error': str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
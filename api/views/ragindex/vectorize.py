@@ -1,18 +1,26 @@
-from rest_framework.decorators import api_view
-from rest_framework.response import Response
+import asyncio
+from django.http import JsonResponse
 from rest_framework import status
-from common.ragindex.vectorize import vectorize_repository
+from api.decorators import async_api_view
+from common.ragindex.vectorize import vectorize_repository, VECTORIZE_SOURCES
+from api.views.jobs.submit import submit_job_response
 
-@api_view(['POST'])
-def vectorize_repository_view(request):
+@async_api_view(['POST'])
+async def vectorize_repository_view(request):
     """
     Vectorize a GitHub repository's contents and store in Pinecone.
 
     Accepts POST requests with a JSON body containing:
     {
-        'repository': 'owner/repo/branch'  # branch is optional, defaults to 'main'
+        'repository': 'owner/repo/branch',  # branch is optional, defaults to 'main'
+        'source': 'github',                 # optional, 'github' or 'clone'
+        'background': false                 # optional, run as a background job
     }
     The repository string can optionally start with a forward slash.
+    With 'source' set to 'clone', file contents are read from the local clone
+    instead of the GitHub API. With 'background' set to true, the repository
+    is vectorized by the job queue and the job is returned at once, to be
+    polled at /api/jobs/<id>/.
 
     Examples:
         {
@@ -26,13 +34,20 @@ def vectorize_repository_view(request):
         }
 
     Returns:
+    202 Accepted: Background job submitted (or an identical active job found)
+    {
+        'job': {'id': '<job id>', 'status': 'queued', ...},
+        'coalesced': false
+    }
+
     200 OK: Successfully vectorized repository
     {
         'status': 'success',
         'processed_files': 5,
         'owner': 'owner',
         'repo': 'repo',
-        'branch': 'branch'
+        'branch': 'branch',
+        'source': 'github'
     }
 
     400 Bad Request: Invalid input
@@ -46,33 +61,49 @@ def vectorize_repository_view(request):
     }
     """
     if not request.data:
-        return Response(
+        return JsonResponse(
             {'error': 'Please provide repository string in the request body'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
     repository = request.data.get('repository')
     if not repository:
-        return Response(
+        return JsonResponse(
             {'error': 'Repository parameter is required'},
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    source = request.data.get('source', 'github')
+    if source not in VECTORIZE_SOURCES:
+        return JsonResponse(
+            {'error': f'Source must be one of: {", ".join(VECTORIZE_SOURCES)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    background = request.data.get('background', False)
+    if not isinstance(background, bool):
+        return JsonResponse(
+            {'error': 'Background field must be a boolean'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if background:
+        return await submit_job_response('vectorize', repository, source=source)
+
     try:
-        result = vectorize_repository(repository)
+        result = await asyncio.to_thread(vectorize_repository, repository, source)
         
         if 'error' in result:
-            return Response(
+            return JsonResponse(
                 {'error': result['error']},
                 status=status.HTTP_400_BAD_REQUEST
                 if 'github_contents' in result
                 else status.HTTP_500_INTERNAL_SERVER_ERROR
             )
             
-        return Response(result)
+        return JsonResponse(result)
         
     except ValueError as e:
-        return Response(
+        return JsonResponse(
             {'error': str(e)},
             status=status.HTTP_400_BAD_REQUEST
         )
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""
+Benchmark GitHub repository fetching against a local stub GitHub server.
+
+Compares the legacy fetch path (one contents API call per directory, one
+unpooled download per file) with the recursive tree listing and pooled,
+concurrent downloads in common.github.
+
+    python benchmarks/github_fetch.py --dirs 20 --files 25 --latency 0.02
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, unquote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings
+
+
+OWNER = 'stub'
+REPO = 'repo'
+BRANCH = 'main'
+
+
+def build_tree(dirs, files):
+    """
+    Synthetic repository: {path: content}
+    """
+    tree = {}
+    for d in range(dirs):
+        for f in range(files):
+            path = f'pkg{d}/module{f}.py'
+            tree[path] = f'def function_{d}_{f}():\n    return {d * f}\n' * 20
+    tree['README.md'] = '# stub repository\n'
+    return tree
+
+
+def make_handler(tree, base_url, latency, counter):
+    directories = {}
+    for path in tree:
+        parts = path.split('/')
+        for i in range(len(parts)):
+            parent = '/'.join(parts[:i])
+            child = '/'.join(parts[:i + 1])
+            directories.setdefault(parent, set()).add(child)
+
+    def entry(path):
+        if path in tree:
+            return {
+                'type': 'file',
+                'name': os.path.basename(path),
+                'path': path,
+                'download_url': f'{base_url}/raw/{OWNER}/{REPO}/{BRANCH}/{path}'
+            }
+        return {'type': 'dir', 'name': os.path.basename(path), 'path': path}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def send_body(self, status, body):
+            data = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            with counter['lock']:
+                counter['requests'] += 1
+            time.sleep(latency)
+
+            url = urlparse(self.path)
+            path = unquote(url.path)
+            contents_prefix = f'/repos/{OWNER}/{REPO}/contents/'
+            trees_prefix = f'/repos/{OWNER}/{REPO}/git/trees/'
+            raw_prefix = f'/raw/{OWNER}/{REPO}/{BRANCH}/'
+
+            if path.startswith(contents_prefix):
+                sub = path[len(contents_prefix):].strip('/')
+                if sub in tree:
+                    return self.send_body(200, json.dumps(entry(sub)))
+                if sub in directories:
+                    return self.send_body(200, json.dumps(
+                        [entry(child) for child in sorted(directories[sub])]))
+                return self.send_body(404, '{}')
+
+            if path.startswith(trees_prefix):
+                items = [{'path': d, 'type': 'tree', 'sha': '0' * 40}
+                         for d in directories if d]
+                items += [{'path': p, 'type': 'blob', 'sha': '1' * 40, 'size': len(c)}
+                          for p, c in tree.items()]
+                return self.send_body(200, json.dumps({'tree': items, 'truncated': False}))
+
+            if path.startswith(raw_prefix):
+                sub = path[len(raw_prefix):]
+                if sub in tree:
+                    return self.send_body(200, tree[sub])
+
+            return self.send_body(404, '')
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dirs', type=int, default=20, help='directories in the stub repo')
+    parser.add_argument('--files', type=int, default=25, help='files per directory')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds added to every response')
+    parser.add_argument('--workers', type=int, default=8, help='concurrent downloads')
+    args = parser.parse_args()
+
+    counter = {'requests': 0, 'lock': threading.Lock()}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), None)
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    tree = build_tree(args.dirs, args.files)
+    server.RequestHandlerClass = make_handler(tree, base_url, args.latency, counter)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    settings.configure(
+        GITHUB_API_URL=base_url,
+        GITHUB_RAW_URL=f'{base_url}/raw',
+        GITHUB_TOKEN='',
+        GITHUB_FETCH_WORKERS=args.workers,
+    )
+
+    import requests
+    from common.utils import get_github_contents, is_vectorizable_file
+    from common.github import list_github_tree, fetch_github_files
+
+    def legacy():
+        contents = get_github_contents(OWNER, REPO, BRANCH)
+        return [requests.get(f['download_url']).text
+                for f in contents if is_vectorizable_file(f)]
+
+    def pooled():
+        contents = list_github_tree(OWNER, REPO, BRANCH)
+        candidates = [f for f in contents if is_vectorizable_file(f)]
+        return [content for _, content, _ in fetch_github_files(candidates)]
+
+    print(f'stub repo: {len(tree)} files in {args.dirs} directories, '
+          f'{args.latency * 1000:.0f} ms latency, {args.workers} workers')
+    for name, run in [('legacy contents walk', legacy), ('tree + pooled fetch', pooled)]:
+        counter['requests'] = 0
+        start = time.perf_counter()
+        fetched = run()
+        elapsed = time.perf_counter() - start
+        print(f'{name:22} files={len(fetched):5d} requests={counter["requests"]:5d} '
+              f'seconds={elapsed:7.3f}')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
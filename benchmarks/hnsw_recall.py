@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Benchmark HNSW search in the local vector store against exact search.
+
+Builds a graph over synthetic clustered vectors (embeddings of related code
+cluster in the same way) and reports recall@k and query latency for several
+ef values, next to the exact brute-force scan.
+
+    python benchmarks/hnsw_recall.py --vectors 20000 --dimension 256 --queries 200
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings
+
+
+def clustered_vectors(count, dimension, clusters, rng):
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    labels = rng.integers(0, clusters, count)
+    vectors = centers[labels] + 0.5 * rng.standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_top_k(matrix, query, k):
+    scores = matrix @ query
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return (sum(ordered) / len(ordered) * 1000,
+            ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--vectors', type=int, default=20000)
+    parser.add_argument('--dimension', type=int, default=256)
+    parser.add_argument('--clusters', type=int, default=100)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--M', type=int, default=16)
+    parser.add_argument('--ef-construction', type=int, default=200)
+    parser.add_argument('--ef', type=int, nargs='+', default=[16, 32, 64, 128, 256])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # the ragindex package resolves its vector index on import
+    settings.configure(
+        VECTOR_BACKEND='local',
+        LOCAL_VECTOR_DIR=tempfile.mkdtemp(),
+        EMBEDDING_DIMENSIONS=args.dimension,
+        LOCAL_HNSW_THRESHOLD=0,
+        LOCAL_HNSW_M=args.M,
+        LOCAL_HNSW_EF_CONSTRUCTION=args.ef_construction,
+        LOCAL_HNSW_EF_SEARCH=64,
+    )
+    from common.ragindex.hnsw import HNSWGraph
+
+    rng = np.random.default_rng(args.seed)
+    matrix = clustered_vectors(args.vectors, args.dimension, args.clusters, rng)
+    queries = clustered_vectors(args.queries, args.dimension, args.clusters, rng)
+
+    with tempfile.TemporaryDirectory() as path:
+        graph = HNSWGraph(path, M=args.M, ef_construction=args.ef_construction, seed=args.seed)
+        start = time.perf_counter()
+        graph.insert(matrix, range(len(matrix)))
+        graph.save()
+        build = time.perf_counter() - start
+        print(f'built graph over {len(matrix)} x {args.dimension} vectors '
+              f'(M={args.M}, ef_construction={args.ef_construction}) in {build:.1f}s')
+
+        # reload from disk, as the store does
+        graph = HNSWGraph(path)
+
+        latencies, truth = [], []
+        for query in queries:
+            start = time.perf_counter()
+            truth.append(set(exact_top_k(matrix, query, args.k).tolist()))
+            latencies.append(time.perf_counter() - start)
+        mean, p95 = summarize(latencies)
+        print(f'\n{"search":>12} {"recall@" + str(args.k):>10} {"mean ms":>9} {"p95 ms":>9}')
+        print(f'{"exact":>12} {1.0:>10.3f} {mean:>9.2f} {p95:>9.2f}')
+
+        for ef in args.ef:
+            latencies, hits = [], 0
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                rows, _ = graph.search(matrix, query, args.k, ef=ef)
+                latencies.append(time.perf_counter() - start)
+                hits += len(expected & set(rows.tolist()))
+            mean, p95 = summarize(latencies)
+            print(f'{"hnsw ef=" + str(ef):>12} {hits / (args.k * len(queries)):>10.3f} '
+                  f'{mean:>9.2f} {p95:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,90 +1,92 @@
+import importlib
 import os
+import sqlite3
+import threading
+import uuid
 from django.conf import settings
 from common.utils import parse_repository_string
-from common.clone.files import formatted_files_from_clone
+from common.clone.packer import pack_clone_context, shard_clone_context
 
 
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
+from langgraph.constants import Send
 from typing import TypedDict, Annotated, List
 import operator
-from langgraph.checkpoint.sqlite import SqliteSaver
-from langchain_core.messages import AnyMessage, SystemMessage, HumanMessage, AIMessage, ChatMessage
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_openai import ChatOpenAI
+from langchain_core.messages import SystemMessage, HumanMessage
+from common.clients import get_chat_model
 from pydantic import BaseModel
-from tavily import TavilyClient
+from .research import research
 
 
-def agent_analyze(command, repository):
-    try:
-        owner, repo, branch = parse_repository_string(repository)
-        clone_dir = f"{settings.GITHUB_CLONE_DIR}/{owner}/{repo}/{branch}"
-    except ValueError as e:
-        return {'error': str(e)}
-    except Exception as e:
-        return {'error': f'{str(e)}'}
+# analysis command: module holding its prompts
+ANALYSES = {
+    'code_review': 'analyze_codereview_prompts',
+    'project_context': 'analyze_projectcontext_prompts',
+}
 
-    try:
-        file_contents = formatted_files_from_clone(repository)
-    except Exception as e:
-        return {'error': f'Failed to read files: {str(e)}'}
-    except ValueError as e:
-        return {'error': str(e)}
+# 'chain' runs one plan, research, write and reflect chain over the packed
+# repository; 'mapreduce' writes an analysis per directory shard
+# concurrently and merges them
+MODES = ('chain', 'mapreduce')
 
 
-    model = ChatOpenAI(
-        api_key=settings.OPENAI_API_KEY,
-        model="gpt-4o-mini",
-        temperature=0
-    )
-    tavily = TavilyClient(
-        api_key=settings.TAVILY_API_KEY
-    )
-    memory = MemorySaver()
+class AgentState(TypedDict):
+    task: str
+    plan: str
+    draft: str
+    critique: str
+    content: List[str]
+    revision_number: int
+    max_revisions: int
+
 
-    match command:
-        case "code_review":
-            from .analyze_codereview_prompts import TASK_PROMPT, PLAN_PROMPT, RESEARCH_PLAN_PROMPT, WRITER_PROMPT, REFLECTION_PROMPT, RESEARCH_CRITIQUE_PROMPT
-        case "project_context":
-            from .analyze_projectcontext_prompts import TASK_PROMPT, PLAN_PROMPT, RESEARCH_PLAN_PROMPT, WRITER_PROMPT, REFLECTION_PROMPT, RESEARCH_CRITIQUE_PROMPT
-        case _:
-            return {'error': 'Invalid command'}
+class Queries(BaseModel):
+    queries: List[str]
 
 
-    class AgentState(TypedDict):
-        task: str
-        plan: str
-        draft: str
-        critique: str
-        content: List[str]
-        revision_number: int
-        max_revisions: int
+class ShardState(TypedDict):
+    name: str
+    task: str
 
-    class Queries(BaseModel):
-        queries: List[str]
 
+class MapReduceState(TypedDict):
+    shards: List[ShardState]
+    reviews: Annotated[List[dict], operator.add]
+    draft: str
+
+
+def should_continue(state):
+    if state["revision_number"] > state["max_revisions"]:
+        return END
+    return "reflect"
+
+
+def build_analysis_graph(prompts):
+    """
+    Build the plan, research, write and reflect graph for an analysis.
+
+    Args:
+        prompts (module): Module defining PLAN_PROMPT, RESEARCH_PLAN_PROMPT,
+                          WRITER_PROMPT, REFLECTION_PROMPT and
+                          RESEARCH_CRITIQUE_PROMPT
+
+    Returns:
+        StateGraph: The uncompiled graph
+    """
     def plan_node(state: AgentState):
         messages = [
-            SystemMessage(content=PLAN_PROMPT),
+            SystemMessage(content=prompts.PLAN_PROMPT),
             HumanMessage(content=state['task'])
         ]
-        response = model.invoke(messages)
+        response = get_chat_model('gpt-4o-mini', 0.0).invoke(messages)
         return {"plan": response.content}
 
     def research_plan_node(state: AgentState):
-        queries = model.with_structured_output(Queries).invoke([
-            SystemMessage(content=RESEARCH_PLAN_PROMPT),
+        queries = get_chat_model('gpt-4o-mini', 0.0).with_structured_output(Queries).invoke([
+            SystemMessage(content=prompts.RESEARCH_PLAN_PROMPT),
             HumanMessage(content=state['task'])
         ])
-        try:
-            content = state['content']
-        except KeyError:
-            content = []
-        for q in queries.queries:
-            response = tavily.search(query=q, max_results=2)
-            for r in response['results']:
-                content.append(r['content'])
-        return {"content": content}
+        return {"content": research(queries.queries, state.get('content'))}
 
     def generation_node(state: AgentState):
         content = "\n\n".join(state['content'] or [])
@@ -92,11 +94,11 @@ def agent_analyze(command, repository):
             content=f"{state['task']}\n\nHere is my plan:\n\n{state['plan']}")
         messages = [
             SystemMessage(
-                content=WRITER_PROMPT.format(content=content)
+                content=prompts.WRITER_PROMPT.format(content=content)
             ),
             user_message
             ]
-        response = model.invoke(messages)
+        response = get_chat_model('gpt-4o-mini', 0.0).invoke(messages)
         return {
             "draft": response.content,
             "revision_number": state.get("revision_number", 1) + 1
@@ -104,30 +106,18 @@ def agent_analyze(command, repository):
 
     def reflection_node(state: AgentState):
         messages = [
-            SystemMessage(content=REFLECTION_PROMPT),
+            SystemMessage(content=prompts.REFLECTION_PROMPT),
             HumanMessage(content=state['draft'])
         ]
-        response = model.invoke(messages)
+        response = get_chat_model('gpt-4o-mini', 0.0).invoke(messages)
         return {"critique": response.content}
 
     def research_critique_node(state: AgentState):
-        queries = model.with_structured_output(Queries).invoke([
-            SystemMessage(content=RESEARCH_CRITIQUE_PROMPT),
+        queries = get_chat_model('gpt-4o-mini', 0.0).with_structured_output(Queries).invoke([
+            SystemMessage(content=prompts.RESEARCH_CRITIQUE_PROMPT),
             HumanMessage(content=state['critique'])
         ])
-        content = state['content'] or []
-        for q in queries.queries:
-            response = tavily.search(query=q, max_results=2)
-            for r in response['results']:
-                content.append(r['content'])
-        return {"content": content}
-
-    def should_continue(state):
-        if state["revision_number"] > state["max_revisions"]:
-            return END
-        return "reflect"
-
-
+        return {"content": research(queries.queries, state.get('content'))}
 
     builder = StateGraph(AgentState)
     builder.add_node("planner", plan_node)
@@ -142,38 +132,261 @@ def agent_analyze(command, repository):
         {END: END, "reflect": "reflect"}
     )
 
-
     builder.add_edge("planner", "research_plan")
     builder.add_edge("research_plan", "generate")
     builder.add_edge("reflect", "research_critique")
     builder.add_edge("research_critique", "generate")
-    graph = builder.compile(checkpointer=memory)
+    return builder
+
 
-    thread = {"configurable": {"thread_id": "1"}}
-    for s in graph.stream({
-        'task': TASK_PROMPT.format(file_contents=file_contents),
+def build_mapreduce_graph(prompts):
+    """
+    Build the map-reduce graph for an analysis: every shard is planned and
+    written in its own branch, and the shard analyses are merged by a reduce
+    node. Branches run concurrently up to the max_concurrency of the run.
+
+    Args:
+        prompts (module): As for build_analysis_graph, also defining
+                          SHARD_PROMPT and REDUCE_PROMPT
+
+    Returns:
+        StateGraph: The uncompiled graph
+    """
+    def fan_out(state: MapReduceState):
+        return [Send("analyze_shard", shard) for shard in state['shards']]
+
+    def shard_node(state: ShardState):
+        model = get_chat_model('gpt-4o-mini', 0.0)
+        plan = model.invoke([
+            SystemMessage(content=prompts.PLAN_PROMPT),
+            HumanMessage(content=state['task'])
+        ])
+        response = model.invoke([
+            SystemMessage(content=prompts.WRITER_PROMPT.format(content='')),
+            HumanMessage(content=f"{state['task']}\n\nHere is my plan:\n\n{plan.content}")
+        ])
+        return {"reviews": [{"name": state['name'], "draft": response.content}]}
+
+    def reduce_node(state: MapReduceState):
+        from common.llm.embeddings import truncate_tokens
+        # branches finish in any order
+        order = {shard['name']: position for position, shard in enumerate(state['shards'])}
+        reviews = sorted(state['reviews'], key=lambda review: order.get(review['name'], 0))
+        # keep the merged input within the context budget of a single run
+        share = max(1, settings.AGENT_CONTEXT_TOKENS // max(1, len(reviews)))
+        merged = "\n\n".join(
+            f"## Part: {review['name']}\n\n{truncate_tokens(review['draft'], share, 'gpt-4o-mini')}"
+            for review in reviews
+        )
+        response = get_chat_model('gpt-4o-mini', 0.0).invoke([
+            SystemMessage(content=prompts.REDUCE_PROMPT),
+            HumanMessage(content=merged)
+        ])
+        return {"draft": response.content}
+
+    builder = StateGraph(MapReduceState)
+    builder.add_node("analyze_shard", shard_node)
+    builder.add_node("reduce", reduce_node)
+    builder.add_conditional_edges(START, fan_out, ["analyze_shard"])
+    builder.add_edge("analyze_shard", "reduce")
+    builder.add_edge("reduce", END)
+    return builder
+
+
+_graphs = {}
+_checkpointer = None
+_graphs_lock = threading.Lock()
+
+
+def get_checkpointer():
+    """
+    Return the process-wide SQLite checkpointer at AGENT_CHECKPOINT_DB, or
+    None if checkpointing is disabled.
+    """
+    global _checkpointer
+    if not settings.AGENT_CHECKPOINT_DB:
+        return None
+    with _graphs_lock:
+        if _checkpointer is None:
+            from langgraph.checkpoint.sqlite import SqliteSaver
+            path = settings.AGENT_CHECKPOINT_DB
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            _checkpointer = SqliteSaver(sqlite3.connect(path, check_same_thread=False))
+        return _checkpointer
+
+
+def get_analysis_graph(command, mode='chain'):
+    """
+    Return the compiled graph for an analysis command and mode, compiling it
+    on first use.
+
+    Args:
+        command (str): One of ANALYSES
+        mode (str): One of MODES
+
+    Returns:
+        tuple: (compiled graph, prompts module)
+    """
+    checkpointer = get_checkpointer()
+    with _graphs_lock:
+        if (command, mode) not in _graphs:
+            prompts = importlib.import_module(f'.{ANALYSES[command]}', __package__)
+            build = build_mapreduce_graph if mode == 'mapreduce' else build_analysis_graph
+            graph = build(prompts).compile(checkpointer=checkpointer)
+            _graphs[(command, mode)] = (graph, prompts)
+        return _graphs[(command, mode)]
+
+
+def analysis_input(prompts, mode, repository):
+    """
+    Build the input of an analysis run from the files of a local clone.
+
+    Returns:
+        tuple: (graph input, report of the files given to the agent)
+    """
+    if mode == 'mapreduce':
+        shards = shard_clone_context(repository)
+        if not shards:
+            raise ValueError('No files to analyze')
+        agent_input = {'shards': [
+            {
+                'name': shard['name'],
+                'task': prompts.SHARD_PROMPT.format(shard=shard['name'])
+                        + prompts.TASK_PROMPT.format(file_contents=shard['text'])
+            }
+            for shard in shards
+        ]}
+        context = {'shards': [{key: value for key, value in shard.items() if key != 'text'}
+                              for shard in shards]}
+        return agent_input, context
+
+    packed = pack_clone_context(repository)
+    agent_input = {
+        'task': prompts.TASK_PROMPT.format(file_contents=packed['text']),
         "max_revisions": 2,
         "revision_number": 1,
-    }, thread):
-        if settings.DEBUG == "True":
-            print(s, '\n\n')
+    }
+    return agent_input, {key: value for key, value in packed.items() if key != 'text'}
+
+
+def agent_analyze(command, repository, progress=None, thread_id=None, mode=None):
+    """
+    Run an analysis agent over a local repository clone.
+
+    In 'chain' mode the clone's files are packed into the agent's task within
+    AGENT_CONTEXT_TOKENS by common.clone.packer. In 'mapreduce' mode the
+    files are split into directory shards of AGENT_SHARD_TOKENS, analyzed
+    concurrently, at most AGENT_MAP_CONCURRENCY at a time, and merged, so
+    wall time depends on shard size rather than repository size.
+
+    With AGENT_CHECKPOINT_DB set, every step of a run is checkpointed under
+    its thread id. Passing the thread id of a run that failed resumes it
+    from its last checkpoint, and passing the thread id of a finished run
+    returns its result.
+
+    Args:
+        command (str): 'code_review' or 'project_context'
+        repository (str): Repository string in format 'owner/repo/branch'
+        progress (callable, optional): Called with {'stage': <graph node>,
+                                       'steps': <nodes completed>} after
+                                       each step of the agent graph
+        thread_id (str, optional): Thread id of a checkpointed run to resume
+        mode (str, optional): One of MODES, defaults to settings.AGENT_MODE
+
+    Returns:
+        dict:
+            On success:
+                {
+                    'status': 'success',
+                    'content': 'analysis',
+                    'thread_id': 'run thread id',
+                    'context': pack_clone_context report of the files given
+                               to the agent, without its text, or in
+                               mapreduce mode {'shards': [report, ...]}
+                               (not on resume)
+                }
+            On error:
+                {
+                    'error': 'error message',
+                    'thread_id': 'run thread id' (once the run has started)
+                }
+    """
+    try:
+        owner, repo, branch = parse_repository_string(repository)
+    except ValueError as e:
+        return {'error': str(e)}
+    except Exception as e:
+        return {'error': f'{str(e)}'}
 
+    if command not in ANALYSES:
+        return {'error': 'Invalid command'}
+    mode = mode or settings.AGENT_MODE
+    if mode not in MODES:
+        return {'error': f'Invalid mode: {mode}'}
+
+    graph, prompts = get_analysis_graph(command, mode)
+    checkpointer = get_checkpointer()
+    if thread_id and checkpointer is None:
+        return {'error': 'Resuming a run requires AGENT_CHECKPOINT_DB'}
+
+    thread_id = str(thread_id or uuid.uuid4())
+    thread = {
+        "configurable": {"thread_id": thread_id},
+        "max_concurrency": settings.AGENT_MAP_CONCURRENCY
+    }
+
+    resume = False
+    if checkpointer is not None:
+        snapshot = graph.get_state(thread)
+        if snapshot.values and not snapshot.next:
+            # the run already finished
+            return {
+                "status": "success",
+                "content": snapshot.values['draft'],
+                "thread_id": thread_id
+            }
+        resume = bool(snapshot.values)
+
+    # a resumed run continues from its checkpoint without new input
+    agent_input = None
+    context = None
+    if not resume:
+        try:
+            agent_input, context = analysis_input(prompts, mode, repository)
+        except ValueError as e:
+            return {'error': str(e)}
+        except Exception as e:
+            return {'error': f'Failed to read files: {str(e)}'}
+
+    steps = 0
+    draft = None
     try:
+        for s in graph.stream(agent_input, thread):
+            if settings.DEBUG == "True":
+                print(s, '\n\n')
+            steps += 1
+            stage = next(iter(s))
+            # the final analysis is the last draft written
+            if isinstance(s[stage], dict) and 'draft' in s[stage]:
+                draft = s[stage]['draft']
+            if progress:
+                progress({'stage': stage, 'steps': steps})
+    except Exception as e:
         return {
-            "status": "success",
-            "content": s['generate']['draft']
+            "error": f"Analysis failed: {str(e)}",
+            "thread_id": thread_id
         }
-    except AttributeError as e:
+
+    if draft is None:
         return {
-            "status": "error",
-            "error": f"Failed to generate code review: {str(e)}"
+            "error": "Failed to generate analysis",
+            "thread_id": thread_id
         }
-
-
-
-
-
-
-
-
-
+    result = {
+        "status": "success",
+        "content": draft,
+        "thread_id": thread_id
+    }
+    if context:
+        result["context"] = context
+    return result
@@ -58,3 +58,20 @@ Generate a list of search queries that will gather any relevant information. Onl
 
 
 
+
+SHARD_PROMPT = """
+The code below is one part of a larger repository, made up of: {shard}. The other parts are reviewed separately. Review only the code provided.
+"""
+
+REDUCE_PROMPT = """
+You are a Principal Software Engineer tasked with writing a detailed code review of a repository from reviews of each of its parts. Merge the reviews provided by the user into a single code review of the whole repository.
+
+Instructions:
+- Produce github-flavored markdown.
+- Keep every critical issue and specific example from the reviews.
+- Combine findings that recur across parts into one point, listing where they occur.
+- Organize the review by section of the code, not by part.
+- Do not include recommendations on collaboration or followup.
+- Do not provide notes or instructions for developers.
+- Do not provide notes or instructions for reviewers.
+"""
@@ -52,3 +52,19 @@ Generate a list of search queries that will gather any relevant information. Onl
 
 
 
+
+SHARD_PROMPT = """
+The code below is one part of a larger repository, made up of: {shard}. The other parts are described separately. Describe only the code provided.
+"""
+
+REDUCE_PROMPT = """
+You are a Principal Software Engineer tasked with writing a detailed project context from project contexts of each part of a repository. Merge the project contexts provided by the user into a single project context for the whole repository.
+
+Instructions:
+- Produce github-flavored markdown.
+- Do not decorate the markdown
+- Keep the important subject matter from every part.
+- Describe how the parts fit together, including entry points such as API endpoints and CLI scripts.
+- Identify major libraries and frameworks with versions used in the code.
+- Do not include installation or setup instructions.
+"""
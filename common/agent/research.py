@@ -0,0 +1,185 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.conf import settings
+from common.clients import get_tavily
+
+logger = logging.getLogger('django')
+
+
+def _query_key(query, max_results):
+    return hashlib.sha256(f'{max_results}:{query}'.encode('utf-8')).hexdigest()
+
+
+def _content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResearchCache:
+    """
+    Persistent cache of Tavily search responses keyed by (query, max_results).
+
+    Responses are stored as JSON in SQLite and served until they are older
+    than ttl seconds, so repeated searches are free across agent revisions
+    and runs.
+    """
+
+    def __init__(self, path=None, ttl=None):
+        self.path = str(path or settings.RESEARCH_CACHE_PATH)
+        self.ttl = float(settings.RESEARCH_CACHE_TTL if ttl is None else ttl)
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS searches ('
+            ' key TEXT PRIMARY KEY,'
+            ' response TEXT NOT NULL,'
+            ' created REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def get(self, query, max_results):
+        """
+        Return the cached response for the search, or None if it is missing
+        or expired.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT response, created FROM searches WHERE key = ?',
+                (_query_key(query, max_results),)
+            ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, query, max_results, response):
+        """
+        Store a search response, dropping expired entries.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO searches (key, response, created) VALUES (?, ?, ?)',
+                (_query_key(query, max_results), json.dumps(response), now)
+            )
+            self._conn.execute('DELETE FROM searches WHERE created < ?', (now - self.ttl,))
+            self._conn.commit()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_research_cache():
+    """
+    Return the process-wide research cache, or None if caching is disabled.
+    """
+    global _cache
+    if not settings.RESEARCH_CACHE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResearchCache()
+        return _cache
+
+
+def search_many(queries, max_results=2, timeout=None, concurrency=None):
+    """
+    Run Tavily searches concurrently, serving repeated searches from the
+    research cache.
+
+    Searches still running after timeout seconds, and searches that fail,
+    are logged and left out, so one slow query cannot hold up the agent.
+
+    Args:
+        queries (list): Search queries; duplicates are searched once
+        max_results (int): Results per query
+        timeout (float, optional): Defaults to settings.RESEARCH_TIMEOUT
+        concurrency (int, optional): Defaults to settings.RESEARCH_CONCURRENCY
+
+    Returns:
+        list: Result dicts ('url', 'content', ...) in query order
+    """
+    timeout = float(settings.RESEARCH_TIMEOUT if timeout is None else timeout)
+    concurrency = int(concurrency or settings.RESEARCH_CONCURRENCY)
+    queries = list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))
+    cache = get_research_cache()
+
+    responses = {}
+    missing = []
+    for query in queries:
+        cached = cache.get(query, max_results) if cache else None
+        if cached is not None:
+            responses[query] = cached
+        else:
+            missing.append(query)
+
+    if missing:
+        tavily = get_tavily()
+        executor = ThreadPoolExecutor(max_workers=min(concurrency, len(missing)),
+                                      thread_name_prefix='research')
+        futures = {
+            executor.submit(tavily.search, query=query, max_results=max_results,
+                            timeout=timeout): query
+            for query in missing
+        }
+        done, not_done = wait(futures, timeout=timeout)
+        # do not wait for searches that timed out
+        executor.shutdown(wait=False, cancel_futures=True)
+        for future in not_done:
+            logger.warning(f'Research query timed out: {futures[future]}')
+        for future in done:
+            query = futures[future]
+            try:
+                response = future.result()
+            except Exception as e:
+                logger.warning(f'Research query failed: {query}: {str(e)}')
+                continue
+            responses[query] = response
+            if cache:
+                cache.put(query, max_results, response)
+
+    return [result
+            for query in queries if query in responses
+            for result in responses[query].get('results', [])]
+
+
+def research(queries, content=None, max_results=2):
+    """
+    Search for the queries and add the new findings to the agent's research
+    content.
+
+    Results are de-duplicated by URL across the searches, and by content
+    hash against each other and the content already gathered.
+
+    Args:
+        queries (list): Search queries
+        content (list, optional): Research content gathered so far
+        max_results (int): Results per query
+
+    Returns:
+        list: content followed by the new result contents
+    """
+    content = list(content or [])
+    seen_content = {_content_hash(text) for text in content}
+    seen_urls = set()
+    for result in search_many(queries, max_results=max_results):
+        text = result.get('content')
+        if not text:
+            continue
+        url = result.get('url')
+        digest = _content_hash(text)
+        if url in seen_urls or digest in seen_content:
+            continue
+        if url:
+            seen_urls.add(url)
+        seen_content.add(digest)
+        content.append(text)
+    return content
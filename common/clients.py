@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import threading
+from django.conf import settings
+
+logger = logging.getLogger('django')
+
+_clients = {}
+_loop_clients = {}
+_clients_lock = threading.RLock()
+
+
+def _client(key, factory):
+    """
+    Return the process-wide client stored under key, creating it with
+    factory() on first use. Clients are thread-safe and reused so their
+    connection pools are shared across requests.
+    """
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = factory()
+        return client
+
+
+def _loop_client(key, factory):
+    """
+    Like _client, for asyncio clients. Their pooled connections belong to the
+    event loop that opened them, so one client is kept per running loop, and
+    clients of closed loops are dropped. Under an ASGI server that is one
+    client per process; under runserver each request gets its own loop.
+    """
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        for loop_id in [loop_id for loop_id, (owner, _) in _loop_clients.items()
+                        if owner.is_closed()]:
+            del _loop_clients[loop_id]
+        clients = _loop_clients.setdefault(id(loop), (loop, {}))[1]
+        client = clients.get(key)
+        if client is None:
+            client = clients[key] = factory()
+        return client
+
+
+def reset_clients():
+    """
+    Drop every cached client, e.g. after settings change in tests.
+    """
+    with _clients_lock:
+        _clients.clear()
+        _loop_clients.clear()
+
+
+def get_openai():
+    """
+    Return the shared OpenAI client.
+    """
+    from openai import OpenAI
+    return _client('openai', lambda: OpenAI(api_key=settings.OPENAI_API_KEY))
+
+
+def get_async_openai():
+    """
+    Return the AsyncOpenAI client for the running event loop.
+    """
+    from openai import AsyncOpenAI
+    return _loop_client('openai', lambda: AsyncOpenAI(api_key=settings.OPENAI_API_KEY))
+
+
+def _new_chat_model(model, temperature):
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        model_name=model,
+        temperature=temperature
+    )
+
+
+def get_chat_model(model='gpt-4o-mini', temperature=0.0):
+    """
+    Return a shared ChatOpenAI for the model and temperature.
+    """
+    return _client(('chat', model, temperature),
+                   lambda: _new_chat_model(model, temperature))
+
+
+def get_async_chat_model(model='gpt-4o-mini', temperature=0.0):
+    """
+    Return a ChatOpenAI for the model and temperature whose async client
+    belongs to the running event loop, for ainvoke and astream.
+    """
+    return _loop_client(('chat', model, temperature),
+                        lambda: _new_chat_model(model, temperature))
+
+
+def get_embeddings():
+    """
+    Return the shared LangChain embeddings adapter.
+    """
+    def create():
+        from common.llm.embeddings import BatchedOpenAIEmbeddings
+        return BatchedOpenAIEmbeddings()
+    return _client('embeddings', create)
+
+
+def get_pinecone():
+    """
+    Return the shared Pinecone control plane client.
+    """
+    from pinecone import Pinecone
+    return _client('pinecone', lambda: Pinecone(api_key=settings.PINECONE_API_KEY))
+
+
+def get_pinecone_index():
+    """
+    Return the shared REST client for settings.PINECONE_INDEX. Resolving the
+    index host is a network call, made once per process.
+    """
+    return _client('pinecone_index', lambda: get_pinecone().Index(settings.PINECONE_INDEX))
+
+
+def get_pinecone_data_plane():
+    """
+    Return the shared index client used for bulk upserts and deletes: gRPC
+    when PINECONE_GRPC is enabled and its dependencies are installed,
+    otherwise the REST client.
+    """
+    def create():
+        if settings.PINECONE_GRPC:
+            try:
+                from pinecone.grpc import PineconeGRPC
+                return PineconeGRPC(api_key=settings.PINECONE_API_KEY).Index(settings.PINECONE_INDEX)
+            except ImportError:
+                pass
+        return get_pinecone_index()
+    return _client('pinecone_data_plane', create)
+
+
+def get_pinecone_vector_store(namespace, embeddings):
+    """
+    Return the shared LangChain PineconeVectorStore for a namespace, built on
+    the shared index client so that no client is created and no index host
+    is resolved per request. Stores are kept per namespace and embeddings
+    object; the store holds a reference to its embeddings, so the key stays
+    unique while it is cached.
+    """
+    def create():
+        from langchain_pinecone import PineconeVectorStore
+        return PineconeVectorStore(index=get_pinecone_index(), embedding=embeddings,
+                                   namespace=namespace)
+    return _client(('pinecone_store', namespace, id(embeddings)), create)
+
+
+def get_tavily():
+    """
+    Return the shared Tavily search client.
+    """
+    from tavily import TavilyClient
+    return _client('tavily', lambda: TavilyClient(api_key=settings.TAVILY_API_KEY))
+
+
+def get_retrieval_qa_prompt():
+    """
+    Return the retrieval QA chat prompt.
+
+    The vendored copy is used unless RETRIEVAL_PROMPT_FROM_HUB is set, in
+    which case the prompt is pulled from the LangChain hub once per process.
+    """
+    def create():
+        from common.llm.retrieval_prompts import (
+            RETRIEVAL_QA_CHAT_SYSTEM_PROMPT, RETRIEVAL_QA_CHAT_HUB_NAME
+        )
+        if settings.RETRIEVAL_PROMPT_FROM_HUB:
+            from langchain import hub
+            return hub.pull(RETRIEVAL_QA_CHAT_HUB_NAME)
+
+        from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+        return ChatPromptTemplate.from_messages([
+            ('system', RETRIEVAL_QA_CHAT_SYSTEM_PROMPT),
+            MessagesPlaceholder('chat_history', optional=True),
+            ('human', '{input}')
+        ])
+    return _client('retrieval_qa_prompt', create)
+
+
+def warm_up():
+    """
+    Create the clients used to answer prompts, so the first request does not
+    pay for construction, the Pinecone index host lookup or a hub fetch.
+    Failures are logged and left for the request to report.
+    """
+    steps = [get_openai, get_chat_model, get_embeddings, get_retrieval_qa_prompt]
+    if settings.VECTOR_BACKEND == 'pinecone':
+        steps.append(get_pinecone_index)
+    for step in steps:
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f'Client warm-up failed in {step.__name__}: {str(e)}')
+
+
+def start_warm_up():
+    """
+    Run warm_up in a background thread if WARM_UP_CLIENTS is set. Called
+    from the WSGI and ASGI entry points so that only servers warm up, and
+    without delaying startup.
+    """
+    if settings.WARM_UP_CLIENTS:
+        threading.Thread(target=warm_up, name='client-warm-up', daemon=True).start()
@@ -1,5 +1,9 @@
 from .list import *
 from .delete import *
 from .create import *
+from .mirror import *
+from .walk import *
 from .files import *
 from .write_file import *
+from .tree import *
+from .packer import *
@@ -1,15 +1,163 @@
 import os
+import re
+import shutil
+import subprocess
+import time
+from pathlib import Path
 from django.conf import settings
 from common.utils import parse_repository_string
 import pygit2
 
-def create_clone(repository):
+
+class TransferProgress(pygit2.RemoteCallbacks):
+    """
+    Remote callbacks keeping the latest transfer statistics.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.received_bytes = 0
+        self.received_objects = 0
+
+    def transfer_progress(self, stats):
+        self.received_bytes = stats.received_bytes
+        self.received_objects = stats.received_objects
+
+
+def _object_store_bytes(git_dir):
+    """
+    Total size of a repository's object database.
+    """
+    total = 0
+    for root, _, names in os.walk(os.path.join(git_dir, 'objects')):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _git(*args, cwd=None):
+    """
+    Run the git command line client, raising with its error output on failure.
+    """
+    if shutil.which('git') is None:
+        raise RuntimeError('Shallow and partial clones need the git command line client')
+    result = subprocess.run(['git', *args], cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"git {args[0]} failed")
+    return result.stdout
+
+
+def _needs_git(git_repo):
+    # blobless clones fetch missing blobs on demand, which only git can do,
+    # and libgit2 loses the shallow boundary when fetching into shallow clones
+    return git_repo.is_shallow or 'remote.origin.promisor' in git_repo.config
+
+
+def _is_local(repo_url):
+    """
+    Whether a clone URL is a file:// URL or a local path rather than a
+    remote (scheme:// or scp-like user@host:path) URL.
+    """
+    if repo_url.startswith('file://'):
+        return True
+    return '://' not in repo_url and not re.match(r'^[\w.-]+@[\w.-]+:', repo_url)
+
+
+def _clone(repo_url, clone_dir, branch, depth, blobless):
+    """
+    Clone a branch, returning the bytes received.
+    """
+    local = _is_local(repo_url)
+    # libgit2 has no shallow fetch over the local transport, so shallow
+    # clones of local origins go through git as well
+    if blobless or (depth and local):
+        if local and not repo_url.startswith('file://'):
+            # git ignores --depth and --filter for plain paths
+            repo_url = Path(repo_url).resolve().as_uri()
+        args = ['clone', '--quiet', '--single-branch', '--branch', branch]
+        if blobless:
+            args.append('--filter=blob:none')
+        if depth:
+            args += ['--depth', str(depth)]
+        _git(*args, repo_url, clone_dir)
+        return _object_store_bytes(os.path.join(clone_dir, '.git'))
+
+    progress = TransferProgress()
+    pygit2.clone_repository(repo_url, clone_dir, checkout_branch=branch,
+                            callbacks=progress, depth=depth or 0)
+    return progress.received_bytes
+
+
+def _refresh(git_repo, clone_dir, branch):
+    """
+    Fetch a branch and fast-forward the clone to it, returning the bytes
+    received.
+    """
+    if _needs_git(git_repo):
+        before = _object_store_bytes(git_repo.path)
+        # shallow clones fetch new commits down to their existing boundary
+        _git('fetch', '--quiet', 'origin', f'+refs/heads/{branch}:refs/remotes/origin/{branch}',
+             cwd=clone_dir)
+        _git('checkout', '--quiet', branch, cwd=clone_dir)
+        _git('merge', '--quiet', '--ff-only', f'origin/{branch}', cwd=clone_dir)
+        return max(_object_store_bytes(git_repo.path) - before, 0)
+
+    progress = TransferProgress()
+    git_repo.remotes['origin'].fetch([f'+refs/heads/{branch}:refs/remotes/origin/{branch}'],
+                                     callbacks=progress)
+
+    target = git_repo.references[f'refs/remotes/origin/{branch}'].target
+    local = git_repo.references.get(f'refs/heads/{branch}')
+    if local is None:
+        local = git_repo.references.create(f'refs/heads/{branch}', target)
+    else:
+        analysis, _ = git_repo.merge_analysis(target, local.name)
+        if analysis & pygit2.enums.MergeAnalysis.UP_TO_DATE:
+            target = local.target
+        elif not analysis & pygit2.enums.MergeAnalysis.FASTFORWARD:
+            raise ValueError(f"Local branch {branch} has diverged from origin, "
+                             "refresh cannot fast-forward it")
+
+    # a safe checkout fails rather than overwrite uncommitted changes
+    git_repo.checkout_tree(git_repo[target], strategy=pygit2.enums.CheckoutStrategy.SAFE)
+    local.set_target(target)
+    git_repo.set_head(local.name)
+    return progress.received_bytes
+
+
+def create_clone(repository, refresh=False, depth=None, blobless=False):
     """
     Create a local clone of the specified repository at the specified branch.
 
+    By default an existing clone is deleted and the branch cloned again.
+    With refresh, an existing clone instead fetches the branch from origin
+    and is fast-forwarded to it, so only new commits are transferred;
+    refresh fails without changing the clone if the local branch has
+    diverged or uncommitted changes would be overwritten.
+
+    New clones get depth commits of history only when depth is given, and
+    no file contents outside the checked out commit when blobless is set
+    (blobless clones use the git command line client, which fetches missing
+    contents on demand). Refreshing a shallow or blobless clone keeps it so,
+    and also uses the git command line client. libgit2 cannot make shallow
+    clones of local (file:// or path) origins, so those use the git command
+    line client too, and fail with a clear error when it is not installed.
+
+    With settings.CLONE_MIRRORS, other clones are not independent: each
+    repository has one bare mirror (see common.clone.mirror) holding the
+    objects of all its branches, and each branch is a worktree of it at the
+    usual clone path. Cloning another branch then only fetches the objects
+    the mirror does not have yet.
+
     Args:
         repository (str): Repository string in format 'owner/repo/branch'
                         (branch is optional, defaults to 'main')
+        refresh (bool, optional): Fetch and fast-forward an existing clone
+        depth (int, optional): Commits of history to clone, all if not set
+        blobless (bool, optional): Make a blobless partial clone
 
     Returns:
         dict: A dictionary containing:
@@ -18,7 +166,12 @@ def create_clone(repository):
                     'status': 'success',
                     'owner': <owner>,
                     'repo': <repo>,
-                    'branch': <branch>
+                    'branch': <branch>,
+                    'action': 'cloned' | 'refreshed',
+                    'commit': <commit checked out>,
+                    'mirror': <path of the bare mirror, or None>,
+                    'received_bytes': <bytes transferred>,
+                    'seconds': <time taken>
                 }
             - On error:
                 {
@@ -29,19 +182,46 @@ def create_clone(repository):
         ValueError: If repository string is invalid
         Exception: If there's an error processing the repository
     """
+    from common.clone.mirror import (
+        add_branch_worktree, remove_branch_worktree, is_worktree, mirror_dir
+    )
     try:
         owner, repo, branch = parse_repository_string(repository)
         clone_dir = f"{settings.GITHUB_CLONE_DIR}/{owner}/{repo}/{branch}"
-        repo_url = f"https://github.com/{owner}/{repo}.git"
+        repo_url = f"{settings.GITHUB_CLONE_URL}/{owner}/{repo}.git"
+        use_mirror = settings.CLONE_MIRRORS and not depth and not blobless
+        started = time.monotonic()
+
+        mirror = None
+        git_repo = None
+        if refresh and os.path.isdir(clone_dir):
+            try:
+                git_repo = pygit2.Repository(clone_dir)
+            except pygit2.GitError:
+                git_repo = None
 
-        # make sure the full clone dir path exists
-        os.makedirs(clone_dir, exist_ok=True)
-        # delete the clone dir if it exists
-        if os.path.exists(clone_dir):
-            os.system(f'rm -rf {clone_dir}')
+        if git_repo is not None:
+            received = _refresh(git_repo, clone_dir, branch)
+            action = 'refreshed'
+            if is_worktree(clone_dir):
+                mirror = mirror_dir(owner, repo)
+        else:
+            # delete the clone dir if it exists, then make sure its parents do
+            if os.path.exists(clone_dir):
+                worktree = is_worktree(clone_dir)
+                shutil.rmtree(clone_dir)
+                if worktree and not use_mirror:
+                    remove_branch_worktree(owner, repo, branch)
+            os.makedirs(os.path.dirname(clone_dir), exist_ok=True)
 
-        # clone the repo at the specified branch
-        pygit2.clone_repository(repo_url, clone_dir, checkout_branch=f"{branch}")
+            # clone the repo at the specified branch
+            if use_mirror:
+                mirror, received = add_branch_worktree(owner, repo, branch, repo_url, clone_dir)
+            else:
+                received = _clone(repo_url, clone_dir, branch, depth, blobless)
+            git_repo = pygit2.Repository(clone_dir)
+            action = 'cloned'
+        commit = str(git_repo.head.target)
     except ValueError as e:
         return {'error': str(e)}
     except Exception as e:
@@ -51,5 +231,10 @@ def create_clone(repository):
         'status': 'success',
         'owner': owner,
         'repo': repo,
-        'branch': branch
+        'branch': branch,
+        'action': action,
+        'commit': commit,
+        'mirror': mirror,
+        'received_bytes': received,
+        'seconds': round(time.monotonic() - started, 3)
     }
@@ -1,10 +1,12 @@
 import os
+import shutil
 from django.conf import settings
 from common.utils import parse_repository_string
 
 def delete_clone(repository):
     """
-    Delete a local repository clone.
+    Delete a local repository clone. Once the last branch of a repository
+    is deleted, its mirror is deleted too.
 
     Args:
         repository (str): Repository string in format 'owner/repo/branch' or 'owner/repo'
@@ -27,7 +29,12 @@ def delete_clone(repository):
         clone_dir = f"{settings.GITHUB_CLONE_DIR}/{owner}/{repo}/{branch}"
         # delete the clone dir if it exists
         if os.path.exists(clone_dir):
-            os.system(f'rm -rf {clone_dir}')
+            from common.clone.mirror import is_worktree, remove_branch_worktree
+            worktree = is_worktree(clone_dir)
+            shutil.rmtree(clone_dir)
+            # a worktree's branch is also forgotten by the repository mirror
+            if worktree:
+                remove_branch_worktree(owner, repo, branch)
             return {
                 'status': 'success',
                 'repository': f'{owner}/{repo}/{branch}',
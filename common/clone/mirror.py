@@ -0,0 +1,115 @@
+import os
+import shutil
+import threading
+from django.conf import settings
+import pygit2
+from common.clone.create import TransferProgress
+
+# directory under GITHUB_CLONE_DIR holding the bare mirrors
+MIRRORS_DIR = '.mirrors'
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def mirror_dir(owner, repo):
+    """
+    Return the path of the bare mirror of a repository.
+    """
+    return f"{settings.GITHUB_CLONE_DIR}/{MIRRORS_DIR}/{owner}/{repo}.git"
+
+
+def _mirror_lock(owner, repo):
+    with _locks_lock:
+        return _locks.setdefault((owner, repo), threading.Lock())
+
+
+def _open_mirror(owner, repo, repo_url):
+    """
+    Open the bare mirror of a repository, creating it if needed.
+    """
+    path = mirror_dir(owner, repo)
+    if os.path.isdir(path):
+        mirror = pygit2.Repository(path)
+        if mirror.remotes['origin'].url != repo_url:
+            mirror.remotes.set_url('origin', repo_url)
+        return mirror
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    mirror = pygit2.init_repository(path, bare=True)
+    mirror.remotes.create('origin', repo_url)
+    return mirror
+
+
+def _prune_worktrees(mirror):
+    # worktrees whose directory is gone, e.g. deleted by hand
+    for name in mirror.list_worktrees():
+        worktree = mirror.lookup_worktree(name)
+        if worktree.is_prunable:
+            worktree.prune(True)
+
+
+def is_worktree(clone_dir):
+    """
+    Return True if a clone directory is a worktree of a mirror. Worktrees
+    have a .git file pointing at the mirror instead of a .git directory.
+    """
+    return os.path.isfile(os.path.join(clone_dir, '.git'))
+
+
+def add_branch_worktree(owner, repo, branch, repo_url, clone_dir):
+    """
+    Check a branch out as a worktree of the repository's bare mirror.
+
+    The branch is fetched into the mirror, creating the mirror on first use,
+    so objects already fetched for other branches are not transferred again.
+    The local branch is reset to the fetched commit and checked out at
+    clone_dir, which must not exist.
+
+    Args:
+        owner (str): Repository owner
+        repo (str): Repository name
+        branch (str): Branch to check out
+        repo_url (str): URL to fetch from
+        clone_dir (str): Path of the worktree
+
+    Returns:
+        tuple: (mirror path, bytes received)
+    """
+    with _mirror_lock(owner, repo):
+        mirror = _open_mirror(owner, repo, repo_url)
+        progress = TransferProgress()
+        mirror.remotes['origin'].fetch([f'+refs/heads/{branch}:refs/remotes/origin/{branch}'],
+                                       callbacks=progress)
+        target = mirror.references[f'refs/remotes/origin/{branch}'].target
+
+        _prune_worktrees(mirror)
+        if branch in mirror.list_worktrees():
+            raise ValueError(f"Branch {branch} is already checked out from {mirror.path}")
+        ref = mirror.references.create(f'refs/heads/{branch}', target, force=True)
+        os.makedirs(os.path.dirname(clone_dir), exist_ok=True)
+        mirror.add_worktree(branch, clone_dir, ref)
+    return mirror.path.rstrip('/'), progress.received_bytes
+
+
+def remove_branch_worktree(owner, repo, branch):
+    """
+    Forget the worktree of a deleted clone directory, and delete the mirror
+    once no worktrees are left.
+    """
+    path = mirror_dir(owner, repo)
+    if not os.path.isdir(path):
+        return
+    with _mirror_lock(owner, repo):
+        mirror = pygit2.Repository(path)
+        _prune_worktrees(mirror)
+        if branch not in mirror.list_worktrees():
+            try:
+                mirror.branches.local.delete(branch)
+            except (KeyError, pygit2.GitError):
+                pass
+        if not mirror.list_worktrees():
+            shutil.rmtree(path)
+            try:
+                os.rmdir(os.path.dirname(path))
+            except OSError:
+                pass
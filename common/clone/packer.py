@@ -0,0 +1,329 @@
+import json
+import logging
+import re
+import tomllib
+from pathlib import PurePosixPath
+import pygit2
+from django.conf import settings
+from common.clone.walk import read_clone_files
+from common.clone.tree import open_clone, clone_branch_commit
+
+logger = logging.getLogger('django')
+
+# model whose tokenizer counts context tokens
+CONTEXT_MODEL = 'gpt-4o-mini'
+
+ENTRY_POINTS = {'readme.md', 'pyproject.toml', 'setup.py', 'manage.py', 'main.py',
+                'app.py', '__main__.py', 'cli.py', 'urls.py', 'settings.py'}
+LOCKFILES = {'poetry.lock', 'uv.lock', 'pipfile.lock', 'package-lock.json',
+             'yarn.lock', 'pnpm-lock.yaml', 'cargo.lock', 'gemfile.lock'}
+GENERATED_MARKERS = re.compile(
+    r'@generated|do not edit|auto-?generated|generated by (django|the protocol buffer|protoc)',
+    re.IGNORECASE
+)
+GENERATED_PATH = re.compile(r'(^|/)migrations/\d{4}_|_pb2(_grpc)?\.py$|\.min\.')
+
+# files whose remaining share of the budget is smaller are dropped, not cut
+MIN_TRUNCATED_TOKENS = 128
+# 1/n of the budget is kept for listing the files that did not fit
+OMITTED_LIST_SHARE = 20
+
+
+def _count_tokens(text):
+    from common.llm.embeddings import count_tokens
+    return count_tokens(text, CONTEXT_MODEL)
+
+
+def _truncate_tokens(text, max_tokens):
+    from common.llm.embeddings import truncate_tokens
+    return truncate_tokens(text, max_tokens, CONTEXT_MODEL)
+
+
+def recently_changed_files(repository, commits=None):
+    """
+    Rank the paths changed by the latest commits of a local clone.
+
+    Args:
+        repository (str): Repository string in format 'owner/repo/branch'
+        commits (int, optional): Commits to look back, defaults to
+                                 settings.CONTEXT_RECENT_COMMITS
+
+    Returns:
+        dict: {path: recency}, 1.0 for the latest commit falling towards 0
+    """
+    commits = int(commits or settings.CONTEXT_RECENT_COMMITS)
+    try:
+        git_repo, branch = open_clone(repository)
+        head = clone_branch_commit(git_repo, branch)
+    except ValueError:
+        return {}
+
+    recency = {}
+    for age, commit in enumerate(git_repo.walk(head.id, pygit2.enums.SortMode.TIME)):
+        if age >= commits:
+            break
+        if commit.parents:
+            diff = commit.parents[0].tree.diff_to_tree(commit.tree)
+        else:
+            diff = commit.tree.diff_to_tree(swap=True)
+        for delta in diff.deltas:
+            recency.setdefault(delta.new_file.path, 1.0 - age / commits)
+    return recency
+
+
+def summarize_lockfile(name, content):
+    """
+    Summarize a lockfile as its locked package versions.
+    """
+    packages = []
+    try:
+        if name in ('poetry.lock', 'uv.lock', 'cargo.lock'):
+            packages = [f"{package['name']} {package.get('version', '')}".strip()
+                        for package in tomllib.loads(content).get('package', [])]
+        elif name == 'package-lock.json':
+            packages = [f"{path.rsplit('node_modules/', 1)[-1]} {info.get('version', '')}".strip()
+                        for path, info in json.loads(content).get('packages', {}).items() if path]
+    except (ValueError, KeyError, AttributeError, TypeError):
+        packages = []
+    if not packages:
+        return f'Lockfile with {content.count(chr(10))} lines, contents omitted.'
+    return f'Lockfile pinning {len(packages)} packages:\n' + '\n'.join(packages)
+
+
+def _is_generated(path, content):
+    return bool(GENERATED_PATH.search(path) or GENERATED_MARKERS.search(content[:1000]))
+
+
+def _score(path, recency):
+    """
+    Rank a file: entry points and recently changed code first, then source
+    before documentation, shallow paths before deep ones, tests last.
+    """
+    parts = PurePosixPath(path)
+    name = parts.name.lower()
+    score = 0.0
+    if name in ENTRY_POINTS or (not parts.suffix and len(parts.parts) == 1):
+        score += 100
+    score += 50 * recency.get(path, 0.0)
+    if parts.suffix in ('.py', ''):
+        score += 30
+    elif parts.suffix == '.md':
+        score += 15
+    if 'tests' in parts.parts or name.startswith('test_') or name == 'tests.py':
+        score -= 20
+    score -= 3 * (len(parts.parts) - 1)
+    return score
+
+
+def _format_file(path, content):
+    return f"\nFile: {path}\n```{PurePosixPath(path).suffix.lstrip('.')}\n{content.strip()}\n```\n"
+
+
+def _omitted_list(paths, max_tokens):
+    header = '\nFiles omitted to fit the context:\n'
+    # the header and the count of unlisted paths are part of the budget
+    tokens = _count_tokens(header) + _count_tokens(f'... and {len(paths)} more\n')
+    if tokens > max_tokens:
+        return ''
+    lines = []
+    for number, path in enumerate(paths):
+        tokens += _count_tokens(path + '\n')
+        if tokens > max_tokens:
+            lines.append(f'... and {len(paths) - number} more\n')
+            break
+        lines.append(path + '\n')
+    return header + ''.join(lines)
+
+
+def _read_candidates(repository, files=None):
+    """
+    Read the files to pack, in rank order, with a report of the lockfiles
+    summarized and the files left out.
+    """
+    read, skipped = read_clone_files(repository, files)
+
+    report = {'included': [], 'truncated': [], 'summarized': [], 'dropped': skipped}
+    candidates = []
+    for path, content in read:
+        name = PurePosixPath(path).name.lower()
+        if name in LOCKFILES:
+            content = summarize_lockfile(name, content)
+            report['summarized'].append(path)
+        elif not files and _is_generated(path, content):
+            report['dropped'].append({'path': path, 'reason': 'generated'})
+            continue
+        candidates.append((path, content))
+
+    if not files:
+        recency = recently_changed_files(repository)
+        candidates.sort(key=lambda candidate: (-_score(candidate[0], recency), candidate[0]))
+    return candidates, report
+
+
+def _pack(candidates, report, budget, file_max_tokens):
+    """
+    Add candidates to the context in order while they fit the budget.
+    """
+    report = {key: list(value) for key, value in report.items()}
+    # leave room for the list of files that did not fit
+    remaining = budget - budget // OMITTED_LIST_SHARE
+    parts = []
+    for path, content in candidates:
+        # tokens are counted on a prefix, long files are cut anyway
+        content = content[:file_max_tokens * 8]
+        block = _format_file(path, content)
+        tokens = _count_tokens(block)
+        limit = min(file_max_tokens, remaining)
+        if tokens > limit:
+            if limit < MIN_TRUNCATED_TOKENS:
+                report['dropped'].append({'path': path, 'reason': 'budget'})
+                continue
+            overhead = tokens - _count_tokens(content.strip())
+            block = _format_file(path, _truncate_tokens(content, limit - overhead))
+            tokens = _count_tokens(block)
+            report['truncated'].append(path)
+        parts.append(block)
+        remaining -= tokens
+        report['included'].append(path)
+
+    dropped = [item['path'] for item in report['dropped'] if item['reason'] == 'budget']
+    if dropped:
+        parts.append(_omitted_list(dropped, budget // OMITTED_LIST_SHARE))
+    text = ''.join(parts)
+    return {'text': text, 'tokens': _count_tokens(text), 'budget': budget, **report}
+
+
+def pack_clone_context(repository, files=None, budget=None, file_max_tokens=None):
+    """
+    Pack the files of a local clone into a prompt context that fits a token
+    budget.
+
+    Without files, every file formatted_files_from_clone would select is
+    ranked: entry points, recently changed files and source code first, tests
+    and deeply nested files last. With files, their order is kept. Files are
+    then added in rank order while they fit the budget; a file larger than
+    file_max_tokens, or than what is left of the budget, is cut. Lockfiles
+    are replaced by a summary of their locked packages, and generated files
+    are skipped unless asked for. Files that did not fit are listed at the
+    end of the context so the model knows they exist.
+
+    Args:
+        repository (str): Repository string in format 'owner/repo/branch'
+        files (list, optional): Paths relative to the clone to pack
+        budget (int, optional): Token budget, defaults to
+                                settings.AGENT_CONTEXT_TOKENS
+        file_max_tokens (int, optional): Token limit per file, defaults to
+                                         settings.CONTEXT_FILE_MAX_TOKENS
+
+    Returns:
+        dict:
+            {
+                'text': 'packed context',
+                'tokens': <tokens in text>,
+                'budget': <token budget>,
+                'included': ['path', ...],
+                'truncated': ['path', ...],
+                'summarized': ['path', ...],
+                'dropped': [{'path': 'path', 'reason': 'generated' | 'budget' | 'unreadable'
+                              | 'binary' | 'outside clone' | 'excluded'}, ...]
+            }
+
+    Raises:
+        Exception: If the repository string is invalid or the clone does not exist
+    """
+    budget = int(budget or settings.AGENT_CONTEXT_TOKENS)
+    file_max_tokens = int(file_max_tokens or settings.CONTEXT_FILE_MAX_TOKENS)
+    candidates, report = _read_candidates(repository, files)
+    packed = _pack(candidates, report, budget, file_max_tokens)
+    if packed['dropped'] or packed['truncated']:
+        logger.info(f"Context for {repository}: {len(packed['included'])} files, "
+                    f"{len(packed['truncated'])} truncated, {len(packed['dropped'])} dropped")
+    return packed
+
+
+def _directory_shards(sized, shard_tokens, depth=0):
+    """
+    Group (path, tokens) pairs by directory, splitting directories larger
+    than shard_tokens by their subdirectories, and directories of files
+    larger than shard_tokens into numbered parts.
+    """
+    groups = {}
+    for path, tokens in sized:
+        parts = path.split('/')
+        # files directly in a directory are grouped under the directory
+        key = '/'.join(parts[:min(depth + 1, len(parts) - 1)]) or '.'
+        groups.setdefault(key, []).append((path, tokens))
+
+    shards = []
+    for key in sorted(groups):
+        members = groups[key]
+        nested = any(path.count('/') > depth for path, _ in members)
+        total = sum(tokens for _, tokens in members)
+        if nested and total > shard_tokens:
+            shards.extend(_directory_shards(members, shard_tokens, depth + 1))
+        elif total > shard_tokens:
+            parts = [[]]
+            for member in members:
+                if parts[-1] and sum(tokens for _, tokens in parts[-1]) + member[1] > shard_tokens:
+                    parts.append([])
+                parts[-1].append(member)
+            shards.extend((f'{key} ({number}/{len(parts)})', part)
+                          for number, part in enumerate(parts, 1))
+        else:
+            shards.append((key, members))
+    return shards
+
+
+def shard_clone_context(repository, shard_tokens=None, file_max_tokens=None):
+    """
+    Split the files of a local clone into directory shards, each packed into
+    a context of at most shard_tokens.
+
+    Files are selected, summarized and skipped as by pack_clone_context, but
+    not limited to an overall budget. Files are grouped by top level
+    directory, directories larger than shard_tokens are split by their
+    subdirectories, and neighbouring small directories are merged until a
+    shard is full.
+
+    Args:
+        repository (str): Repository string in format 'owner/repo/branch'
+        shard_tokens (int, optional): Token budget per shard, defaults to
+                                      settings.AGENT_SHARD_TOKENS
+        file_max_tokens (int, optional): Token limit per file, defaults to
+                                         settings.CONTEXT_FILE_MAX_TOKENS
+
+    Returns:
+        list: One pack_clone_context result per shard, each with a 'name'
+              listing its directories ('.' for the top level). Files left
+              out of every shard are reported on the first.
+
+    Raises:
+        Exception: If the repository string is invalid or the clone does not exist
+    """
+    shard_tokens = int(shard_tokens or settings.AGENT_SHARD_TOKENS)
+    file_max_tokens = int(file_max_tokens or settings.CONTEXT_FILE_MAX_TOKENS)
+    candidates, report = _read_candidates(repository)
+    contents = dict(candidates)
+    rank = {path: position for position, (path, _) in enumerate(candidates)}
+
+    sized = [(path, min(file_max_tokens, _count_tokens(_format_file(path, content[:file_max_tokens * 8]))))
+             for path, content in candidates]
+    merged = []
+    # the packed shard keeps room for its list of omitted files
+    fill = shard_tokens - shard_tokens // OMITTED_LIST_SHARE
+    for key, members in _directory_shards(sized, fill):
+        tokens = sum(size for _, size in members)
+        if merged and merged[-1][2] + tokens <= fill:
+            names, paths, total = merged[-1]
+            merged[-1] = (names + [key], paths + [path for path, _ in members], total + tokens)
+        else:
+            merged.append(([key], [path for path, _ in members], tokens))
+
+    shards = []
+    for names, paths, _ in merged:
+        paths.sort(key=rank.get)
+        shard_report = report if not shards else {key: [] for key in report}
+        packed = _pack([(path, contents[path]) for path in paths], shard_report,
+                       shard_tokens, file_max_tokens)
+        shards.append({'name': ', '.join(names), **packed})
+    return shards
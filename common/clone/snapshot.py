@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from django.conf import settings
+
+
+def selection_key(max_bytes):
+    """
+    Fingerprint of the settings that decide which files are selected and
+    how much of each is read; snapshots taken under other settings are not
+    reused.
+    """
+    selection = {
+        'extensions': settings.VALID_EXTENSIONS,
+        'files': settings.VALID_FILES,
+        'excluded': settings.CLONE_AI_ENGINEER_DIR,
+        'max_bytes': max_bytes,
+    }
+    return hashlib.sha256(json.dumps(selection, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+class SnapshotCache:
+    """
+    Persistent cache of the files selected from clone trees.
+
+    A snapshot records, for a tree OID and selection settings, the selected
+    paths with their blob OIDs, and which of them are not text. File
+    contents are stored once per blob OID and read limit, zlib compressed,
+    so a new commit only adds the blobs that changed. When the stored contents exceed
+    max_bytes, least recently used blobs and snapshots are evicted.
+    """
+
+    def __init__(self, path=None, max_bytes=None):
+        self.path = str(path or settings.CLONE_SNAPSHOT_PATH)
+        self.max_bytes = int(max_bytes or settings.CLONE_SNAPSHOT_MAX_BYTES)
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS snapshots ('
+            ' key TEXT PRIMARY KEY,'
+            ' files TEXT NOT NULL,'
+            ' accessed REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS blobs ('
+            ' oid TEXT PRIMARY KEY,'
+            ' content BLOB NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' accessed REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS blobs_accessed ON blobs (accessed)')
+        self._conn.commit()
+
+    def get_snapshot(self, key):
+        """
+        Return [(path, blob oid, reason it is unreadable or None), ...] for a
+        snapshot, or None.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT files FROM snapshots WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE snapshots SET accessed = ? WHERE key = ?',
+                               (time.time(), key))
+            self._conn.commit()
+        return [tuple(item) for item in json.loads(row[0])]
+
+    def put_snapshot(self, key, files):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO snapshots (key, files, accessed) VALUES (?, ?, ?)',
+                (key, json.dumps(files), time.time())
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def _blob_key(oid, max_bytes):
+        # contents are stored cut at max_bytes, so each limit has its own copy
+        return f'{oid}:{max_bytes}'
+
+    def get_contents(self, oids, max_bytes):
+        """
+        Look up file contents by blob OID.
+
+        Args:
+            oids (list): Blob OIDs
+            max_bytes (int): Bytes read per file when the contents were stored
+
+        Returns:
+            dict: {oid: content} for every OID found in the cache
+        """
+        found = {}
+        keys = {self._blob_key(oid, max_bytes): oid for oid in oids}
+        unique = list(keys)
+        with self._lock:
+            # stay well under SQLite's bound parameter limit
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT oid, content FROM blobs WHERE oid IN ({placeholders})', chunk
+                ).fetchall()
+                for key, content in rows:
+                    found[keys[key]] = zlib.decompress(content).decode('utf-8')
+            if found:
+                now = time.time()
+                self._conn.executemany('UPDATE blobs SET accessed = ? WHERE oid = ?',
+                                       [(now, self._blob_key(oid, max_bytes)) for oid in found])
+                self._conn.commit()
+        return found
+
+    def put_contents(self, contents, max_bytes):
+        """
+        Store file contents.
+
+        Args:
+            contents (dict): {blob oid: content}
+            max_bytes (int): Bytes read per file
+        """
+        if not contents:
+            return
+        now = time.time()
+        rows = []
+        for oid, content in contents.items():
+            compressed = zlib.compress(content.encode('utf-8'))
+            rows.append((self._blob_key(oid, max_bytes), compressed, len(compressed), now))
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO blobs (oid, content, size, accessed) VALUES (?, ?, ?, ?)',
+                rows
+            )
+            self._conn.commit()
+            total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+            if total > self.max_bytes:
+                self._evict(total)
+
+    def _evict(self, total):
+        # drop least recently used blobs down to 90% of the size limit, and
+        # the snapshots that were last used before them
+        excess = total - int(self.max_bytes * 0.9)
+        doomed, cutoff = [], 0.0
+        for oid, size, accessed in self._conn.execute(
+                'SELECT oid, size, accessed FROM blobs ORDER BY accessed'):
+            if excess <= 0:
+                break
+            doomed.append((oid,))
+            excess -= size
+            cutoff = accessed
+        self._conn.executemany('DELETE FROM blobs WHERE oid = ?', doomed)
+        self._conn.execute('DELETE FROM snapshots WHERE accessed <= ?', (cutoff,))
+        self._conn.commit()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_snapshot_cache():
+    """
+    Return the process-wide snapshot cache, or None if it is disabled.
+    """
+    global _cache
+    if not settings.CLONE_SNAPSHOT_CACHE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SnapshotCache()
+        return _cache
+
+
+def read_snapshot_files(repository, git_repo, commit, select, decode, max_bytes, files=None):
+    """
+    Read the selected files of a commit through the snapshot cache.
+
+    Contents come from the cache, or else from the clone's object database,
+    never from the working tree. Blobs read from the object database are
+    added to the cache, so a later commit only reads the files that changed.
+
+    Args:
+        repository (str): Repository string in format 'owner/repo/branch'
+        git_repo (pygit2.Repository): The clone's repository
+        commit (pygit2.Commit): The commit to read
+        select (callable): Returns True for the paths to select
+        decode (callable): (bytes, max_bytes) -> (content or None, reason)
+        max_bytes (int): Bytes read per file
+        files (list, optional): Paths to read instead of the selected files
+
+    Returns:
+        list: (path, content or None, reason content is None or None) for
+              each selected path, in path order or in the order of files
+    """
+    from common.clone.tree import list_clone_tree
+
+    cache = get_snapshot_cache()
+    key = f'{commit.tree_id}:{selection_key(max_bytes)}'
+    snapshot = None if files is not None else cache.get_snapshot(key)
+    if snapshot is None:
+        entries = {item['path']: item['sha'] for item in list_clone_tree(repository, str(commit.id), git_repo)}
+        if files is not None:
+            listed = [(path, entries.get(path), None if path in entries else 'unreadable')
+                      for path in files]
+        else:
+            listed = [(path, oid, None) for path, oid in entries.items() if select(path)]
+    else:
+        listed = snapshot
+
+    contents = cache.get_contents([oid for _, oid, reason in listed if reason is None], max_bytes)
+    missing = {}
+    results = []
+    for path, oid, reason in listed:
+        if reason is None and oid not in contents and oid not in missing:
+            content, reason = decode(git_repo[oid].data, max_bytes)
+            if content is not None:
+                missing[oid] = content
+        results.append((path, oid, reason))
+    cache.put_contents(missing, max_bytes)
+    contents.update(missing)
+
+    if snapshot is None and files is None:
+        cache.put_snapshot(key, results)
+    return [(path, contents.get(oid) if reason is None else None, reason)
+            for path, oid, reason in results]
@@ -0,0 +1,166 @@
+import os
+import threading
+from django.conf import settings
+from common.utils import parse_repository_string
+from common.github import raw_download_url
+import pygit2
+
+
+def open_clone(repository):
+    """
+    Open the pygit2 repository for a local clone.
+
+    Args:
+        repository (str): Repository string in format 'owner/repo/branch'
+                        (branch is optional, defaults to 'main')
+
+    Returns:
+        tuple: (pygit2.Repository, branch)
+
+    Raises:
+        ValueError: If the repository string is invalid or the clone does not exist
+    """
+    owner, repo, branch = parse_repository_string(repository)
+    clone_dir = f"{settings.GITHUB_CLONE_DIR}/{owner}/{repo}/{branch}"
+    if not os.path.isdir(clone_dir):
+        raise ValueError(f"Clone directory not found: {clone_dir}")
+    try:
+        return pygit2.Repository(clone_dir), branch
+    except pygit2.GitError as e:
+        raise ValueError(f"Not a git repository: {clone_dir}: {str(e)}")
+
+
+def clone_branch_commit(git_repo, branch):
+    """
+    Resolve the commit at the head of a branch in a clone.
+
+    The local branch is preferred, falling back to the remote tracking branch
+    and finally to HEAD.
+    """
+    for name in (f'refs/heads/{branch}', f'refs/remotes/origin/{branch}', 'HEAD'):
+        try:
+            return git_repo.revparse_single(name).peel(pygit2.Commit)
+        except (KeyError, ValueError, pygit2.GitError):
+            continue
+    raise ValueError(f'Branch not found in clone: {branch}')
+
+
+def clone_head_commit(repository):
+    """
+    Return the commit sha at the branch head of a local clone.
+    """
+    git_repo, branch = open_clone(repository)
+    return str(clone_branch_commit(git_repo, branch).id)
+
+
+def list_clone_tree(repository, commit=None, git_repo=None):
+    """
+    List every file at the branch head of a local clone, read from the object
+    database rather than the working tree.
+
+    Args:
+        repository (str): Repository string in format 'owner/repo/branch'
+        commit (str, optional): Commit sha to list instead of the branch head
+        git_repo (pygit2.Repository, optional): The clone, if already opened
+
+    Returns:
+        list: File entries shaped like common.github.list_github_tree, with
+              'sha' holding the blob id in the clone
+    """
+    owner, repo, branch = parse_repository_string(repository)
+    if git_repo is None:
+        git_repo, branch = open_clone(repository)
+    if commit:
+        commit = git_repo.get(commit)
+        if commit is None:
+            raise ValueError('Commit not found in clone')
+        commit = commit.peel(pygit2.Commit)
+    else:
+        commit = clone_branch_commit(git_repo, branch)
+
+    all_contents = []
+    stack = [(commit.tree, '')]
+    while stack:
+        tree, prefix = stack.pop()
+        for entry in tree:
+            path = f'{prefix}{entry.name}'
+            if entry.type_str == 'tree':
+                stack.append((git_repo[entry.id], f'{path}/'))
+            elif entry.type_str == 'blob':
+                all_contents.append({
+                    'type': 'file',
+                    'name': entry.name,
+                    'path': path,
+                    'sha': str(entry.id),
+                    'download_url': raw_download_url(owner, repo, branch, path)
+                })
+    return sorted(all_contents, key=lambda item: item['path'])
+
+
+def diff_clone_commits(repository, base, head):
+    """
+    List files changed between two commits in a local clone.
+
+    Returns:
+        tuple: (changed, removed) lists of paths, or None if the base commit
+               is not present in the clone
+    """
+    git_repo, _ = open_clone(repository)
+    base_commit = git_repo.get(base)
+    head_commit = git_repo.get(head)
+    if base_commit is None or head_commit is None:
+        return None
+
+    diff = git_repo.diff(base_commit.peel(pygit2.Commit), head_commit.peel(pygit2.Commit))
+    changed, removed = [], []
+    for delta in diff.deltas:
+        if delta.status == pygit2.enums.DeltaStatus.DELETED:
+            removed.append(delta.old_file.path)
+            continue
+        if delta.old_file.path != delta.new_file.path:
+            removed.append(delta.old_file.path)
+        changed.append(delta.new_file.path)
+    return changed, removed
+
+
+def clone_file_reader(repository, git_repo=None):
+    """
+    Return a function that reads a file entry's content from the clone's
+    object database. The clone is opened once, unless git_repo is given, and
+    reads are serialized, so the reader can be shared between threads.
+    """
+    if git_repo is None:
+        git_repo, _ = open_clone(repository)
+    lock = threading.Lock()
+
+    def read(file_info):
+        with lock:
+            blob = git_repo[file_info['sha']]
+            if blob.is_binary:
+                raise ValueError('binary file')
+            return blob.data.decode('utf-8', errors='replace')
+
+    return read
+
+
+def fetch_clone_files(repository, file_infos):
+    """
+    Read file contents straight from the clone's object database.
+
+    Args:
+        repository (str): Repository string in format 'owner/repo/branch'
+        file_infos (list): File entries from list_clone_tree
+
+    Returns:
+        list: (file_info, content, error) tuples in input order. Exactly one of
+              content or error is None.
+    """
+    read = clone_file_reader(repository)
+
+    results = []
+    for file_info in file_infos:
+        try:
+            results.append((file_info, read(file_info), None))
+        except Exception as e:
+            results.append((file_info, None, e))
+    return results
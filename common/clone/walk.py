@@ -0,0 +1,260 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+import pygit2
+from django.conf import settings
+from common.utils import parse_repository_string
+
+# index entry modes that are not regular files in the working tree
+SYMLINK_MODE = 0o120000
+SUBMODULE_MODE = 0o160000
+
+
+def _git_repository(clone_dir):
+    try:
+        return pygit2.Repository(str(clone_dir))
+    except pygit2.GitError:
+        return None
+
+
+def _excluded(parts):
+    # the ai engineer data directory holds agent output, not project files
+    return settings.CLONE_AI_ENGINEER_DIR in parts
+
+
+def list_index_files(clone_dir, git_repo=None):
+    """
+    List the files tracked in a clone's git index, without touching the
+    working tree.
+
+    Args:
+        clone_dir (Path): The clone directory
+        git_repo (pygit2.Repository, optional): The clone's repository
+
+    Returns:
+        list: Sorted paths relative to the clone, using '/' separators
+    """
+    git_repo = git_repo or pygit2.Repository(str(clone_dir))
+    return [entry.path for entry in git_repo.index
+            if entry.mode not in (SYMLINK_MODE, SUBMODULE_MODE)
+            and not _excluded(PurePosixPath(entry.path).parts)]
+
+
+def walk_clone_files(clone_dir, git_repo=None):
+    """
+    List the files in a clone's working tree.
+
+    Directories are pruned as they are reached: .git, the ai engineer data
+    directory and, when the clone is a git repository, anything its
+    .gitignore files exclude. Each entry is classified from its directory
+    listing, without further stat calls.
+
+    Args:
+        clone_dir (Path): The clone directory
+        git_repo (pygit2.Repository, optional): The clone's repository, used
+                                                for .gitignore rules
+
+    Returns:
+        list: Sorted paths relative to the clone, using '/' separators
+    """
+    found = []
+    stack = ['']
+    while stack:
+        relative_dir = stack.pop()
+        try:
+            entries = os.scandir(os.path.join(clone_dir, relative_dir))
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                path = f'{relative_dir}/{entry.name}' if relative_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name == '.git' or _excluded((entry.name,)):
+                        continue
+                    if git_repo is not None and git_repo.path_is_ignored(path + '/'):
+                        continue
+                    stack.append(path)
+                elif entry.is_file(follow_symlinks=False):
+                    # worktrees have a .git file pointing at their repository
+                    if entry.name == '.git':
+                        continue
+                    if git_repo is not None and git_repo.path_is_ignored(path):
+                        continue
+                    found.append(path)
+    return sorted(found)
+
+
+def _valid(path):
+    """
+    Return True for source, documentation and build files.
+    """
+    name = PurePosixPath(path).name.lower()
+    return PurePosixPath(name).suffix in settings.VALID_EXTENSIONS or name in settings.VALID_FILES
+
+
+def _potential_script(path):
+    # files without an extension are scripts if they start with a shebang
+    return PurePosixPath(path).suffix == '' and not _valid(path)
+
+
+def _selectable(path):
+    return (_valid(path) or _potential_script(path)) and not _excluded(PurePosixPath(path).parts)
+
+
+def _checked_out_commit(git_repo, branch):
+    """
+    Return the branch head commit if it is checked out without changes in
+    the working tree, or else None.
+    """
+    from common.clone.tree import clone_branch_commit
+    try:
+        commit = clone_branch_commit(git_repo, branch)
+        if git_repo.head.target != commit.id:
+            return None
+    except (ValueError, pygit2.GitError):
+        return None
+    # untracked directories are reported without descending into them
+    if git_repo.status(untracked_files='normal'):
+        return None
+    return commit
+
+
+def _read_file(file_path, max_bytes):
+    """
+    Read at most max_bytes of a text file.
+
+    Returns:
+        tuple: (content or None, reason it could not be read or None)
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            data = f.read(max_bytes + 1)
+    except OSError:
+        return None, 'unreadable'
+    return decode_text(data, max_bytes)
+
+
+def decode_text(data, max_bytes):
+    """
+    Decode at most max_bytes of file data as UTF-8 text.
+
+    Returns:
+        tuple: (content or None, reason it could not be decoded or None)
+    """
+    truncated = len(data) > max_bytes
+    data = data[:max_bytes]
+    if b'\0' in data[:8192]:
+        return None, 'binary'
+    try:
+        return data.decode('utf-8'), None
+    except UnicodeDecodeError as e:
+        # the cap may cut a multi-byte character in two
+        if truncated and e.start >= len(data) - 3:
+            return data[:e.start].decode('utf-8'), None
+        return None, 'unreadable'
+
+
+def read_clone_files(repository, files=None, source=None, max_bytes=None, workers=None):
+    """
+    Select and read the files of a local clone that are given to agents and
+    prompts.
+
+    Without files, the clone's .md and .py files, the files named in
+    settings.VALID_FILES and scripts with a shebang are selected. The
+    filesystem walk (the default) prunes .git and ignored directories
+    instead of descending into them. Listing tracked files from the git
+    index reads no directories at all, but leaves out untracked files.
+    Files are read concurrently, each up to max_bytes.
+
+    With CLONE_SNAPSHOT_CACHE enabled, files of a clone whose working tree
+    has no changes are instead read from the commit at the head of its
+    branch through the snapshot cache (see common.clone.snapshot), so
+    repeated reads of the same commit come from the cache. Clones with
+    uncommitted or untracked files are read as above.
+
+    Args:
+        repository (str): Repository string in format 'owner/repo/branch'
+        files (list, optional): Paths relative to the clone to read instead
+        source (str, optional): 'filesystem' or 'index', defaults to
+                                settings.CLONE_LIST_SOURCE. Clones that are
+                                not git repositories are always walked.
+        max_bytes (int, optional): Bytes read per file, defaults to
+                                   settings.CLONE_FILE_MAX_BYTES
+        workers (int, optional): Reader threads, defaults to
+                                 settings.CLONE_READ_WORKERS
+
+    Returns:
+        tuple: ([(path, content), ...] in path order, or in the order of
+                files, and [{'path': path, 'reason': 'unreadable' | 'binary'
+                | 'outside clone' | 'excluded'}, ...] for files that were not
+                read; files under .git or the ai engineer data directory are
+                excluded even when named in files)
+
+    Raises:
+        ValueError: If the repository string is invalid or the clone does not exist
+    """
+    owner, repo, branch = parse_repository_string(repository)
+    clone_dir = Path(f"{settings.GITHUB_CLONE_DIR}/{owner}/{repo}/{branch}")
+    if not clone_dir.is_dir():
+        raise ValueError(f"Clone directory not found: {clone_dir}")
+    source = source or settings.CLONE_LIST_SOURCE
+    max_bytes = int(max_bytes or settings.CLONE_FILE_MAX_BYTES)
+    workers = int(workers or settings.CLONE_READ_WORKERS)
+
+    skipped = []
+    if files:
+        root = clone_dir.resolve()
+        paths = []
+        for path in files:
+            resolved = (clone_dir / path).resolve()
+            if not resolved.is_relative_to(root):
+                skipped.append({'path': path, 'reason': 'outside clone'})
+                continue
+            parts = resolved.relative_to(root).parts
+            if '.git' in parts or _excluded(parts):
+                skipped.append({'path': path, 'reason': 'excluded'})
+            else:
+                paths.append(path)
+    else:
+        paths = None
+
+    git_repo = _git_repository(clone_dir)
+    if git_repo is not None and settings.CLONE_SNAPSHOT_CACHE:
+        commit = _checked_out_commit(git_repo, branch)
+        if commit is not None:
+            from common.clone.snapshot import read_snapshot_files
+            results = read_snapshot_files(
+                repository, git_repo, commit, _selectable, decode_text, max_bytes, paths
+            )
+            return _collect(results, skipped, files)
+
+    if paths is None:
+        if git_repo is not None and source == 'index':
+            paths = list_index_files(clone_dir, git_repo)
+        else:
+            paths = walk_clone_files(clone_dir, git_repo)
+        paths = [path for path in paths if _selectable(path)]
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='clone-read') as executor:
+        contents = executor.map(lambda path: _read_file(clone_dir / path, max_bytes), paths)
+        results = [(path, content, reason) for path, (content, reason) in zip(paths, contents)]
+    return _collect(results, skipped, files)
+
+
+def _collect(results, skipped, files):
+    """
+    Split read results into the files read and the files skipped, dropping
+    potential scripts that turned out not to be scripts.
+    """
+    read = []
+    for path, content, reason in results:
+        script = not files and _potential_script(path)
+        if content is None:
+            # a potential script that is not text is simply not a script
+            if not script:
+                skipped.append({'path': path, 'reason': reason})
+            continue
+        if script and not content.startswith('#!'):
+            continue
+        read.append((path, content))
+    return read, skipped
@@ -0,0 +1,200 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from django.conf import settings
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from common.utils import get_github_contents
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def github_session():
+    """
+    Return the process-wide requests session used for GitHub traffic.
+
+    The session keeps a keep-alive connection pool sized for the configured
+    number of fetch workers, so concurrent downloads reuse TCP/TLS connections
+    instead of opening a new one per file.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            workers = max(1, int(settings.GITHUB_FETCH_WORKERS))
+            retry = Retry(
+                total=3,
+                backoff_factor=0.5,
+                status_forcelist=[502, 503, 504],
+                allowed_methods=['GET']
+            )
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=workers,
+                max_retries=retry
+            )
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            if settings.GITHUB_TOKEN:
+                session.headers['Authorization'] = f"Token {settings.GITHUB_TOKEN}"
+            _session = session
+    return _session
+
+
+def raw_download_url(owner, repo, ref, path):
+    """
+    Build the raw content URL for a file at the given ref.
+    """
+    return f'{settings.GITHUB_RAW_URL}/{owner}/{repo}/{quote(ref)}/{quote(path)}'
+
+
+def list_github_tree(owner, repo, branch='main'):
+    """
+    List every file in a repository with a single recursive Git Trees API call.
+
+    Args:
+        owner (str): Repository owner
+        repo (str): Repository name
+        branch (str): Branch, tag or commit sha to list
+
+    Returns:
+        list: File entries shaped like the GitHub contents API, e.g.
+            {
+                'type': 'file',
+                'name': 'vectorize.py',
+                'path': 'common/ragindex/vectorize.py',
+                'sha': '<blob sha>',
+                'size': 1234,
+                'download_url': 'https://raw.githubusercontent.com/...'
+            }
+
+    Raises:
+        Exception: If the GitHub API returns an error
+    """
+    api_url = f'{settings.GITHUB_API_URL}/repos/{owner}/{repo}/git/trees/{quote(branch)}?recursive=1'
+
+    response = github_session().get(api_url)
+    if response.status_code != 200:
+        raise Exception(f'Github API error: {response.status_code}')
+
+    tree = response.json()
+
+    # very large trees are truncated by the API; fall back to directory walking
+    if tree.get('truncated'):
+        return get_github_contents(owner, repo, branch)
+
+    all_contents = []
+    for item in tree.get('tree', []):
+        if item['type'] != 'blob':
+            continue
+        all_contents.append({
+            'type': 'file',
+            'name': os.path.basename(item['path']),
+            'path': item['path'],
+            'sha': item['sha'],
+            'size': item.get('size', 0),
+            'download_url': raw_download_url(owner, repo, branch, item['path'])
+        })
+    return all_contents
+
+
+def download_file_content(file_info):
+    """
+    Download the text content of a single file through the shared session.
+
+    Raises:
+        Exception: If the file cannot be fetched
+    """
+    response = github_session().get(file_info['download_url'])
+    if response.status_code != 200:
+        raise Exception(f'Error fetching file content: {response.status_code}')
+    return response.text
+
+
+def fetch_github_files(file_infos, max_workers=None):
+    """
+    Download many files concurrently over pooled keep-alive connections.
+
+    Args:
+        file_infos (list): File entries from list_github_tree or get_github_contents
+        max_workers (int, optional): Concurrent downloads, defaults to
+                                     settings.GITHUB_FETCH_WORKERS
+
+    Returns:
+        list: (file_info, content, error) tuples in input order. Exactly one of
+              content or error is None.
+    """
+    if max_workers is None:
+        max_workers = settings.GITHUB_FETCH_WORKERS
+    max_workers = max(1, int(max_workers))
+
+    def fetch(file_info):
+        try:
+            return file_info, download_file_content(file_info), None
+        except Exception as e:
+            return file_info, None, e
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(fetch, file_infos))
+
+
+def get_github_commit(owner, repo, branch='main'):
+    """
+    Resolve the commit sha at the head of a branch.
+
+    Raises:
+        Exception: If the GitHub API returns an error
+    """
+    api_url = f'{settings.GITHUB_API_URL}/repos/{owner}/{repo}/commits/{quote(branch)}'
+
+    response = github_session().get(api_url)
+    if response.status_code != 200:
+        raise Exception(f'Github API error: {response.status_code}')
+    return response.json()['sha']
+
+
+def compare_github_commits(owner, repo, base, head):
+    """
+    List files changed between two commits with the compare API.
+
+    The compare API diffs head against the merge base of the two commits,
+    which only equals base when head is ahead of it. After a force-push or
+    rebase the base commit is no longer an ancestor, and files changed on
+    the abandoned history would be missed, so no comparison is returned.
+
+    Returns:
+        tuple: (changed, removed) lists of paths, or None if the comparison is
+               unavailable (unknown base commit, head not ahead of base or
+               too many files to list)
+    """
+    api_url = f'{settings.GITHUB_API_URL}/repos/{owner}/{repo}/compare/{base}...{head}'
+
+    response = github_session().get(api_url)
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise Exception(f'Github API error: {response.status_code}')
+
+    comparison = response.json()
+    if comparison.get('status') == 'identical':
+        return [], []
+    if comparison.get('status') != 'ahead':
+        return None
+
+    files = comparison.get('files', [])
+    # the compare API lists at most 300 files
+    if len(files) >= 300:
+        return None
+
+    changed, removed = [], []
+    for item in files:
+        if item['status'] == 'removed':
+            removed.append(item['filename'])
+            continue
+        if item['status'] == 'renamed' and item.get('previous_filename'):
+            removed.append(item['previous_filename'])
+        changed.append(item['filename'])
+    return changed, removed
@@ -0,0 +1 @@
+from .worker import *
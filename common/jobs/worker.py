@@ -0,0 +1,250 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections
+from django.utils import timezone
+from common.utils import parse_repository_string
+
+logger = logging.getLogger('django')
+
+# progress is written to the database at most once per interval
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+
+def _vectorize_commit(repository, params):
+    from common.ragindex.vectorize import head_commit
+    return head_commit(repository, params.get('source', 'github'))
+
+
+def _vectorize(repository, params, progress):
+    from common.ragindex.vectorize import vectorize_repository
+    return vectorize_repository(repository, params.get('source', 'github'), progress)
+
+
+def _codereview_commit(repository, params):
+    from common.clone.tree import clone_head_commit
+    return clone_head_commit(repository)
+
+
+def _codereview(repository, params, progress):
+    from common.agent.analyze import agent_analyze
+    return agent_analyze('code_review', repository, progress,
+                         params.get('thread_id'), params.get('mode'))
+
+
+# kind: (resolve the commit the job works on, run the job)
+JOB_KINDS = {
+    'vectorize': (_vectorize_commit, _vectorize),
+    'codereview': (_codereview_commit, _codereview),
+}
+
+
+def worker_name(pid=None):
+    return f'{socket.gethostname()}:{pid or os.getpid()}'
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueue:
+    """
+    Runs jobs recorded in the Job table on a bounded pool of worker threads.
+
+    Jobs are submitted by kind, repository and parameters. The commit the job
+    will work on is resolved at submission, and a submission matching a job
+    that is still queued or running returns that job instead of adding one.
+    At most max_queued jobs wait for a worker; further submissions are
+    refused until the queue drains.
+
+    Args:
+        workers (int, optional): Worker threads, defaults to settings.JOB_WORKERS
+        max_queued (int, optional): Defaults to settings.JOB_MAX_QUEUED
+    """
+
+    def __init__(self, workers=None, max_queued=None):
+        self.workers = int(workers or settings.JOB_WORKERS)
+        self.max_queued = int(max_queued or settings.JOB_MAX_QUEUED)
+        self.worker = worker_name()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix='job-worker')
+        # jobs may report progress from inside an event loop, where the ORM
+        # cannot be used, so progress is written from its own thread
+        self._progress_writer = ThreadPoolExecutor(max_workers=1,
+                                                   thread_name_prefix='job-progress')
+        self._lock = threading.Lock()
+        self._queued = 0
+        self.fail_orphaned_jobs()
+
+    def fail_orphaned_jobs(self):
+        """
+        Fail active jobs left behind by server processes on this host that
+        have exited, so they no longer absorb new submissions.
+        """
+        from api.models import Job
+        host = socket.gethostname()
+        for job in Job.objects.filter(status__in=Job.ACTIVE_STATUSES,
+                                      worker__startswith=f'{host}:'):
+            pid = int(job.worker.rsplit(':', 1)[1])
+            if pid != os.getpid() and not _process_alive(pid):
+                self._finish(job.id, Job.FAILED, error='Interrupted: the server process exited')
+
+    def submit(self, kind, repository, **params):
+        """
+        Submit a job, or find the active job doing the same work.
+
+        Args:
+            kind (str): One of JOB_KINDS
+            repository (str): Repository string in format 'owner/repo/branch'
+            **params: Job parameters, e.g. source for vectorize
+
+        Returns:
+            dict:
+                On success:
+                    {
+                        'job': <Job.as_dict()>,
+                        'coalesced': True if an active job was returned
+                    }
+                On error:
+                    {
+                        'error': 'error message',
+                        'queue_full': True (only when the queue is full)
+                    }
+        """
+        from api.models import Job
+
+        if kind not in JOB_KINDS:
+            return {'error': f'Unknown job kind: {kind}'}
+        try:
+            owner, repo, branch = parse_repository_string(repository)
+            repository = f'{owner}/{repo}/{branch}'
+            resolve_commit, _ = JOB_KINDS[kind]
+            commit = resolve_commit(repository, params)
+        except Exception as e:
+            return {'error': str(e)}
+
+        active_key = f'{kind}:{repository}:{commit}:{json.dumps(params, sort_keys=True)}'
+        with self._lock:
+            existing = Job.objects.filter(active_key=active_key).first()
+            if existing:
+                return {'job': existing.as_dict(), 'coalesced': True}
+            if self._queued >= self.max_queued:
+                return {'error': 'Job queue is full', 'queue_full': True}
+            try:
+                job = Job.objects.create(kind=kind, repository=repository, commit=commit,
+                                         params=params, active_key=active_key,
+                                         worker=self.worker)
+            except IntegrityError:
+                # submitted by another process since the lookup
+                existing = Job.objects.filter(active_key=active_key).first()
+                if existing:
+                    return {'job': existing.as_dict(), 'coalesced': True}
+                raise
+            self._queued += 1
+
+        self._executor.submit(self._run, job.id)
+        return {'job': job.as_dict(), 'coalesced': False}
+
+    def _finish(self, job_id, status, result=None, error=''):
+        from api.models import Job
+        Job.objects.filter(id=job_id).update(
+            status=status, result=result, error=error,
+            active_key=None, finished_at=timezone.now()
+        )
+
+    def _save_progress(self, job_id, counters):
+        from api.models import Job
+        try:
+            Job.objects.filter(id=job_id).update(progress=counters)
+        except Exception as e:
+            logger.warning(f'Failed to save progress of job {job_id}: {str(e)}')
+
+    def _run(self, job_id):
+        from api.models import Job
+
+        with self._lock:
+            self._queued -= 1
+        try:
+            close_old_connections()
+            job = Job.objects.get(id=job_id)
+            Job.objects.filter(id=job_id).update(status=Job.RUNNING, started_at=timezone.now())
+            _, run = JOB_KINDS[job.kind]
+
+            last_saved, latest = 0.0, None
+
+            def progress(counters):
+                nonlocal last_saved, latest
+                latest = dict(counters)
+                now = time.monotonic()
+                if now - last_saved >= PROGRESS_INTERVAL_SECONDS:
+                    last_saved = now
+                    self._progress_writer.submit(self._save_progress, job_id, latest)
+
+            result = run(job.repository, job.params, progress)
+            if latest is not None:
+                # queued behind any earlier writes, so the final counters win
+                self._progress_writer.submit(self._save_progress, job_id, latest).result()
+            if 'error' in result:
+                self._finish(job_id, Job.FAILED, error=result['error'])
+            else:
+                self._finish(job_id, Job.SUCCEEDED, result=result)
+
+        except Exception as e:
+            logger.exception(f'Job {job_id} failed')
+            self._finish(job_id, Job.FAILED, error=str(e))
+        finally:
+            close_old_connections()
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """
+    Return the process-wide JobQueue, starting it on first use.
+    """
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+        return _job_queue
+
+
+def submit_job(kind, repository, **params):
+    """
+    Submit a job to the process-wide JobQueue; see JobQueue.submit.
+    """
+    return get_job_queue().submit(kind, repository, **params)
+
+
+def get_job(job_id, include_result=False):
+    """
+    Look up a job.
+
+    Args:
+        job_id (str): The job id
+        include_result (bool): Add the job's 'result'
+
+    Returns:
+        dict or None: Job.as_dict(), or None if there is no such job
+    """
+    from api.models import Job
+    job = Job.objects.filter(id=job_id).first()
+    if job is None:
+        return None
+    described = job.as_dict()
+    if include_result:
+        described['result'] = job.result
+    return described
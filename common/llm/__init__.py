@@ -1,2 +1,2 @@
 from .prompt import *
-
+from .embeddings import *
@@ -0,0 +1,160 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+import numpy as np
+from common.ragindex.state import get_index_state
+from common.ragindex.lexical import get_current_lexical_index
+
+
+def index_version(namespace):
+    """
+    Version of a namespace's indexes: the commit and time its vectors were
+    last indexed, and the commit and build time of the lexical index used
+    with them. Changes whenever the namespace is vectorized or updated, or
+    its lexical index is built or deleted, in any process.
+    """
+    state = get_index_state(namespace)
+    lexical = get_current_lexical_index(namespace)
+    if not state and lexical is None:
+        return None
+    version = f'{state["commit"]}@{state["indexed_at"]}' if state else ''
+    if lexical is not None:
+        version += f'+lexical:{lexical.commit}@{lexical.built_at}'
+    return version
+
+
+class SemanticAnswerCache:
+    """
+    In-memory cache of RAG answers, matched by query embedding similarity.
+
+    Answers are grouped by (namespace, index version, answer config), see
+    answer_cache_key. A lookup returns the stored answer whose query is most
+    similar to the new one, if its cosine similarity is at least threshold.
+    Because the index version is part of the key, re-vectorizing a namespace
+    retires its answers; older versions are dropped as soon as a new one is
+    stored. At most max_entries
+    answers are kept, evicting from the least recently used group.
+
+    Args:
+        threshold (float, optional): Defaults to settings.ANSWER_CACHE_THRESHOLD
+        max_entries (int, optional): Defaults to settings.ANSWER_CACHE_SIZE
+    """
+
+    def __init__(self, threshold=None, max_entries=None):
+        self.threshold = float(threshold or settings.ANSWER_CACHE_THRESHOLD)
+        self.max_entries = int(max_entries or settings.ANSWER_CACHE_SIZE)
+        self._groups = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, key, embedding):
+        """
+        Find a stored answer for a query similar to the given embedding.
+
+        Returns:
+            dict or None: {'answer', 'prompt', 'sources', 'similarity', 'created'}
+        """
+        query = self._normalize(embedding)
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None or not group['answers']:
+                self.misses += 1
+                return None
+            self._groups.move_to_end(key)
+            similarities = group['vectors'] @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {**group['answers'][best], 'similarity': float(similarities[best])}
+
+    def store(self, key, embedding, prompt, answer, sources=None):
+        """
+        Remember the answer to a query and the sources it was based on.
+        """
+        vector = self._normalize(embedding)[np.newaxis, :]
+        namespace = key[0]
+        with self._lock:
+            # a new index version makes older answers for the namespace stale
+            for stale in [k for k in self._groups if k[0] == namespace and k[1] != key[1]]:
+                self._drop(stale)
+
+            group = self._groups.setdefault(key, {'vectors': vector[:0], 'answers': []})
+            group['vectors'] = np.vstack([group['vectors'], vector])
+            group['answers'].append({
+                'answer': answer,
+                'prompt': prompt,
+                'sources': sources or [],
+                'created': time.time()
+            })
+            self._groups.move_to_end(key)
+            self._size += 1
+
+            while self._size > self.max_entries:
+                oldest = next(iter(self._groups))
+                group = self._groups[oldest]
+                group['vectors'] = group['vectors'][1:]
+                group['answers'].pop(0)
+                self._size -= 1
+                if not group['answers']:
+                    del self._groups[oldest]
+
+    def _drop(self, key):
+        self._size -= len(self._groups.pop(key)['answers'])
+
+    def invalidate(self, namespace):
+        """
+        Forget every answer for a namespace.
+        """
+        with self._lock:
+            for key in [k for k in self._groups if k[0] == namespace]:
+                self._drop(key)
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """
+    Return the process-wide SemanticAnswerCache, or None when ANSWER_CACHE
+    is disabled.
+    """
+    global _answer_cache
+    if not settings.ANSWER_CACHE:
+        return None
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = SemanticAnswerCache()
+        return _answer_cache
+
+
+def answer_cache_key(namespace, model, temperature, retrieval_prompt, k):
+    """
+    Return the answer cache key for prompts against a retrieval namespace:
+    everything that shapes their answers besides the prompt, i.e. the index
+    version, the chat model and temperature, the retrieval prompt text, the
+    number of retrieved documents and the embedding model.
+
+    Args:
+        namespace (str): Retrieval namespace 'owner/repo/branch'
+        model (str): Chat model name
+        temperature (float): Chat model temperature
+        retrieval_prompt (str): Text of the retrieval QA prompt template
+        k (int): Number of documents retrieved
+    """
+    prompt_hash = hashlib.sha256(retrieval_prompt.encode('utf-8')).hexdigest()
+    config = (model, temperature, prompt_hash, k,
+              settings.EMBEDDING_MODEL, int(settings.EMBEDDING_DIMENSIONS))
+    return (namespace, index_version(namespace), config)
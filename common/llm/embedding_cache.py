@@ -0,0 +1,147 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from django.conf import settings
+import numpy as np
+
+
+def content_hash(text):
+    """
+    Content address of an embedding input.
+    """
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by (content hash, model, dimensions).
+
+    Embeddings are stored as float32 blobs in SQLite. When the stored vectors
+    exceed max_bytes, least recently used entries are evicted.
+    """
+
+    def __init__(self, path=None, max_bytes=None):
+        self.path = str(path or settings.EMBEDDING_CACHE_PATH)
+        self.max_bytes = int(max_bytes or settings.EMBEDDING_CACHE_MAX_BYTES)
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS embeddings ('
+            ' hash TEXT NOT NULL,'
+            ' model TEXT NOT NULL,'
+            ' dimensions INTEGER NOT NULL,'
+            ' vector BLOB NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' accessed REAL NOT NULL,'
+            ' PRIMARY KEY (hash, model, dimensions))'
+        )
+        self._conn.execute(
+            'CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed)'
+        )
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM embeddings'
+        ).fetchone()[0]
+
+    def get_many(self, hashes, model, dimensions):
+        """
+        Look up embeddings by content hash.
+
+        Returns:
+            dict: {hash: [floats]} for every hash found in the cache
+        """
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            # stay well under SQLite's bound parameter limit
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f'SELECT hash, vector FROM embeddings WHERE model = ? AND dimensions = ? '
+                    f'AND hash IN ({placeholders})',
+                    [model, dimensions, *chunk]
+                ).fetchall()
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    'UPDATE embeddings SET accessed = ? WHERE hash = ? AND model = ? AND dimensions = ?',
+                    [(now, key, model, dimensions) for key in found]
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, items, model, dimensions):
+        """
+        Store embeddings.
+
+        Args:
+            items (dict): {hash: [floats]}
+        """
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, embedding in items.items():
+            vector = np.asarray(embedding, dtype=np.float32).tobytes()
+            rows.append((key, model, dimensions, vector, len(vector), now))
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (hash, model, dimensions, vector, size, accessed) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            self._conn.commit()
+            self._total_bytes = self._conn.execute(
+                'SELECT COALESCE(SUM(size), 0) FROM embeddings'
+            ).fetchone()[0]
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # drop least recently used entries down to 90% of the size limit
+        target = int(self.max_bytes * 0.9)
+        excess = self._total_bytes - target
+        rows = self._conn.execute(
+            'SELECT rowid, size FROM embeddings ORDER BY accessed'
+        )
+        doomed = []
+        for rowid, size in rows:
+            if excess <= 0:
+                break
+            doomed.append((rowid,))
+            excess -= size
+        self._conn.executemany('DELETE FROM embeddings WHERE rowid = ?', doomed)
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM embeddings'
+        ).fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        return {'entries': entries, 'bytes': self._total_bytes, 'max_bytes': self.max_bytes}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """
+    Return the process-wide embedding cache, or None if caching is disabled.
+    """
+    global _cache
+    if not settings.EMBEDDING_CACHE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
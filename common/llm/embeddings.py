@@ -0,0 +1,415 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from langchain_core.embeddings import Embeddings
+from common.llm.embedding_cache import content_hash, get_embedding_cache
+from common.clients import get_openai, get_async_openai
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# per-input limit of the OpenAI embedding models
+MAX_INPUT_TOKENS = 8191
+
+# attempts per embeddings request on rate limits, server and transport
+# errors, with exponential backoff between them
+EMBED_ATTEMPTS = 4
+EMBED_BACKOFF_SECONDS = 1.0
+
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def _encoding(model):
+    if tiktoken is None:
+        return None
+    with _encodings_lock:
+        if model not in _encodings:
+            try:
+                try:
+                    _encodings[model] = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    _encodings[model] = tiktoken.get_encoding('cl100k_base')
+            except Exception:
+                # encoding files are downloaded on first use; estimate offline
+                _encodings[model] = None
+        return _encodings[model]
+
+
+def is_transient_error(error):
+    """
+    Return True for errors worth retrying unchanged: rate limits, server
+    errors and transport failures.
+    """
+    try:
+        import openai
+    except ImportError:
+        return False
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def is_input_error(error):
+    """
+    Return True for errors caused by the inputs of a request, such as an
+    input over the token limit, which smaller requests can avoid.
+    """
+    try:
+        import openai
+    except ImportError:
+        return False
+    return isinstance(error, openai.APIStatusError) and error.status_code in (400, 413, 422)
+
+
+def count_tokens(text, model=None):
+    """
+    Count tokens in text for the given model. When the tiktoken encoding is
+    unavailable, the UTF-8 length of text is used instead: every token covers
+    at least one byte, so the count never falls below the real one and limits
+    checked against it hold.
+    """
+    encoding = _encoding(model or settings.EMBEDDING_MODEL)
+    if encoding is None:
+        return len(text.encode('utf-8'))
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens, model=None):
+    """
+    Truncate text to at most max_tokens tokens (max_tokens UTF-8 bytes when
+    the tiktoken encoding is unavailable).
+    """
+    encoding = _encoding(model or settings.EMBEDDING_MODEL)
+    if encoding is None:
+        return text.encode('utf-8')[:max_tokens].decode('utf-8', errors='ignore')
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+class EmbeddingCounts:
+    """
+    Embedding request and cache counters. The embedder keeps one for all of
+    its work; a run that shares the embedder passes its own to the embed
+    calls to count only its requests.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._lock = threading.Lock()
+
+    def add(self, requests=0, cache_hits=0, cache_misses=0):
+        with self._lock:
+            self.requests += requests
+            self.cache_hits += cache_hits
+            self.cache_misses += cache_misses
+
+
+class BatchEmbedder:
+    """
+    Embed many inputs with as few OpenAI requests as possible.
+
+    Inputs are packed in order into requests bounded by a token budget and an
+    item budget, and one OpenAI client is reused for every request. Embeddings
+    are returned aligned to their inputs. Requests failing on rate limits,
+    server or transport errors are retried whole with backoff. A request
+    rejected for its inputs is split in halves until the inputs at fault are
+    isolated, so one bad input does not fail the others. When a cache
+    is supplied, inputs already embedded with the same model and dimensions
+    are served from it. Query embeddings are also kept in an in-memory LRU of
+    query_cache_size entries.
+    """
+
+    def __init__(self, model=None, dimensions=None, client=None,
+                 max_batch_tokens=None, max_batch_items=None, cache=None,
+                 query_cache_size=None):
+        self.model = model or settings.EMBEDDING_MODEL
+        self.dimensions = int(dimensions or settings.EMBEDDING_DIMENSIONS)
+        self.max_batch_tokens = int(max_batch_tokens or settings.EMBEDDING_BATCH_TOKENS)
+        self.max_batch_items = int(max_batch_items or settings.EMBEDDING_BATCH_SIZE)
+        self._client = client
+        self._lock = threading.Lock()
+        self.cache = cache
+        self.query_cache_size = int(settings.QUERY_EMBEDDING_CACHE_SIZE
+                                    if query_cache_size is None else query_cache_size)
+        self._queries = OrderedDict()
+        self.counts = EmbeddingCounts()
+
+    @property
+    def requests(self):
+        return self.counts.requests
+
+    @property
+    def cache_hits(self):
+        return self.counts.cache_hits
+
+    @property
+    def cache_misses(self):
+        return self.counts.cache_misses
+
+    def _count(self, counts, **kwargs):
+        self.counts.add(**kwargs)
+        if counts is not None:
+            counts.add(**kwargs)
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                try:
+                    self._client = get_openai()
+                except Exception as e:
+                    raise Exception(f'OpenAI Instantiation error: {str(e)}')
+            return self._client
+
+    def pack(self, texts):
+        """
+        Split texts into batches of (start, [texts]) under the token and item
+        budgets. Inputs longer than the model limit are truncated.
+        """
+        batches = []
+        batch, batch_start, batch_tokens = [], 0, 0
+        for i, text in enumerate(texts):
+            tokens = count_tokens(text, self.model)
+            if tokens > MAX_INPUT_TOKENS:
+                text = truncate_tokens(text, MAX_INPUT_TOKENS, self.model)
+                tokens = MAX_INPUT_TOKENS
+            if batch and (batch_tokens + tokens > self.max_batch_tokens or
+                          len(batch) >= self.max_batch_items):
+                batches.append((batch_start, batch))
+                batch, batch_start, batch_tokens = [], i, 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append((batch_start, batch))
+        return batches
+
+    def _request(self, inputs):
+        kwargs = {'input': inputs, 'model': self.model}
+        # only the text-embedding-3 models accept a dimensions parameter
+        if self.model.startswith('text-embedding-3'):
+            kwargs['dimensions'] = self.dimensions
+        return kwargs
+
+    def _response_embeddings(self, response, counts=None):
+        self._count(counts, requests=1)
+        embeddings = [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+        for embedding in embeddings:
+            if len(embedding) != self.dimensions:
+                raise ValueError(f'Unexpected embedding dimension: {len(embedding)}')
+        return embeddings
+
+    def create(self, inputs, counts=None):
+        """
+        Send a single embeddings request and return embeddings in input order.
+        """
+        response = self.client.embeddings.create(**self._request(inputs))
+        return self._response_embeddings(response, counts)
+
+    def _create_with_retry(self, inputs, counts=None):
+        for attempt in range(EMBED_ATTEMPTS):
+            try:
+                return self.create(inputs, counts)
+            except Exception as e:
+                if attempt + 1 == EMBED_ATTEMPTS or not is_transient_error(e):
+                    raise
+            time.sleep(EMBED_BACKOFF_SECONDS * 2 ** attempt)
+
+    async def _acreate_with_retry(self, inputs, counts=None):
+        for attempt in range(EMBED_ATTEMPTS):
+            try:
+                return await self.acreate(inputs, counts)
+            except Exception as e:
+                if attempt + 1 == EMBED_ATTEMPTS or not is_transient_error(e):
+                    raise
+            await asyncio.sleep(EMBED_BACKOFF_SECONDS * 2 ** attempt)
+
+    async def acreate(self, inputs, counts=None):
+        """
+        Async create, with the AsyncOpenAI client of the running event loop.
+        """
+        if self._client is not None:
+            # an injected client is synchronous
+            return await asyncio.to_thread(self.create, inputs, counts)
+        try:
+            client = get_async_openai()
+        except Exception as e:
+            raise Exception(f'OpenAI Instantiation error: {str(e)}')
+        response = await client.embeddings.create(**self._request(inputs))
+        return self._response_embeddings(response, counts)
+
+    def embed(self, texts, counts=None):
+        """
+        Embed a list of texts.
+
+        Args:
+            texts (list): Non-empty strings to embed
+            counts (EmbeddingCounts, optional): Also count this call's
+                                                requests and cache use here
+
+        Returns:
+            list: One embedding (list of floats) per input, in input order
+
+        Raises:
+            Exception: With the first error if any input could not be embedded
+        """
+        embeddings, errors = self.embed_partial(texts, counts)
+        if errors:
+            raise Exception(errors[min(errors)])
+        return embeddings
+
+    def embed_partial(self, texts, counts=None):
+        """
+        Embed a list of texts, embedding as many as possible when some fail.
+
+        Returns:
+            tuple: (embeddings, errors) where embeddings has one embedding per
+                   input, None for inputs that failed, and errors maps the
+                   index of each failed input to its error message
+        """
+        if self.cache is None:
+            return self._embed(texts, counts)
+
+        hashes = [content_hash(text) for text in texts]
+        cached = self.cache.get_many(hashes, self.model, self.dimensions)
+
+        # embed each distinct uncached input once
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        embedded, failed = self._embed(list(missing.values()), counts)
+        fresh = {key: embedding for key, embedding in zip(missing, embedded)
+                 if embedding is not None}
+        self.cache.put_many(fresh, self.model, self.dimensions)
+        failed = {key: failed[i] for i, key in enumerate(missing) if i in failed}
+
+        self._count(counts, cache_hits=len(texts) - len(missing), cache_misses=len(missing))
+        embeddings = [cached.get(key, fresh.get(key)) for key in hashes]
+        errors = {i: failed[key] for i, key in enumerate(hashes) if key in failed}
+        return embeddings, errors
+
+    def _embed(self, texts, counts=None):
+        embeddings = [None] * len(texts)
+        errors = {}
+        for start, batch in self.pack(texts):
+            self._embed_batch(start, batch, embeddings, errors, counts)
+        return embeddings, errors
+
+    def _embed_batch(self, start, batch, embeddings, errors, counts=None):
+        try:
+            results = self._create_with_retry(batch, counts)
+        except Exception as e:
+            if len(batch) == 1 or not is_input_error(e):
+                for offset in range(len(batch)):
+                    errors[start + offset] = str(e)
+                return
+            # bisect, so only the inputs at fault fail
+            middle = len(batch) // 2
+            self._embed_batch(start, batch[:middle], embeddings, errors, counts)
+            self._embed_batch(start + middle, batch[middle:], embeddings, errors, counts)
+            return
+        for offset, embedding in enumerate(results):
+            embeddings[start + offset] = embedding
+
+    async def aembed(self, texts):
+        """
+        Async embed. Batches are requested concurrently, and the embedding
+        cache is read and written in worker threads.
+        """
+        if self.cache is None:
+            return await self._aembed(texts)
+
+        hashes = [content_hash(text) for text in texts]
+        cached = await asyncio.to_thread(self.cache.get_many, hashes, self.model, self.dimensions)
+
+        missing = {}
+        for key, text in zip(hashes, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        fresh = dict(zip(missing, await self._aembed(list(missing.values()))))
+        await asyncio.to_thread(self.cache.put_many, fresh, self.model, self.dimensions)
+
+        self._count(None, cache_hits=len(texts) - len(missing), cache_misses=len(missing))
+        return [cached[key] if key in cached else fresh[key] for key in hashes]
+
+    async def _aembed(self, texts):
+        batches = self.pack(texts)
+        results = await asyncio.gather(*(self._acreate_with_retry(batch) for _, batch in batches))
+        embeddings = [None] * len(texts)
+        for (start, _), batch_embeddings in zip(batches, results):
+            for offset, embedding in enumerate(batch_embeddings):
+                embeddings[start + offset] = embedding
+        return embeddings
+
+    def _cached_query(self, text):
+        with self._lock:
+            embedding = self._queries.get(text)
+            if embedding is not None:
+                self._queries.move_to_end(text)
+            return embedding
+
+    def _remember_query(self, text, embedding):
+        if self.query_cache_size:
+            with self._lock:
+                self._queries[text] = embedding
+                while len(self._queries) > self.query_cache_size:
+                    self._queries.popitem(last=False)
+
+    def embed_query(self, text):
+        embedding = self._cached_query(text)
+        if embedding is None:
+            embedding = self.embed([text])[0]
+            self._remember_query(text, embedding)
+        return embedding
+
+    async def aembed_query(self, text):
+        embedding = self._cached_query(text)
+        if embedding is None:
+            embedding = (await self.aembed([text]))[0]
+            self._remember_query(text, embedding)
+        return embedding
+
+
+class BatchedOpenAIEmbeddings(Embeddings):
+    """
+    LangChain embeddings adapter backed by a BatchEmbedder.
+    """
+
+    def __init__(self, embedder=None):
+        self.embedder = embedder or get_embedder()
+
+    def embed_documents(self, texts):
+        return self.embedder.embed(list(texts))
+
+    def embed_query(self, text):
+        return self.embedder.embed_query(text)
+
+    async def aembed_documents(self, texts):
+        return await self.embedder.aembed(list(texts))
+
+    async def aembed_query(self, text):
+        return await self.embedder.aembed_query(text)
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """
+    Return the process-wide BatchEmbedder for the configured model.
+    """
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            _embedder = BatchEmbedder(cache=get_embedding_cache())
+        return _embedder
@@ -1,116 +1,328 @@
+import asyncio
 import logging
 from django.conf import settings
 from common.utils import parse_repository_string
 from langchain_core.messages import AIMessage, HumanMessage
-from langchain_openai import ChatOpenAI
 from langchain.chains import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain import hub
-from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
-from pinecone import Pinecone
+from common.clients import (
+    get_chat_model, get_async_chat_model, get_embeddings, get_retrieval_qa_prompt
+)
 
 
 logger = logging.getLogger('django')
 
-def process_chat_prompt(prompt, repository=None, context=None):
+CHAT_MODEL = 'gpt-4o-mini'
+RETRIEVAL_K = 3
+
+def document_source(document):
     """
-    Process a chat prompt with OpenAI's GPT model, optionally using repository context.
+    Describe a retrieved document for clients: its file and line range.
+    """
+    metadata = document.metadata
+    return {
+        'path': metadata.get('path'),
+        'start_line': metadata.get('start_line'),
+        'end_line': metadata.get('end_line')
+    }
+
+def prepare_chat_prompt(prompt, repository=None, context=None, llm=None):
+    """
+    Validate a chat prompt and build the runnable that answers it.
+
+    Shared by the sync and async entry points; everything here is
+    synchronous, so async callers run it in a worker thread.
 
     Args:
         prompt (str): The prompt text to send to GPT
         repository (str, optional): Repository string in format 'owner/repo/branch'
         context (list, optional): Additional context strings
+        llm (BaseChatModel, optional): Defaults to the shared chat model
 
     Returns:
-        dict: A dictionary containing:
+        dict:
             On success:
                 {
-                    'response': 'GPT response text'
+                    'runnable': <retrieval chain or chat model>,
+                    'input': <runnable input>,
+                    'prompt': 'prompt text, with any context files',
+                    'embeddings': <Embeddings or None>,
+                    'answer_cache': <SemanticAnswerCache or None>,
+                    'cache_key': <answer cache key or None>
                 }
             On error:
                 {
                     'error': 'error message'
                 }
-
-    Raises:
-        ValueError: If input validation fails
-        Exception: If there's an error processing the chat
     """
     try:
-        llm = ChatOpenAI(
-            api_key=settings.OPENAI_API_KEY,
-            model_name='gpt-4o-mini',
-            temperature=0.0
-        )
+        llm = llm or get_chat_model(CHAT_MODEL, 0.0)
     except Exception as e:
         return {'error': str(e)}
 
-    # If repository context is provided, use Pinecone
-    if repository:
+    # Execute without the vector index
+    if not repository:
+        return {
+            'runnable': llm,
+            'input': [HumanMessage(content=prompt)],
+            'prompt': prompt,
+            'embeddings': None,
+            'answer_cache': None,
+            'cache_key': None
+        }
+
+    try:
+        from common.ragindex.catalog import get_catalog
+        from common.ragindex.lexical import get_current_lexical_index
+        from common.ragindex.hybrid import repository_retriever
+        from common.llm.answer_cache import get_answer_cache, answer_cache_key
+
+        owner, repo, branch = parse_repository_string(repository)
+        repository = f'{owner}/{repo}/{branch}'
+
+        # a lexical index can answer on its own, without the vector index
+        lexical = get_current_lexical_index(repository)
+        if lexical is None and not get_catalog().contains(repository):
+            return {'error': 'Repository index not found: ' + repository}
+
+        if context:
+            try:
+                from common.clone.packer import pack_clone_context
+                packed = pack_clone_context(repository, context,
+                                            budget=settings.PROMPT_CONTEXT_TOKENS)
+                prompt += '\n\n' + packed['text']
+            except Exception as e:
+                return {'error': 'Failed to read context files: ' + str(e)}
+
         try:
-            owner, repo, branch = parse_repository_string(repository)
-            repository = f'{owner}/{repo}/{branch}'
+            embeddings = get_embeddings()
+        except ValueError as e:
+            logger.info('Failed to instantiate embeddings: ' + str(e))
+            return {'error': str(e)}
 
-            pc = Pinecone(
-                api_key=settings.PINECONE_API_KEY,
-                environment=settings.PINECONE_ENVIRONMENT
+        # context files can change without the index changing, so only
+        # prompts without them are cached. Prompts the lexical index answers
+        # alone skip the cache too: looking them up would cost the query
+        # embedding that lexical retrieval avoids.
+        answer_cache = None
+        if not context and not (lexical is not None and lexical.covers(prompt)):
+            answer_cache = get_answer_cache()
+
+        retrieval_qa_chat_prompt = get_retrieval_qa_prompt()
+        combine_docs_chain = create_stuff_documents_chain(
+            llm, retrieval_qa_chat_prompt
+        )
+        retriever = repository_retriever(repository, embeddings, k=RETRIEVAL_K)
+        cache_key = None
+        if answer_cache:
+            cache_key = answer_cache_key(
+                repository,
+                getattr(llm, 'model_name', CHAT_MODEL),
+                getattr(llm, 'temperature', None),
+                retrieval_qa_chat_prompt.pretty_repr(),
+                RETRIEVAL_K
             )
+        return {
+            'runnable': create_retrieval_chain(retriever, combine_docs_chain),
+            'input': {"input": prompt},
+            'prompt': prompt,
+            'embeddings': embeddings,
+            'answer_cache': answer_cache,
+            'cache_key': cache_key
+        }
+
+    except Exception as e:
+        return {'error': str(e)}
 
-            index = pc.Index(settings.PINECONE_INDEX)
+def cached_events(cached):
+    """
+    Yield the events replaying an answer from the answer cache.
+    """
+    yield {'type': 'sources', 'sources': cached.get('sources', [])}
+    yield {'type': 'token', 'content': cached['answer']}
+    yield {'type': 'done', 'response': cached['answer'], 'cached': True}
 
-            if repository not in list(index.describe_index_stats().namespaces.keys()):
-                return {
-                    'error': 'Repository index not found: ' + repository
-                }
+def chunk_parts(chunk):
+    """
+    Split a streamed chunk, or a whole output, into (retrieved documents or
+    None, answer text). Retrieval chains produce dicts; chat models produce
+    messages.
+    """
+    if isinstance(chunk, dict):
+        return chunk.get('context'), chunk.get('answer')
+    return None, chunk.content
 
-            if context:
-                try:
-                    from common.clone.files import formatted_files_from_clone
-                    prompt_context = formatted_files_from_clone(repository, context)
-                    prompt += '\n\n' + prompt_context
-                except ValueError as e:
-                    return {'error': 'Failed to read context files: ' + str(e)}
-                except Exception as e:
-                    return {'error': 'Failed to read context files: ' + str(e)}
+class AnswerCollector:
+    """
+    Turns streamed chunks into events, keeping the sources and answer so the
+    answer can be cached once it is complete.
+    """
 
-            try:
-                embeddings = OpenAIEmbeddings(
-                    model="text-embedding-ada-002",
-                    openai_api_key=settings.OPENAI_API_KEY
-                )
-            except ValueError as e:
-                logger.info('Failed to instantiate OpenAIEmbeddings: ' + str(e))
-                return {'error': str(e)}
-
-            input_dict = {"input": prompt}
-            index_name = settings.PINECONE_INDEX
-            retrieval_qa_chat_prompt = hub.pull("langchain-ai/retrieval-qa-chat")
-            docsearch = PineconeVectorStore.from_existing_index(
-                index_name=index_name,
-                namespace=repository,
-                embedding=embeddings
-            )
-            combine_docs_chain = create_stuff_documents_chain(
-                llm, retrieval_qa_chat_prompt
-            )
-            retriever = docsearch.as_retriever(
-                search_kwargs={
-                    'k': 3,
-                    'namespace': repository
-                }
+    def __init__(self, prepared):
+        self.prepared = prepared
+        self.sources = []
+        self.answer = []
+
+    def events(self, chunk):
+        documents, text = chunk_parts(chunk)
+        if documents is not None:
+            self.sources = [document_source(document) for document in documents]
+            yield {'type': 'sources', 'sources': self.sources}
+        if text:
+            self.answer.append(text)
+            yield {'type': 'token', 'content': text}
+
+    def done(self, query_embedding=None):
+        response = ''.join(self.answer)
+        if query_embedding is not None:
+            self.prepared['answer_cache'].store(
+                self.prepared['cache_key'], query_embedding,
+                self.prepared['prompt'], response, self.sources
             )
-            retrieval_chain = create_retrieval_chain(retriever, combine_docs_chain)
-            chat_response = retrieval_chain.invoke(input_dict)
-            return {'response': chat_response['answer']}
+        return {'type': 'done', 'response': response, 'cached': False}
 
-        except Exception as e:
-            return {'error': str(e)}
+def stream_chat_prompt(prompt, repository=None, context=None, incremental=True):
+    """
+    Process a chat prompt, yielding the answer as it is generated.
+
+    Repository prompts without context files are answered from the semantic
+    answer cache when a similar question was answered against the same
+    version of the repository index (see common.llm.answer_cache).
+
+    Args:
+        prompt (str): The prompt text to send to GPT
+        repository (str, optional): Repository string in format 'owner/repo/branch'
+        context (list, optional): Additional context strings
+        incremental (bool, optional): Stream tokens as the model generates
+            them. When False the answer is requested in one call and yielded
+            as a single token event, which costs less when nothing is shown
+            until the answer is complete.
+
+    Yields:
+        dict: Events, in this order:
+            {'type': 'sources', 'sources': [{'path', 'start_line', 'end_line'}, ...]}
+                (repository prompts only, before any tokens)
+            {'type': 'token', 'content': '<text>'} for each piece of the answer
+            {'type': 'done', 'response': '<full answer>', 'cached': <bool>}
+        or, on failure at any point:
+            {'type': 'error', 'error': '<error message>'}
+    """
+    prepared = prepare_chat_prompt(prompt, repository, context)
+    if 'error' in prepared:
+        yield {'type': 'error', 'error': prepared['error']}
+        return
 
-    # Execute without Pinecone
     try:
-        messages = [HumanMessage(content=prompt)]
-        response = llm.invoke(messages).content
-        return {'response': response}
+        query_embedding = None
+        if prepared['answer_cache']:
+            query_embedding = prepared['embeddings'].embed_query(prepared['prompt'])
+            cached = prepared['answer_cache'].lookup(prepared['cache_key'], query_embedding)
+            if cached:
+                yield from cached_events(cached)
+                return
+
+        # retrieval chains emit the retrieved documents before answer tokens
+        collector = AnswerCollector(prepared)
+        runnable, runnable_input = prepared['runnable'], prepared['input']
+        chunks = runnable.stream(runnable_input) if incremental else [runnable.invoke(runnable_input)]
+        for chunk in chunks:
+            yield from collector.events(chunk)
+        yield collector.done(query_embedding)
+
     except Exception as e:
-        return {'error': str(e)}
+        yield {'type': 'error', 'error': str(e)}
+
+async def astream_chat_prompt(prompt, repository=None, context=None, incremental=True):
+    """
+    Async stream_chat_prompt, for async views served over ASGI. The model and
+    query embedding use the AsyncOpenAI clients of the running event loop;
+    index and cache lookups run in worker threads.
+
+    Args and yields as for stream_chat_prompt.
+    """
+    try:
+        llm = get_async_chat_model(CHAT_MODEL, 0.0)
+    except Exception as e:
+        yield {'type': 'error', 'error': str(e)}
+        return
+
+    prepared = await asyncio.to_thread(prepare_chat_prompt, prompt, repository, context, llm)
+    if 'error' in prepared:
+        yield {'type': 'error', 'error': prepared['error']}
+        return
+
+    try:
+        query_embedding = None
+        if prepared['answer_cache']:
+            query_embedding = await prepared['embeddings'].aembed_query(prepared['prompt'])
+            cached = await asyncio.to_thread(
+                prepared['answer_cache'].lookup, prepared['cache_key'], query_embedding
+            )
+            if cached:
+                for event in cached_events(cached):
+                    yield event
+                return
+
+        collector = AnswerCollector(prepared)
+        runnable, runnable_input = prepared['runnable'], prepared['input']
+        if incremental:
+            async for chunk in runnable.astream(runnable_input):
+                for event in collector.events(chunk):
+                    yield event
+        else:
+            for event in collector.events(await runnable.ainvoke(runnable_input)):
+                yield event
+        yield await asyncio.to_thread(collector.done, query_embedding)
+
+    except Exception as e:
+        yield {'type': 'error', 'error': str(e)}
+
+def collect_events(events):
+    """
+    Reduce prompt events to the result returned by process_chat_prompt.
+    """
+    for event in events:
+        if event['type'] == 'error':
+            return {'error': event['error']}
+        if event['type'] == 'done':
+            result = {'response': event['response']}
+            if event['cached']:
+                result['cached'] = True
+            return result
+    return {'error': 'No response'}
+
+def process_chat_prompt(prompt, repository=None, context=None):
+    """
+    Process a chat prompt with OpenAI's GPT model, optionally using repository context.
+
+    Collects the events of stream_chat_prompt into a single result.
+
+    Args:
+        prompt (str): The prompt text to send to GPT
+        repository (str, optional): Repository string in format 'owner/repo/branch'
+        context (list, optional): Additional context strings
+
+    Returns:
+        dict: A dictionary containing:
+            On success:
+                {
+                    'response': 'GPT response text',
+                    'cached': True (only when served from the answer cache)
+                }
+            On error:
+                {
+                    'error': 'error message'
+                }
+
+    Raises:
+        ValueError: If input validation fails
+        Exception: If there's an error processing the chat
+    """
+    return collect_events(stream_chat_prompt(prompt, repository, context, incremental=False))
+
+async def aprocess_chat_prompt(prompt, repository=None, context=None):
+    """
+    Async process_chat_prompt, for async views.
+    """
+    events = astream_chat_prompt(prompt, repository, context, incremental=False)
+    return collect_events([event async for event in events])
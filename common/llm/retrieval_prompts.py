@@ -0,0 +1,12 @@
+"""
+Local copy of the langchain-ai/retrieval-qa-chat prompt from the LangChain hub,
+so building the retrieval chain needs no network fetch.
+"""
+
+RETRIEVAL_QA_CHAT_SYSTEM_PROMPT = """Answer any use questions based solely on the context below:
+
+<context>
+{context}
+</context>"""
+
+RETRIEVAL_QA_CHAT_HUB_NAME = 'langchain-ai/retrieval-qa-chat'
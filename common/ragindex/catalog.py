@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from common.ragindex.store import vector_index
+from common.ragindex.state import get_index_state
+
+logger = logging.getLogger('django')
+
+# a namespace missing from the catalog triggers at most one refresh per interval
+MISS_REFRESH_SECONDS = 1.0
+
+
+class NamespaceCatalog:
+    """
+    Cached view of the namespaces in the vector index and their vector counts.
+
+    describe_index_stats is called at most once per ttl seconds. After the
+    ttl, cached results are still served while a single background refresh
+    runs, so lookups of known namespaces never wait on the index. A lookup of
+    an unknown namespace refreshes synchronously, at most once per second, so
+    namespaces indexed by another process are found promptly. Vectorize,
+    update and delete record their changes here directly.
+
+    Args:
+        ttl (int, optional): Seconds before a refresh, defaults to
+                             settings.RAGINDEX_CATALOG_TTL
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = float(settings.RAGINDEX_CATALOG_TTL if ttl is None else ttl)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._counts = None
+        self._loaded_at = 0.0
+        self._refreshing = False
+
+    def refresh(self):
+        """
+        Reload namespaces and vector counts from the vector index.
+        """
+        with self._refresh_lock:
+            stats = vector_index().describe_index_stats()
+            counts = {namespace: getattr(summary, 'vector_count', None)
+                      for namespace, summary in stats.namespaces.items()}
+            with self._lock:
+                self._counts = counts
+                self._loaded_at = time.monotonic()
+                self._refreshing = False
+            return dict(counts)
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning(f'Namespace catalog refresh failed: {str(e)}')
+            with self._lock:
+                self._refreshing = False
+
+    def namespaces(self):
+        """
+        Return {namespace: vector_count} for every namespace in the index.
+        """
+        with self._lock:
+            counts = self._counts
+            age = time.monotonic() - self._loaded_at
+            stale = counts is not None and age >= self.ttl and not self._refreshing
+            if stale:
+                self._refreshing = True
+        if counts is None:
+            return self.refresh()
+        if stale:
+            threading.Thread(target=self._refresh_in_background,
+                             name='namespace-catalog-refresh', daemon=True).start()
+        return dict(counts)
+
+    def contains(self, namespace):
+        """
+        True if the namespace is in the vector index.
+        """
+        if namespace in self.namespaces():
+            return True
+        with self._lock:
+            recent = time.monotonic() - self._loaded_at < MISS_REFRESH_SECONDS
+        return False if recent else namespace in self.refresh()
+
+    def record(self, namespace, vectors=None):
+        """
+        Note that a namespace was written. Its vector count is set when
+        given; otherwise the next refresh fills it in.
+        """
+        with self._lock:
+            if self._counts is None:
+                return
+            if vectors is not None or namespace not in self._counts:
+                self._counts[namespace] = vectors
+            if vectors is None:
+                # pick up the new count on the next lookup
+                self._loaded_at = 0.0
+
+    def forget(self, namespace):
+        """
+        Note that a namespace was deleted.
+        """
+        with self._lock:
+            if self._counts is not None:
+                self._counts.pop(namespace, None)
+
+    def invalidate(self):
+        """
+        Drop everything cached; the next lookup reloads from the index.
+        """
+        with self._lock:
+            self._counts = None
+            self._loaded_at = 0.0
+
+    def describe(self):
+        """
+        Return every namespace with its vector count and what is recorded
+        about its last indexing.
+
+        Returns:
+            list: Sorted by namespace:
+                {
+                    'namespace': 'owner/repo/branch',
+                    'vectors': <vector_count>,
+                    'commit': <indexed_commit_sha or None>,
+                    'source': 'github', 'clone' or None,
+                    'indexed_at': <unix timestamp or None>
+                }
+        """
+        entries = []
+        for namespace, vectors in sorted(self.namespaces().items()):
+            state = get_index_state(namespace) or {}
+            entries.append({
+                'namespace': namespace,
+                'vectors': vectors,
+                'commit': state.get('commit'),
+                'source': state.get('source'),
+                'indexed_at': state.get('indexed_at')
+            })
+        return entries
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """
+    Return the process-wide NamespaceCatalog.
+    """
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = NamespaceCatalog()
+        return _catalog
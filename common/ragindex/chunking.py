@@ -0,0 +1,189 @@
+import ast
+import os
+import re
+from django.conf import settings
+from common.llm.embeddings import count_tokens
+
+MARKDOWN_HEADING = re.compile(r'^#{1,6}\s')
+MARKDOWN_FENCE = re.compile(r'^\s*(```|~~~)')
+
+
+def split_lines(line_tokens, start, end, max_tokens, overlap_tokens):
+    """
+    Split the line range [start, end] into windows of at most max_tokens.
+
+    Each window after the first repeats trailing lines of the previous window
+    worth up to overlap_tokens. A single line longer than max_tokens becomes a
+    window of its own.
+
+    Returns:
+        list: (start_line, end_line) tuples, 1-based and inclusive
+    """
+    windows = []
+    i = start
+    while i <= end:
+        j, total = i, 0
+        while j <= end and (j == i or total + line_tokens[j - 1] <= max_tokens):
+            total += line_tokens[j - 1]
+            j += 1
+        windows.append((i, j - 1))
+        if j > end:
+            break
+        k, overlap = j, 0
+        while k - 1 > i and overlap + line_tokens[k - 2] <= overlap_tokens:
+            k -= 1
+            overlap += line_tokens[k - 1]
+        i = k
+    return windows
+
+
+def pack_segments(segments, line_tokens, max_tokens, overlap_tokens):
+    """
+    Greedily pack adjacent segments into chunks of at most max_tokens.
+
+    Segments are contiguous (start_line, end_line) ranges. Chunks only break
+    on segment boundaries, except that a segment larger than max_tokens is
+    split into overlapping line windows.
+    """
+    def tokens(start, end):
+        return sum(line_tokens[start - 1:end])
+
+    chunks = []
+    current = None
+    for start, end in segments:
+        size = tokens(start, end)
+        if size > max_tokens:
+            if current:
+                chunks.append(current)
+                current = None
+            chunks.extend(split_lines(line_tokens, start, end, max_tokens, overlap_tokens))
+            continue
+        if current and tokens(current[0], current[1]) + size <= max_tokens:
+            current = (current[0], end)
+        else:
+            if current:
+                chunks.append(current)
+            current = (start, end)
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _boundaries_to_segments(boundaries, first_line, last_line):
+    starts = sorted({b for b in boundaries if first_line < b <= last_line})
+    starts = [first_line] + starts
+    ends = [s - 1 for s in starts[1:]] + [last_line]
+    return list(zip(starts, ends))
+
+
+def python_segments(lines, line_tokens, max_tokens):
+    """
+    Segment Python source on top-level function and class boundaries, and on
+    method boundaries inside classes too large for one chunk. Comments and
+    decorators directly above a definition stay with it.
+    """
+    tree = ast.parse('\n'.join(lines))
+
+    def node_start(node):
+        start = min([node.lineno] + [d.lineno for d in getattr(node, 'decorator_list', [])])
+        # pull leading comment lines into the definition
+        while start > 1 and lines[start - 2].lstrip().startswith('#'):
+            start -= 1
+        return start
+
+    def segment(nodes, first_line, last_line):
+        segments = _boundaries_to_segments(
+            [node_start(node) for node in nodes], first_line, last_line)
+        result = []
+        for start, end in segments:
+            inner = [node for node in nodes
+                     if isinstance(node, ast.ClassDef) and node_start(node) == start]
+            if inner and sum(line_tokens[start - 1:end]) > max_tokens and len(inner[0].body) > 1:
+                # keep the class header with its first member
+                result.extend(segment(inner[0].body[1:], start, end))
+            else:
+                result.append((start, end))
+        return result
+
+    return segment(tree.body, 1, len(lines))
+
+
+def markdown_segments(lines, line_tokens, max_tokens):
+    """
+    Segment Markdown on headings, ignoring heading-like lines in code fences.
+    """
+    boundaries = []
+    in_fence = False
+    for number, line in enumerate(lines, start=1):
+        if MARKDOWN_FENCE.match(line):
+            in_fence = not in_fence
+        elif not in_fence and MARKDOWN_HEADING.match(line):
+            boundaries.append(number)
+    return _boundaries_to_segments(boundaries, 1, len(lines))
+
+
+def line_segments(lines, line_tokens, max_tokens):
+    return [(1, len(lines))]
+
+
+CHUNKERS = {
+    '.py': python_segments,
+    '.md': markdown_segments,
+}
+
+
+def register_chunker(suffix, segmenter):
+    """
+    Register a segmenter for files with the given suffix.
+
+    A segmenter is called as segmenter(lines, line_tokens, max_tokens) and
+    returns contiguous (start_line, end_line) ranges covering the file.
+    """
+    CHUNKERS[suffix.lower()] = segmenter
+
+
+def chunk_file(path, content, max_tokens=None, overlap_tokens=None):
+    """
+    Split a file into token-bounded chunks on structural boundaries.
+
+    Python files split on function and class boundaries, Markdown files on
+    headings, and anything else on line windows. Pieces that are still too
+    large are split into line windows with token-bounded overlap.
+
+    Args:
+        path (str): File path, used to select the chunker
+        content (str): File content
+        max_tokens (int, optional): Defaults to settings.CHUNK_MAX_TOKENS
+        overlap_tokens (int, optional): Defaults to settings.CHUNK_OVERLAP_TOKENS
+
+    Returns:
+        list: Chunks in file order:
+            {
+                'text': '<chunk text>',
+                'start_line': <first line, 1-based>,
+                'end_line': <last line, inclusive>
+            }
+    """
+    max_tokens = int(max_tokens or settings.CHUNK_MAX_TOKENS)
+    if overlap_tokens is None:
+        overlap_tokens = settings.CHUNK_OVERLAP_TOKENS
+    overlap_tokens = int(overlap_tokens)
+
+    lines = content.splitlines()
+    if not lines:
+        return []
+    # count newlines with each line so windows add up to the whole text
+    line_tokens = [count_tokens(line + '\n') for line in lines]
+
+    segmenter = CHUNKERS.get(os.path.splitext(path)[1].lower(), line_segments)
+    try:
+        segments = segmenter(lines, line_tokens, max_tokens)
+    except (SyntaxError, ValueError):
+        segments = line_segments(lines, line_tokens, max_tokens)
+
+    chunks = []
+    for start, end in pack_segments(segments, line_tokens, max_tokens, overlap_tokens):
+        text = '\n'.join(lines[start - 1:end]).strip()
+        if text:
+            chunks.append({'text': text, 'start_line': start, 'end_line': end})
+    return chunks
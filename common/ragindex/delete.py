@@ -1,10 +1,13 @@
 from django.conf import settings
 from common.utils import parse_repository_string
-from pinecone import Pinecone
+from common.ragindex.state import delete_index_state
+from common.ragindex.catalog import get_catalog
+from common.ragindex.store import vector_index
+from common.ragindex.lexical import delete_lexical_index
 
 def delete_repository(repository):
     """
-    Delete all vectors for a repository from the Pinecone database.
+    Delete all vectors for a repository from the vector index.
 
     Args:
         repository (str): Repository string in format 'owner/repo/branch' or 'owner/repo'
@@ -22,37 +25,39 @@ def delete_repository(repository):
             }
     """
     try:
-        pc_api_key = settings.PINECONE_API_KEY
-        if not pc_api_key:
-            return {'error': 'Pinecone API key not found'}
+        if settings.VECTOR_BACKEND != 'local':
+            pc_api_key = settings.PINECONE_API_KEY
+            if not pc_api_key:
+                return {'error': 'Pinecone API key not found'}
 
-        pc_index_name = settings.PINECONE_INDEX
-        if not pc_index_name:
-            return {'error': 'Pinecone index name not found'}
+            pc_index_name = settings.PINECONE_INDEX
+            if not pc_index_name:
+                return {'error': 'Pinecone index name not found'}
 
         try:
-            # Initialize Pinecone client
-            pc = Pinecone(pc_api_key)
+            # Get the Pinecone or local index
+            index = vector_index()
         except Exception as e:
-            return {'error': f'Failed to initialize Pinecone client: {str(e)}'}
-
-        try:
-            # Get Pinecone index
-            index = pc.Index(pc_index_name)
-        except Exception as e:
-            return {'error': f'Failed to get Pinecone index: {str(e)}'}
+            return {'error': f'Failed to get vector index: {str(e)}'}
 
         try:
             owner, repo, branch = parse_repository_string(repository)
             namespace = f'{owner}/{repo}/{branch}'
 
             # Check if namespace exists
-            stats = index.describe_index_stats()
-            if namespace not in stats.namespaces:
+            catalog = get_catalog()
+            if not catalog.contains(namespace):
                 return {'error': 'Repository namespace not found'}
 
             # Delete all vectors in the namespace
             index.delete(namespace=namespace, delete_all=True)
+            delete_index_state(namespace)
+            catalog.forget(namespace)
+            from common.llm.answer_cache import get_answer_cache
+            answer_cache = get_answer_cache()
+            if answer_cache:
+                answer_cache.invalidate(namespace)
+            delete_lexical_index(namespace)
 
             return {
                 'status': 'success',
@@ -0,0 +1,300 @@
+import heapq
+import json
+import math
+import os
+import numpy as np
+
+
+class HNSWGraph:
+    """
+    Hierarchical navigable small world graph over the rows of a vector matrix,
+    for approximate nearest-neighbour search by cosine similarity.
+
+    The graph stores only links; vectors stay in the caller's matrix of
+    unit-normalized rows (see LocalIndex) and are passed to insert and search.
+    Nodes are matrix row numbers. Deletes are soft: a deleted row stays in the
+    graph for navigation and is filtered from results by the live mask, and
+    a row that is overwritten keeps its level and its links until it is
+    re-linked in place, so searches can still pass through it (it may be
+    the entry point).
+
+    Layer 0 links are a memory-mapped int32 matrix (hnsw.i32, 2*M columns,
+    -1 for empty) with node levels in hnsw_levels.i8, so reloading a large
+    graph is a pair of mmaps. The sparse upper layers and parameters are kept
+    in hnsw.json.
+
+    Args:
+        path (str): Directory holding the graph files
+        M (int): Links per node on upper layers; layer 0 allows 2*M
+        ef_construction (int): Candidate list size while inserting
+        ef_search (int): Default candidate list size while searching
+        seed (int, optional): Seed for level assignment
+    """
+
+    def __init__(self, path, M=16, ef_construction=200, ef_search=64, seed=None):
+        self.path = path
+        self.M = int(M)
+        self.ef_construction = int(ef_construction)
+        self.ef_search = int(ef_search)
+        self.entry = -1
+        self.max_level = -1
+        self.upper = {}
+        self.links = None
+        self.levels = None
+        self._mmaps = ()
+        self.rng = np.random.default_rng(seed)
+        self._load()
+
+    # persistence
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        meta_path = self._file('hnsw.json')
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self.M = meta['M']
+        self.ef_construction = meta['ef_construction']
+        self.entry = meta['entry']
+        self.max_level = meta['max_level']
+        self.upper = {int(level): {int(node): links for node, links in nodes.items()}
+                      for level, nodes in meta['upper'].items()}
+        self._map()
+
+    def _map(self):
+        capacity = os.path.getsize(self._file('hnsw_levels.i8'))
+        if not capacity:
+            return
+        self._mmaps = (
+            np.memmap(self._file('hnsw.i32'), dtype=np.int32, mode='r+',
+                      shape=(capacity, 2 * self.M)),
+            np.memmap(self._file('hnsw_levels.i8'), dtype=np.int8, mode='r+',
+                      shape=(capacity,))
+        )
+        # plain ndarray views skip np.memmap's per-slice overhead
+        self.links, self.levels = (np.asarray(m) for m in self._mmaps)
+
+    def _reserve(self, rows):
+        capacity = 0 if self.levels is None else len(self.levels)
+        if rows <= capacity:
+            return
+        capacity = max(rows, capacity * 2, 1024)
+        for m in self._mmaps:
+            m.flush()
+        # the old maps stay in place until _map swaps in the grown ones
+        # new rows are filled with -1: no links, not in the graph
+        for name, width in (('hnsw.i32', 8 * self.M), ('hnsw_levels.i8', 1)):
+            path = self._file(name)
+            old = os.path.getsize(path) if os.path.exists(path) else 0
+            with open(path, 'ab') as f:
+                remaining = capacity * width - old
+                while remaining:
+                    size = min(remaining, 1 << 24)
+                    f.write(b'\xff' * size)
+                    remaining -= size
+        self._map()
+
+    def save(self):
+        """
+        Flush layer 0 and write the upper layers and parameters.
+        """
+        for m in self._mmaps:
+            m.flush()
+        meta = {
+            'M': self.M,
+            'ef_construction': self.ef_construction,
+            'entry': self.entry,
+            'max_level': self.max_level,
+            'upper': {str(level): {str(node): links for node, links in nodes.items()}
+                      for level, nodes in self.upper.items()}
+        }
+        tmp_path = self._file('hnsw.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._file('hnsw.json'))
+
+    def __len__(self):
+        return 0 if self.levels is None else int(np.count_nonzero(np.asarray(self.levels) >= 0))
+
+    def count_deleted(self, live):
+        """
+        Return the number of nodes whose rows are no longer live.
+
+        Args:
+            live (np.ndarray): Mask of live rows
+        """
+        if self.levels is None:
+            return 0
+        rows = min(len(self.levels), len(live))
+        return int(np.count_nonzero((self.levels[:rows] >= 0) & (np.asarray(live[:rows]) == 0)))
+
+    # graph
+
+    def _neighbors(self, node, level):
+        if level == 0:
+            row = self.links[node]
+            return row[row >= 0].tolist()
+        return self.upper.get(level, {}).get(node, [])
+
+    def _set_neighbors(self, node, level, neighbors):
+        if level == 0:
+            row = np.full(2 * self.M, -1, dtype=np.int32)
+            row[:len(neighbors)] = neighbors
+            self.links[node] = row
+        else:
+            self.upper.setdefault(level, {})[node] = list(neighbors)
+
+    def _search_layer(self, vectors, query, entries, ef, level):
+        """
+        Greedy best-first search of one layer.
+
+        Returns:
+            list: (distance, node) pairs for the ef closest nodes found, nearest first
+        """
+        entries = list(entries)
+        distances = 1.0 - vectors[entries] @ query
+        visited = set(entries)
+        candidates = [(float(d), n) for d, n in zip(distances, entries)]
+        heapq.heapify(candidates)
+        results = [(-d, n) for d, n in candidates]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            distance, node = heapq.heappop(candidates)
+            if len(results) >= ef and distance > -results[0][0]:
+                break
+            fresh = [n for n in self._neighbors(node, level) if n not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+            for d, n in zip((1.0 - vectors[fresh] @ query).tolist(), fresh):
+                if len(results) < ef or d < -results[0][0]:
+                    heapq.heappush(candidates, (d, n))
+                    heapq.heappush(results, (-d, n))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted((-d, n) for d, n in results)
+
+    def _select(self, vectors, candidates, limit):
+        """
+        Pick up to limit neighbors from (distance, node) candidates, nearest
+        first, skipping any closer to an already selected neighbor than to
+        the base node so that links spread in different directions.
+        """
+        if len(candidates) <= 1:
+            return [n for _, n in candidates]
+        nodes = [n for _, n in candidates]
+        base = 1.0 - np.array([d for d, _ in candidates], dtype=np.float32)
+        candidate_vectors = vectors[nodes]
+        selected = []
+        blocked = np.zeros(len(nodes), dtype=bool)
+        i = 0
+        while True:
+            selected.append(i)
+            if len(selected) >= limit:
+                break
+            # block candidates more similar to this neighbor than to the base
+            blocked |= candidate_vectors @ candidate_vectors[i] > base
+            rest = np.flatnonzero(~blocked[i + 1:])
+            if not len(rest):
+                break
+            i += 1 + int(rest[0])
+        if len(selected) < limit:
+            # fill with the nearest skipped candidates
+            chosen = set(selected)
+            selected.extend([i for i in range(len(nodes)) if i not in chosen][:limit - len(selected)])
+        return [nodes[i] for i in selected]
+
+    def _link(self, vectors, node, level, neighbors):
+        limit = 2 * self.M if level == 0 else self.M
+        self._set_neighbors(node, level, neighbors)
+        for neighbor in neighbors:
+            links = self._neighbors(neighbor, level)
+            if node in links:
+                continue
+            links = links + [node]
+            if len(links) > limit:
+                distances = 1.0 - vectors[links] @ vectors[neighbor]
+                links = self._select(vectors, sorted(zip(distances.tolist(), links)), limit)
+            self._set_neighbors(neighbor, level, links)
+
+    def _random_level(self):
+        return min(int(-math.log(1.0 - self.rng.random()) / math.log(self.M)), 127)
+
+    def insert(self, vectors, nodes):
+        """
+        Add rows to the graph, or re-link rows whose vectors were overwritten.
+
+        Args:
+            vectors (np.ndarray): Matrix of unit-normalized rows
+            nodes (iterable): Row numbers to insert
+        """
+        nodes = [int(node) for node in nodes]
+        if not nodes:
+            return
+        vectors = np.asarray(vectors)
+        self._reserve(max(nodes) + 1)
+        for node in nodes:
+            query = np.asarray(vectors[node], dtype=np.float32)
+            level = int(self.levels[node])
+            if level < 0:
+                level = self._random_level()
+                self.levels[node] = level
+
+            if self.entry < 0:
+                self.entry, self.max_level = node, level
+                self._set_neighbors(node, 0, [])
+                continue
+
+            entries = [self.entry]
+            for current in range(self.max_level, level, -1):
+                entries = [self._search_layer(vectors, query, entries, 1, current)[0][1]]
+            for current in range(min(level, self.max_level), -1, -1):
+                found = [(d, n) for d, n in self._search_layer(
+                    vectors, query, entries, self.ef_construction, current) if n != node]
+                limit = 2 * self.M if current == 0 else self.M
+                self._link(vectors, node, current, self._select(vectors, found, limit))
+                entries = [n for _, n in found] or entries
+            if level > self.max_level:
+                for current in range(self.max_level + 1, level + 1):
+                    self._set_neighbors(node, current, [])
+                self.entry, self.max_level = node, level
+
+    def search(self, vectors, query, k, live=None, ef=None):
+        """
+        Approximate k nearest rows to query. When rows outside live leave
+        fewer than k results, the search is repeated with a larger candidate
+        list.
+
+        Args:
+            vectors (np.ndarray): Matrix of unit-normalized rows
+            query (np.ndarray): Unit-normalized query vector
+            k (int): Number of results
+            live (np.ndarray, optional): Mask of rows that may be returned
+            ef (int, optional): Candidate list size, defaults to ef_search
+
+        Returns:
+            tuple: (rows, similarities) arrays, most similar first
+        """
+        if self.entry < 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        ef = max(int(ef or self.ef_search), k)
+        vectors = np.asarray(vectors)
+        entries = [self.entry]
+        for level in range(self.max_level, 0, -1):
+            entries = [self._search_layer(vectors, query, entries, 1, level)[0][1]]
+        while True:
+            found = self._search_layer(vectors, query, entries, ef, 0)
+            if live is not None:
+                found = [(d, n) for d, n in found if live[n]]
+            if len(found) >= k or ef >= len(self.levels):
+                break
+            ef *= 2
+        found = found[:k]
+        return (np.array([n for _, n in found], dtype=np.int64),
+                np.array([1.0 - d for d, _ in found], dtype=np.float32))
@@ -0,0 +1,90 @@
+from typing import Any, Optional
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from common.ragindex.lexical import get_current_lexical_index
+from common.ragindex.store import vector_retriever
+
+# reciprocal rank fusion constant; damps the weight of top ranks
+RRF_K = 60
+
+
+def lexical_document(score, doc):
+    return Document(
+        page_content=doc['text'],
+        metadata={
+            'path': doc['path'],
+            'chunk': doc['chunk'],
+            'start_line': doc['start_line'],
+            'end_line': doc['end_line'],
+            'file_name': doc['path'].rsplit('/', 1)[-1],
+            'score': score
+        }
+    )
+
+
+def fuse(rankings, k):
+    """
+    Merge ranked document lists with reciprocal rank fusion. Documents are
+    matched across lists by path and chunk number.
+    """
+    scores, documents = {}, {}
+    for ranking in rankings:
+        for rank, document in enumerate(ranking):
+            key = (document.metadata.get('path'), document.metadata.get('chunk'))
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+            documents.setdefault(key, document)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[key] for key in best]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever combining BM25 over the clone with vector search.
+
+    Queries naming identifiers that all appear in the lexical index are
+    answered from it alone, with no embedding request. Other queries fetch
+    candidates from both and merge them with reciprocal rank fusion.
+    """
+    lexical: Any
+    dense: Optional[BaseRetriever] = None
+    k: int = 3
+    candidates: int = 10
+
+    def _lexical(self, query):
+        return [lexical_document(score, doc)
+                for score, doc in self.lexical.search(query, self.candidates)]
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        lexical = self._lexical(query)
+        if self.dense is None or (lexical and self.lexical.covers(query)):
+            return lexical[:self.k]
+        return fuse([lexical, self.dense.invoke(query)], self.k)
+
+    async def _aget_relevant_documents(self, query, *, run_manager=None):
+        lexical = self._lexical(query)
+        if self.dense is None or (lexical and self.lexical.covers(query)):
+            return lexical[:self.k]
+        return fuse([lexical, await self.dense.ainvoke(query)], self.k)
+
+
+def repository_retriever(namespace, embeddings, k=3):
+    """
+    Return the retriever for a repository namespace: hybrid when a lexical
+    index has been built for it at the indexed commit, vector search
+    otherwise.
+
+    Args:
+        namespace (str): Repository namespace 'owner/repo/branch'
+        embeddings (Embeddings): Used to embed queries for vector search
+        k (int): Number of documents to retrieve
+    """
+    lexical = get_current_lexical_index(namespace)
+    if lexical is None:
+        return vector_retriever(namespace, embeddings, k=k)
+    candidates = max(k, 10)
+    return HybridRetriever(
+        lexical=lexical,
+        dense=vector_retriever(namespace, embeddings, k=candidates),
+        k=k,
+        candidates=candidates
+    )
@@ -0,0 +1,323 @@
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from urllib.parse import quote
+import numpy as np
+from django.conf import settings
+from common.utils import parse_repository_string, is_vectorizable_file, prepare_file_contents
+from common.clone.tree import list_clone_tree, clone_file_reader, open_clone, clone_branch_commit
+from common.ragindex.chunking import chunk_file
+from common.ragindex.state import get_index_state
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+WORD = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+')
+WORD_PART = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+CAMEL_CASE = re.compile(r'[a-z0-9][A-Z]')
+BACKTICKED = re.compile(r'`([^`]+)`')
+
+
+def tokenize(text):
+    """
+    Split text into lowercase search terms.
+
+    Identifiers are kept whole and also split into their snake_case and
+    camelCase parts, so 'parse_repository_string' matches a search for the
+    full name as well as for 'repository'.
+
+    Returns:
+        list: Terms in text order, with repeats
+    """
+    terms = []
+    for word in WORD.findall(text):
+        if len(word) > 1:
+            terms.append(word.lower())
+        parts = [part.lower() for piece in word.split('_') for part in WORD_PART.findall(piece)]
+        if len(parts) > 1:
+            terms.extend(part for part in parts if len(part) > 1)
+    return terms
+
+
+def query_identifiers(query):
+    """
+    Identifiers named in a query: words in backticks, snake_case and
+    camelCase words.
+
+    Returns:
+        list: Lowercase identifiers
+    """
+    identifiers = []
+    for quoted in BACKTICKED.findall(query):
+        identifiers.extend(word.lower() for word in WORD.findall(quoted) if len(word) > 1)
+    for word in WORD.findall(BACKTICKED.sub(' ', query)):
+        if '_' in word.strip('_') or CAMEL_CASE.search(word):
+            identifiers.append(word.lower())
+    return list(dict.fromkeys(identifiers))
+
+
+def lexical_index_path(namespace):
+    return os.path.join(settings.LEXICAL_INDEX_DIR, quote(namespace, safe=''))
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the chunks of one repository namespace.
+
+    Postings are stored term-major in flat arrays (.npy, memory-mapped on
+    load): offsets[t]:offsets[t + 1] slices postings_doc and postings_tf for
+    the t-th term in the sorted vocabulary. Chunk metadata and text are in
+    meta.json, whose modification time is kept as built_at.
+    """
+
+    def __init__(self, path):
+        meta_path = os.path.join(path, 'meta.json')
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self.built_at = os.path.getmtime(meta_path)
+        self.namespace = meta['namespace']
+        self.commit = meta['commit']
+        self.docs = meta['docs']
+        self.terms = {term: number for number, term in enumerate(meta['terms'])}
+        self.avgdl = meta['avgdl']
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r')
+        self.postings_doc = np.load(os.path.join(path, 'postings_doc.npy'), mmap_mode='r')
+        self.postings_tf = np.load(os.path.join(path, 'postings_tf.npy'), mmap_mode='r')
+        self.lengths = np.load(os.path.join(path, 'lengths.npy'))
+
+    def __contains__(self, term):
+        return term in self.terms
+
+    def covers(self, query):
+        """
+        True if the query names identifiers and all of them are indexed, in
+        which case lexical results alone answer it.
+        """
+        identifiers = query_identifiers(query)
+        return bool(identifiers) and all(identifier in self for identifier in identifiers)
+
+    def search(self, query, k=10):
+        """
+        Rank chunks against the query with BM25.
+
+        Returns:
+            list: (score, doc) pairs, best first, where doc is a chunk entry
+                  with id, path, chunk, start_line, end_line and text
+        """
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+        for term in set(tokenize(query)):
+            number = self.terms.get(term)
+            if number is None:
+                continue
+            start, end = self.offsets[number], self.offsets[number + 1]
+            docs = self.postings_doc[start:end]
+            tf = self.postings_tf[start:end].astype(np.float32)
+            idf = math.log(1 + (len(self.docs) - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[docs] / self.avgdl)
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        k = min(k, len(matched))
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self.docs[i]) for i in top]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(namespace):
+    """
+    Return the namespace's LexicalIndex, or None if it has not been built.
+    Loaded indexes are reused until the index is rebuilt.
+    """
+    meta_path = os.path.join(lexical_index_path(namespace), 'meta.json')
+    try:
+        mtime = os.path.getmtime(meta_path)
+    except OSError:
+        return None
+    with _indexes_lock:
+        cached = _indexes.get(namespace)
+        if not cached or cached[1] != mtime:
+            cached = _indexes[namespace] = (LexicalIndex(lexical_index_path(namespace)), mtime)
+        return cached[0]
+
+
+def get_current_lexical_index(namespace):
+    """
+    Return the namespace's LexicalIndex if it was built at the commit its
+    vectors were last indexed at, or if it has no vectors, else None. An
+    index left behind by the vector index would give stale results.
+    """
+    index = get_lexical_index(namespace)
+    if index is None:
+        return None
+    state = get_index_state(namespace)
+    if state and state['commit'] and state['commit'] != index.commit:
+        return None
+    return index
+
+
+def build_lexical_index(repository):
+    """
+    Build the BM25 index for a repository from its local clone.
+
+    Files are read from the clone's object database at the branch head and
+    split into the same chunks as vectorize, so lexical and vector results
+    refer to the same chunks.
+
+    Args:
+        repository (str): Repository string in format 'owner/repo/branch'
+                        (branch is optional, defaults to 'main')
+
+    Returns:
+        dict: A dictionary containing:
+            - On success:
+                {
+                    'status': 'success',
+                    'repository': 'owner/repo/branch',
+                    'commit': <indexed_commit_sha>,
+                    'documents': <number_of_chunks>,
+                    'terms': <vocabulary_size>,
+                    'bytes': <index_size_on_disk>,
+                    'seconds': <build_time>
+                }
+            - On error:
+                {
+                    'error': <error_message>
+                }
+    """
+    started = time.perf_counter()
+    try:
+        owner, repo, branch = parse_repository_string(repository)
+        namespace = f'{owner}/{repo}/{branch}'
+        git_repo, _ = open_clone(repository)
+        commit = str(clone_branch_commit(git_repo, branch).id)
+        read = clone_file_reader(repository, git_repo)
+
+        docs, doc_terms = [], []
+        for file_info in list_clone_tree(repository, commit, git_repo):
+            if not is_vectorizable_file(file_info):
+                continue
+            prepared = prepare_file_contents(file_info, read(file_info))
+            if not prepared:
+                continue
+            for number, chunk in enumerate(chunk_file(prepared['path'], prepared['content'])):
+                docs.append({
+                    'id': f'{namespace}/{prepared["path"]}#{number}',
+                    'path': prepared['path'],
+                    'chunk': number,
+                    'start_line': chunk['start_line'],
+                    'end_line': chunk['end_line'],
+                    'text': chunk['text']
+                })
+                doc_terms.append(Counter(tokenize(chunk['text'])))
+        if not docs:
+            return {'error': f'No valid files to index in repository: {namespace}'}
+
+        postings = {}
+        for number, counts in enumerate(doc_terms):
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((number, tf))
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+        postings_doc = np.fromiter((d for term in terms for d, _ in postings[term]),
+                                   dtype=np.int32, count=offsets[-1])
+        postings_tf = np.fromiter((min(tf, 65535) for term in terms for _, tf in postings[term]),
+                                  dtype=np.uint16, count=offsets[-1])
+        lengths = np.array([sum(counts.values()) for counts in doc_terms], dtype=np.int32)
+
+        # write to a fresh directory and point the index path's symlink at
+        # it, so readers never see a partial or missing index
+        path = lexical_index_path(namespace)
+        os.makedirs(settings.LEXICAL_INDEX_DIR, exist_ok=True)
+        tmp_path = tempfile.mkdtemp(prefix=f'{os.path.basename(path)}.', dir=settings.LEXICAL_INDEX_DIR)
+        os.chmod(tmp_path, 0o755)
+        np.save(os.path.join(tmp_path, 'offsets.npy'), offsets)
+        np.save(os.path.join(tmp_path, 'postings_doc.npy'), postings_doc)
+        np.save(os.path.join(tmp_path, 'postings_tf.npy'), postings_tf)
+        np.save(os.path.join(tmp_path, 'lengths.npy'), lengths)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump({
+                'namespace': namespace,
+                'commit': commit,
+                'avgdl': float(lengths.mean()) or 1.0,
+                'terms': terms,
+                'docs': docs
+            }, f)
+        _swap_in(path, tmp_path)
+
+        return {
+            'status': 'success',
+            'repository': namespace,
+            'commit': commit,
+            'documents': len(docs),
+            'terms': len(terms),
+            'bytes': sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)),
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+
+    except Exception as e:
+        return {'error': str(e)}
+
+
+def _swap_in(path, new_path):
+    """
+    Atomically point the symlink at path to new_path, then delete the
+    directory it pointed to before.
+    """
+    old_path = os.path.realpath(path) if os.path.islink(path) else None
+    link_path = f'{new_path}.link'
+    os.symlink(os.path.basename(new_path), link_path)
+    if os.path.isdir(path) and not os.path.islink(path):
+        # index written as a plain directory by an earlier version
+        shutil.rmtree(path, ignore_errors=True)
+    os.replace(link_path, path)
+    if old_path and old_path != os.path.realpath(path):
+        shutil.rmtree(old_path, ignore_errors=True)
+
+
+def refresh_lexical_index(repository, commit):
+    """
+    Keep a repository's lexical index in step with its vectors after they
+    were indexed at commit. An existing index is rebuilt when the clone's
+    branch head is that commit, and deleted otherwise; repositories without
+    a lexical index are left without one.
+
+    Returns:
+        str or None: 'rebuilt', 'deleted', or None if there was no index
+    """
+    owner, repo, branch = parse_repository_string(repository)
+    namespace = f'{owner}/{repo}/{branch}'
+    if not os.path.lexists(lexical_index_path(namespace)):
+        return None
+    try:
+        git_repo, _ = open_clone(repository)
+        current = str(clone_branch_commit(git_repo, branch).id) == commit
+    except ValueError:
+        current = False
+    if current and 'error' not in build_lexical_index(repository):
+        return 'rebuilt'
+    delete_lexical_index(namespace)
+    return 'deleted'
+
+
+def delete_lexical_index(namespace):
+    path = lexical_index_path(namespace)
+    if os.path.islink(path):
+        target = os.path.realpath(path)
+        os.remove(path)
+        shutil.rmtree(target, ignore_errors=True)
+    else:
+        shutil.rmtree(path, ignore_errors=True)
@@ -1,22 +1,33 @@
-from django.conf import settings
-from pinecone import Pinecone
+from common.ragindex.catalog import get_catalog
 
-pc = Pinecone(api_key=settings.PINECONE_API_KEY)
-index = pc.Index(settings.PINECONE_INDEX)
-
-def list_repositories():
+def list_repositories(details=False):
     """
-    List all repositories (namespaces) stored in the Pinecone database.
+    List all repositories (namespaces) stored in the vector index.
+
+    Namespaces come from the cached catalog (see common.ragindex.catalog), so
+    this does not query index stats on every call.
+
+    Args:
+        details (bool): Return vector counts and last indexing for each
+                        repository instead of names only
 
     Returns:
-        list: A sorted list of repository namespaces in the format owner/repo/branch
+        list: A sorted list of repository namespaces in the format owner/repo/branch,
+              or with details, a sorted list of:
+                {
+                    'namespace': 'owner/repo/branch',
+                    'vectors': <vector_count>,
+                    'commit': <indexed_commit_sha>,
+                    'source': 'github' or 'clone',
+                    'indexed_at': <unix timestamp>
+                }
 
     Raises:
         Exception: If there's an error accessing the database
     """
-    # Get list of namespaces from Pinecone
-    stats = index.describe_index_stats()
-    namespaces = list(stats.namespaces.keys())
+    catalog = get_catalog()
+    if details:
+        return catalog.describe()
 
     # Sort namespaces for consistent output
-    return sorted(namespaces)
+    return sorted(catalog.namespaces())
@@ -0,0 +1,463 @@
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+from urllib.parse import quote, unquote
+import numpy as np
+from common.ragindex.hnsw import HNSWGraph
+
+# rows scored per matrix multiply, bounding query memory for large namespaces
+QUERY_BLOCK_ROWS = 65536
+# greatest code point, used as an upper bound for id prefix scans
+PREFIX_END = chr(0x10FFFF)
+# share of graph nodes whose rows were deleted at which the graph is rebuilt
+HNSW_COMPACT_RATIO = 0.2
+# most changed rows inserted into a graph while holding the namespace lock;
+# larger upserts are inserted into a copy of the graph in the background
+HNSW_INLINE_INSERT_ROWS = 32
+# prefix of the directory in a namespace where a graph is built before it is swapped in
+HNSW_BUILD_PREFIX = 'hnsw.build.'
+HNSW_FILES = ('hnsw.i32', 'hnsw_levels.i8', 'hnsw.json')
+
+
+class NamespaceLock:
+    """
+    Lock held by any number of readers or by a single writer. Waiting
+    writers hold off new readers so that a stream of queries cannot starve
+    an upsert.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writer or self._writers_waiting:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    self._condition.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+class LocalIndex:
+    """
+    Embedded vector store with the subset of the Pinecone Index interface used
+    by this application (upsert, delete, list, describe_index_stats, query).
+
+    Each namespace is a directory holding a memory-mapped float32 matrix of
+    unit-normalized vectors (vectors.f32), a live-row mask (live.u8) and a
+    SQLite sidecar mapping rows to vector ids and metadata (meta.sqlite3).
+    Queries are exact cosine top-k computed with vectorized NumPy. Reads and
+    writes of a namespace are serialized by a NamespaceLock, so queries and
+    listings never see a half-written namespace.
+
+    Once a namespace holds hnsw_threshold vectors an HNSW graph is built over
+    it (see common.ragindex.hnsw) and kept in sync by later upserts, and
+    queries use approximate search on the graph instead. The graph is built
+    in a background thread without holding the namespace lock, and swapped in
+    once it is complete; queries stay exact until then. Upserts that change
+    more than HNSW_INLINE_INSERT_ROWS vectors are likewise inserted into a
+    copy of the graph in the background, so their rows are only found by
+    approximate search once the copy is swapped in. Rows upserted with the
+    vector they already had are not re-linked. When deletes leave more than
+    HNSW_COMPACT_RATIO of the graph's nodes dead, it is rebuilt over the live
+    rows.
+
+    Args:
+        root (str): Directory holding one subdirectory per namespace
+        dimension (int): Vector dimension
+        hnsw_threshold (int, optional): Vector count at which a namespace
+                                        gets a graph; 0 disables graphs
+        hnsw_params (dict, optional): M, ef_construction and ef_search for
+                                      new graphs
+    """
+
+    def __init__(self, root, dimension, hnsw_threshold=0, hnsw_params=None):
+        self.root = str(root)
+        self.dimension = int(dimension)
+        self.hnsw_threshold = int(hnsw_threshold or 0)
+        self.hnsw_params = hnsw_params or {}
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+        self._graphs = {}
+        # namespace -> slots upserted while its graph is being built
+        self._builds = {}
+        os.makedirs(self.root, exist_ok=True)
+
+    # storage layout
+
+    def _dir(self, namespace):
+        return os.path.join(self.root, quote(namespace or '', safe=''))
+
+    def _lock(self, namespace):
+        with self._locks_lock:
+            return self._locks.setdefault(namespace, NamespaceLock())
+
+    def _connect(self, namespace, create=False):
+        path = self._dir(namespace)
+        if not os.path.isdir(path):
+            if not create:
+                return None
+            os.makedirs(path, exist_ok=True)
+        conn = sqlite3.connect(os.path.join(path, 'meta.sqlite3'))
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS vectors ('
+            ' slot INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, metadata TEXT)'
+        )
+        conn.execute('CREATE TABLE IF NOT EXISTS free (slot INTEGER PRIMARY KEY)')
+        return conn
+
+    def _capacity(self, namespace):
+        path = os.path.join(self._dir(namespace), 'vectors.f32')
+        if not os.path.exists(path):
+            return 0
+        return os.path.getsize(path) // (4 * self.dimension)
+
+    def _grow(self, namespace, rows):
+        capacity = self._capacity(namespace)
+        if rows <= capacity:
+            return
+        capacity = max(rows, capacity * 2, 1024)
+        directory = self._dir(namespace)
+        for name, width in (('vectors.f32', 4 * self.dimension), ('live.u8', 1)):
+            with open(os.path.join(directory, name), 'ab') as f:
+                f.truncate(capacity * width)
+
+    def _matrix(self, namespace, mode='r'):
+        capacity = self._capacity(namespace)
+        if not capacity:
+            return None, None
+        directory = self._dir(namespace)
+        matrix = np.memmap(os.path.join(directory, 'vectors.f32'), dtype=np.float32,
+                           mode=mode, shape=(capacity, self.dimension))
+        live = np.memmap(os.path.join(directory, 'live.u8'), dtype=np.uint8,
+                         mode=mode, shape=(capacity,))
+        return matrix, live
+
+    def _graph(self, namespace):
+        """
+        Return the namespace's HNSW graph, or None if it has none. The graph is
+        reloaded when another process has saved it since it was loaded.
+        """
+        meta_path = os.path.join(self._dir(namespace), 'hnsw.json')
+        try:
+            mtime = os.path.getmtime(meta_path)
+        except OSError:
+            self._graphs.pop(namespace, None)
+            return None
+        cached = self._graphs.get(namespace)
+        if cached and cached[1] == mtime:
+            return cached[0]
+        graph = HNSWGraph(self._dir(namespace), **self.hnsw_params)
+        self._graphs[namespace] = (graph, mtime)
+        return graph
+
+    def _sync_graph(self, namespace, conn, slots, matrix):
+        # called with the namespace write lock held; slots are the rows whose
+        # vectors changed
+        if not slots:
+            return
+        pending = self._builds.get(namespace)
+        if pending is not None:
+            # the running build inserts them before it is swapped in
+            pending.update(slots)
+            return
+        graph = self._graph(namespace)
+        if graph is not None:
+            if len(slots) > HNSW_INLINE_INSERT_ROWS:
+                self._start_build(namespace, slots)
+                return
+            graph.insert(matrix, slots)
+            graph.save()
+            self._graphs[namespace] = (graph, os.path.getmtime(os.path.join(self._dir(namespace), 'hnsw.json')))
+        elif self.hnsw_threshold:
+            count = conn.execute('SELECT COUNT(*) FROM vectors').fetchone()[0]
+            if count >= self.hnsw_threshold:
+                self._start_build(namespace)
+
+    def _start_build(self, namespace, slots=None):
+        # called with the namespace write lock held
+        pending = set()
+        self._builds[namespace] = pending
+        threading.Thread(target=self._build_graph, args=(namespace, pending, slots),
+                         name=f'hnsw-build-{namespace}').start()
+
+    def _build_graph(self, namespace, pending, slots=None):
+        """
+        Insert rows into a graph in a staging directory and swap it in: a new
+        graph over every live row, or with slots, a copy of the current graph
+        gaining those rows. Rows upserted meanwhile are collected in pending
+        and inserted as well, under the write lock once few are left. The
+        build is dropped if the namespace is deleted or another build
+        replaces it.
+        """
+        lock = self._lock(namespace)
+        staging = None
+        try:
+            with lock.read():
+                matrix, live = self._matrix(namespace)
+                if matrix is None:
+                    return
+                staging = tempfile.mkdtemp(prefix=HNSW_BUILD_PREFIX, dir=self._dir(namespace))
+                if slots is None:
+                    slots = np.flatnonzero(live)
+                else:
+                    for name in HNSW_FILES:
+                        shutil.copyfile(os.path.join(self._dir(namespace), name),
+                                        os.path.join(staging, name))
+            graph = HNSWGraph(staging, **self.hnsw_params)
+
+            while True:
+                # rows overwritten meanwhile are in pending and re-linked next
+                graph.insert(matrix, slots)
+                with lock.write():
+                    if self._builds.get(namespace) is not pending:
+                        return
+                    matrix, live = self._matrix(namespace)
+                    slots = [slot for slot in sorted(pending) if live[slot]]
+                    pending.clear()
+                    if len(slots) > HNSW_INLINE_INSERT_ROWS:
+                        continue
+                    graph.insert(matrix, slots)
+                    graph.save()
+                    # hnsw.json last: it marks the graph as present
+                    for name in HNSW_FILES:
+                        os.replace(os.path.join(staging, name), os.path.join(self._dir(namespace), name))
+                    self._graphs.pop(namespace, None)
+                    return
+        except Exception as e:
+            print(f'Error building HNSW graph for namespace {namespace}: {str(e)}', file=sys.stderr)
+        finally:
+            with lock.write():
+                if self._builds.get(namespace) is pending:
+                    del self._builds[namespace]
+            if staging:
+                shutil.rmtree(staging, ignore_errors=True)
+
+    @staticmethod
+    def _normalize(values):
+        vector = np.asarray(values, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    # Pinecone Index interface
+
+    def upsert(self, vectors, namespace='', **kwargs):
+        if not vectors:
+            return {'upserted_count': 0}
+        with self._lock(namespace).write():
+            conn = self._connect(namespace, create=True)
+            try:
+                slots = []
+                next_slot = conn.execute('SELECT COALESCE(MAX(slot) + 1, 0) FROM vectors').fetchone()[0]
+                next_slot = max(next_slot, conn.execute(
+                    'SELECT COALESCE(MAX(slot) + 1, 0) FROM free').fetchone()[0])
+                free = [row[0] for row in conn.execute('SELECT slot FROM free ORDER BY slot')]
+                for vector in vectors:
+                    if len(vector['values']) != self.dimension:
+                        raise ValueError(f'Vector dimension {len(vector["values"])} does not match '
+                                         f'index dimension {self.dimension}')
+                    row = conn.execute('SELECT slot FROM vectors WHERE id = ?', (vector['id'],)).fetchone()
+                    if row:
+                        slot = row[0]
+                    elif free:
+                        slot = free.pop(0)
+                        conn.execute('DELETE FROM free WHERE slot = ?', (slot,))
+                    else:
+                        slot = next_slot
+                        next_slot += 1
+                    conn.execute(
+                        'INSERT OR REPLACE INTO vectors (slot, id, metadata) VALUES (?, ?, ?)',
+                        (slot, vector['id'], json.dumps(vector.get('metadata') or {}))
+                    )
+                    slots.append(slot)
+
+                self._grow(namespace, max(slots) + 1)
+                matrix, live = self._matrix(namespace, 'r+')
+                changed = {}
+                for slot, vector in zip(slots, vectors):
+                    values = self._normalize(vector['values'])
+                    # an unchanged row keeps its graph links
+                    if not live[slot] or not np.array_equal(matrix[slot], values):
+                        changed[slot] = True
+                    matrix[slot] = values
+                    live[slot] = 1
+                matrix.flush()
+                live.flush()
+                conn.commit()
+                self._sync_graph(namespace, conn, list(changed), matrix)
+            finally:
+                conn.close()
+        return {'upserted_count': len(vectors)}
+
+    def delete(self, ids=None, delete_all=None, namespace='', **kwargs):
+        with self._lock(namespace).write():
+            if delete_all:
+                shutil.rmtree(self._dir(namespace), ignore_errors=True)
+                self._graphs.pop(namespace, None)
+                self._builds.pop(namespace, None)
+                return {}
+            conn = self._connect(namespace)
+            if conn is None:
+                return {}
+            try:
+                slots = []
+                for vector_id in ids or []:
+                    row = conn.execute('SELECT slot FROM vectors WHERE id = ?', (vector_id,)).fetchone()
+                    if row:
+                        slots.append(row[0])
+                        conn.execute('DELETE FROM vectors WHERE slot = ?', (row[0],))
+                        conn.execute('INSERT OR IGNORE INTO free (slot) VALUES (?)', (row[0],))
+                matrix, live = self._matrix(namespace, 'r+')
+                if matrix is None:
+                    # ids recorded before any vectors were written
+                    slots = []
+                for slot in slots:
+                    matrix[slot] = 0
+                    live[slot] = 0
+                if slots:
+                    matrix.flush()
+                    live.flush()
+                conn.commit()
+                graph = self._graph(namespace) if slots else None
+                if (graph is not None and namespace not in self._builds
+                        and graph.count_deleted(live) > HNSW_COMPACT_RATIO * len(graph)):
+                    self._start_build(namespace)
+            finally:
+                conn.close()
+        return {}
+
+    def list(self, prefix='', namespace='', limit=100, **kwargs):
+        """
+        Yield pages of vector ids starting with prefix, like Index.list.
+        Each page is read under the namespace lock, which is released before
+        it is yielded so that callers may delete the listed ids.
+        """
+        lock = self._lock(namespace)
+        with lock.read():
+            conn = self._connect(namespace)
+        if conn is None:
+            return
+        try:
+            after = None
+            while True:
+                with lock.read():
+                    rows = conn.execute(
+                        'SELECT id FROM vectors WHERE id >= ? AND id < ? AND (? IS NULL OR id > ?)'
+                        ' ORDER BY id LIMIT ?',
+                        (prefix, prefix + PREFIX_END, after, after, limit)
+                    ).fetchall()
+                if not rows:
+                    return
+                page = [row[0] for row in rows]
+                yield page
+                after = page[-1]
+        finally:
+            conn.close()
+
+    def describe_index_stats(self, **kwargs):
+        namespaces = {}
+        for name in sorted(os.listdir(self.root)):
+            namespace = unquote(name)
+            conn = self._connect(namespace)
+            if conn is None:
+                continue
+            try:
+                count = conn.execute('SELECT COUNT(*) FROM vectors').fetchone()[0]
+            finally:
+                conn.close()
+            if count:
+                namespaces[namespace] = SimpleNamespace(vector_count=count)
+        return SimpleNamespace(
+            namespaces=namespaces,
+            dimension=self.dimension,
+            total_vector_count=sum(ns.vector_count for ns in namespaces.values())
+        )
+
+    def query(self, vector=None, top_k=10, namespace='', include_metadata=True,
+              exact=False, ef=None, **kwargs):
+        """
+        Cosine top-k over the namespace: approximate on the HNSW graph when
+        the namespace has one, otherwise exact.
+
+        Args:
+            exact (bool): Scan every vector even if the namespace has a graph
+            ef (int, optional): Graph search candidate list size
+
+        Returns:
+            SimpleNamespace: with 'matches', each having id, score and metadata
+        """
+        with self._lock(namespace).read():
+            return self._query(vector, int(top_k), namespace, include_metadata, exact, ef)
+
+    def _query(self, vector, top_k, namespace, include_metadata, exact, ef):
+        matrix, live = self._matrix(namespace)
+        if matrix is None:
+            return SimpleNamespace(matches=[])
+        query = self._normalize(vector)
+
+        graph = None if exact else self._graph(namespace)
+        if graph is not None:
+            top, scores = graph.search(matrix, query, top_k, live, ef)
+            return SimpleNamespace(matches=self._matches(namespace, top, scores, include_metadata))
+
+        scores = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), QUERY_BLOCK_ROWS):
+            block = matrix[start:start + QUERY_BLOCK_ROWS]
+            scores[start:start + len(block)] = block @ query
+        scores[live == 0] = -np.inf
+
+        k = min(top_k, int(np.count_nonzero(live)))
+        if k <= 0:
+            return SimpleNamespace(matches=[])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return SimpleNamespace(matches=self._matches(namespace, top, scores[top], include_metadata))
+
+    def _matches(self, namespace, slots, scores, include_metadata):
+        conn = self._connect(namespace)
+        try:
+            matches = []
+            for slot, score in zip(slots, scores):
+                row = conn.execute('SELECT id, metadata FROM vectors WHERE slot = ?', (int(slot),)).fetchone()
+                if not row:
+                    continue
+                matches.append(SimpleNamespace(
+                    id=row[0],
+                    score=float(score),
+                    metadata=json.loads(row[1]) if include_metadata and row[1] else {}
+                ))
+            return matches
+        finally:
+            conn.close()
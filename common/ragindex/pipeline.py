@@ -0,0 +1,263 @@
+import asyncio
+import time
+from django.conf import settings
+from common.utils import prepare_file_contents
+from common.llm.embeddings import count_tokens
+from common.ragindex.chunking import chunk_file
+from common.ragindex.upsert import vector_bytes, latency_summary
+
+_DONE = object()
+
+# attempts per upsert batch, with exponential backoff between them
+UPSERT_ATTEMPTS = 3
+UPSERT_BACKOFF_SECONDS = 1.0
+
+
+def first_error(error):
+    """
+    Return the first exception inside nested exception groups, so a failed
+    pipeline reports the error itself rather than "unhandled errors in a
+    TaskGroup".
+    """
+    while isinstance(error, BaseExceptionGroup):
+        error = error.exceptions[0]
+    return error
+
+
+class PipelineStats:
+    """
+    Counters and per-stage timings for a vectorize pipeline run, reported to
+    the progress callback after every unit of work. Stage seconds are summed
+    across a stage's workers. Files that could not be fetched, or that have
+    chunks that could not be embedded, are recorded in failures.
+    """
+
+    def __init__(self, files_total, progress=None):
+        self.files_total = files_total
+        self.files_fetched = 0
+        self.failures = {}
+        self.files_processed = 0
+        self.chunks_embedded = 0
+        self.vectors_upserted = 0
+        self.upsert_batches = 0
+        self.upsert_bytes = 0
+        self.upsert_latencies = []
+        self.seconds = {'fetch': 0.0, 'embed': 0.0, 'upsert': 0.0}
+        self.started = time.perf_counter()
+        self.progress = progress
+
+    @property
+    def files_failed(self):
+        return len(self.failures)
+
+    def fail(self, path, error):
+        """
+        Record that a file failed, keeping its first error.
+        """
+        self.failures.setdefault(path, error)
+
+    def report(self, stage):
+        if self.progress:
+            self.progress({'stage': stage, **self.as_dict()})
+
+    def as_dict(self):
+        return {
+            'files_total': self.files_total,
+            'files_fetched': self.files_fetched,
+            'files_failed': self.files_failed,
+            'files_processed': self.files_processed,
+            'chunks_embedded': self.chunks_embedded,
+            'vectors_upserted': self.vectors_upserted,
+            'upsert_batches': self.upsert_batches,
+            'upsert_bytes': self.upsert_bytes,
+            'upsert_latency': latency_summary(self.upsert_latencies),
+            'stage_seconds': {k: round(v, 3) for k, v in self.seconds.items()},
+            'elapsed_seconds': round(time.perf_counter() - self.started, 3)
+        }
+
+
+async def run_pipeline(file_infos, fetch, embedder, upsert, make_vector,
+                       progress=None, counts=None, fetch_concurrency=None,
+                       embed_concurrency=None, upsert_concurrency=None,
+                       queue_size=None, upsert_max_bytes=None, upsert_max_items=None):
+    """
+    Stream files through fetch -> chunk -> embed -> upsert stages.
+
+    Stages are connected by bounded queues, so a slow stage applies
+    backpressure to the ones before it and memory use does not grow with the
+    size of the repository. Blocking work (HTTP, git, OpenAI, Pinecone) runs in
+    worker threads.
+
+    Failures are contained to the files they affect: a file that cannot be
+    fetched, a chunk that cannot be embedded, or an upsert batch that still
+    fails after UPSERT_ATTEMPTS tries marks its files as failed in the stats,
+    and the run continues.
+
+    Args:
+        file_infos (list): File entries to vectorize
+        fetch (callable): fetch(file_info) -> content, may raise
+        embedder (BatchEmbedder): Embeds chunk texts
+        upsert (callable): upsert(vectors) writes one batch of vectors
+        make_vector (callable): make_vector(file, chunk, embedding) -> vector dict
+        progress (callable, optional): Called with a dict of counters after
+                                       each unit of work
+        counts (EmbeddingCounts, optional): Counts this run's embedding
+                                            requests and cache use
+        fetch_concurrency, embed_concurrency, upsert_concurrency (int, optional):
+            Workers per stage, defaulting to the VECTORIZE_* settings
+        queue_size (int, optional): Capacity of each queue between stages
+        upsert_max_bytes, upsert_max_items (int, optional): Bounds on the
+            estimated serialized size and vector count of each upsert request,
+            defaulting to the PINECONE_UPSERT_* settings
+
+    Returns:
+        tuple: (vector_ids, stats)
+
+    Raises:
+        Exception: The first error of a stage that failed outright
+    """
+    fetch_concurrency = int(fetch_concurrency or settings.VECTORIZE_FETCH_CONCURRENCY)
+    embed_concurrency = int(embed_concurrency or settings.VECTORIZE_EMBED_CONCURRENCY)
+    upsert_concurrency = int(upsert_concurrency or settings.VECTORIZE_UPSERT_CONCURRENCY)
+    queue_size = int(queue_size or settings.VECTORIZE_QUEUE_SIZE)
+    upsert_max_bytes = int(upsert_max_bytes or settings.PINECONE_UPSERT_MAX_BYTES)
+    upsert_max_items = int(upsert_max_items or settings.PINECONE_UPSERT_MAX_VECTORS)
+
+    stats = PipelineStats(len(file_infos), progress)
+    vector_ids = []
+
+    files = asyncio.Queue()
+    for file_info in file_infos:
+        files.put_nowait(file_info)
+    for _ in range(fetch_concurrency):
+        files.put_nowait(_DONE)
+    chunks = asyncio.Queue(maxsize=queue_size)
+    vectors = asyncio.Queue(maxsize=queue_size)
+
+    def load(file_info):
+        # fetch and chunk in a worker thread to keep the event loop free
+        prepared = prepare_file_contents(file_info, fetch(file_info))
+        if not prepared:
+            return None, []
+        return prepared, chunk_file(prepared['path'], prepared['content'])
+
+    async def fetch_worker():
+        while (file_info := await files.get()) is not _DONE:
+            start = time.perf_counter()
+            try:
+                prepared, file_chunks = await asyncio.to_thread(load, file_info)
+            except Exception as e:
+                # Log the error but continue processing other files
+                print(f'Error processing {file_info["name"]}: {str(e)}')
+                stats.fail(file_info['path'], str(e))
+                continue
+            finally:
+                stats.seconds['fetch'] += time.perf_counter() - start
+            stats.files_fetched += 1
+            if file_chunks:
+                stats.files_processed += 1
+                # drop the full file text; chunks carry what is needed
+                prepared.pop('content', None)
+            for number, chunk in enumerate(file_chunks):
+                chunk['chunk'] = number
+                chunk['file'] = prepared
+                await chunks.put(chunk)
+            stats.report('fetch')
+
+    async def embed_worker():
+        done = False
+        while not done:
+            # gather a batch: wait for one chunk, then take what is ready
+            batch, tokens = [], 0
+            item = await chunks.get()
+            while True:
+                if item is _DONE:
+                    done = True
+                    break
+                batch.append(item)
+                tokens += count_tokens(item['text'], embedder.model)
+                if len(batch) >= embedder.max_batch_items or tokens >= embedder.max_batch_tokens:
+                    break
+                try:
+                    item = chunks.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+            if not batch:
+                continue
+            start = time.perf_counter()
+            try:
+                embeddings, errors = await asyncio.to_thread(
+                    embedder.embed_partial, [c['text'] for c in batch], counts)
+            except Exception as e:
+                embeddings, errors = [None] * len(batch), dict.fromkeys(range(len(batch)), str(e))
+            stats.seconds['embed'] += time.perf_counter() - start
+            stats.chunks_embedded += len(batch) - len(errors)
+            for i, (chunk, embedding) in enumerate(zip(batch, embeddings)):
+                if embedding is None:
+                    path = chunk['file']['path']
+                    if path not in stats.failures:
+                        print(f'Error embedding {path}: {errors[i]}')
+                    stats.fail(path, errors[i])
+                    continue
+                vector = make_vector(chunk['file'], chunk, embedding)
+                await vectors.put((chunk['file']['path'], vector))
+            stats.report('embed')
+
+    async def send(batch, batch_bytes):
+        vectors_batch = [vector for _, vector in batch]
+        for attempt in range(UPSERT_ATTEMPTS):
+            start = time.perf_counter()
+            try:
+                await asyncio.to_thread(upsert, vectors_batch)
+                error = None
+            except Exception as e:
+                error = e
+            latency = time.perf_counter() - start
+            stats.seconds['upsert'] += latency
+            if error is None:
+                break
+            if attempt + 1 < UPSERT_ATTEMPTS:
+                await asyncio.sleep(UPSERT_BACKOFF_SECONDS * 2 ** attempt)
+        if error is not None:
+            print(f'Error upserting {len(batch)} vectors: {str(error)}')
+            for path, _ in batch:
+                stats.fail(path, str(error))
+            stats.report('upsert')
+            return
+        stats.upsert_latencies.append(latency)
+        stats.vectors_upserted += len(batch)
+        stats.upsert_batches += 1
+        stats.upsert_bytes += batch_bytes
+        vector_ids.extend(vector['id'] for vector in vectors_batch)
+        stats.report('upsert')
+
+    async def upsert_worker():
+        # size batches by serialized bytes so large metadata stays under the
+        # request limit; several workers keep batches in flight in parallel
+        batch, batch_bytes = [], 0
+        while (item := await vectors.get()) is not _DONE:
+            size = vector_bytes(item[1])
+            if batch and (batch_bytes + size > upsert_max_bytes or len(batch) >= upsert_max_items):
+                await send(batch, batch_bytes)
+                batch, batch_bytes = [], 0
+            batch.append(item)
+            batch_bytes += size
+        if batch:
+            await send(batch, batch_bytes)
+
+    async def stage(workers, count, downstream, downstream_count):
+        async with asyncio.TaskGroup() as group:
+            for _ in range(count):
+                group.create_task(workers())
+        for _ in range(downstream_count):
+            await downstream.put(_DONE)
+
+    try:
+        async with asyncio.TaskGroup() as group:
+            group.create_task(stage(fetch_worker, fetch_concurrency, chunks, embed_concurrency))
+            group.create_task(stage(embed_worker, embed_concurrency, vectors, upsert_concurrency))
+            group.create_task(stage(upsert_worker, upsert_concurrency, None, 0))
+    except BaseExceptionGroup as group:
+        raise first_error(group) from group
+
+    return vector_ids, stats
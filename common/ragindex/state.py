@@ -0,0 +1,78 @@
+import os
+import sqlite3
+import threading
+import time
+from django.conf import settings
+
+_lock = threading.Lock()
+
+
+def _connect():
+    os.makedirs(settings.CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(settings.RAGINDEX_STATE_PATH)
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS namespaces ('
+        ' namespace TEXT PRIMARY KEY,'
+        ' commit_sha TEXT,'
+        ' source TEXT,'
+        ' indexed_at REAL)'
+    )
+    return conn
+
+
+def get_index_state(namespace):
+    """
+    Return what is recorded about the last indexing of a namespace.
+
+    Returns:
+        dict or None:
+            {
+                'namespace': 'owner/repo/branch',
+                'commit': '<commit sha>',
+                'source': 'github' or 'clone',
+                'indexed_at': <unix timestamp>
+            }
+    """
+    with _lock:
+        conn = _connect()
+        try:
+            row = conn.execute(
+                'SELECT namespace, commit_sha, source, indexed_at '
+                'FROM namespaces WHERE namespace = ?',
+                (namespace,)
+            ).fetchone()
+        finally:
+            conn.close()
+    if not row:
+        return None
+    return dict(zip(['namespace', 'commit', 'source', 'indexed_at'], row))
+
+
+def set_index_state(namespace, commit, source):
+    """
+    Record the commit a namespace was indexed at.
+    """
+    with _lock:
+        conn = _connect()
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO namespaces '
+                '(namespace, commit_sha, source, indexed_at) VALUES (?, ?, ?, ?)',
+                (namespace, commit, source, time.time())
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def delete_index_state(namespace):
+    """
+    Forget a namespace's indexing state.
+    """
+    with _lock:
+        conn = _connect()
+        try:
+            conn.execute('DELETE FROM namespaces WHERE namespace = ?', (namespace,))
+            conn.commit()
+        finally:
+            conn.close()
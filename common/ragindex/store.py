@@ -0,0 +1,116 @@
+import asyncio
+import threading
+from typing import Any
+from django.conf import settings
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from common.clients import get_pinecone_index, get_pinecone_data_plane, get_pinecone_vector_store
+
+VECTOR_BACKENDS = ['pinecone', 'local']
+
+_local_index = None
+_local_index_lock = threading.Lock()
+
+
+def local_index():
+    """
+    Return the process-wide LocalIndex rooted at settings.LOCAL_VECTOR_DIR.
+    """
+    global _local_index
+    with _local_index_lock:
+        if _local_index is None:
+            from common.ragindex.local_store import LocalIndex
+            _local_index = LocalIndex(
+                settings.LOCAL_VECTOR_DIR,
+                settings.EMBEDDING_DIMENSIONS,
+                hnsw_threshold=settings.LOCAL_HNSW_THRESHOLD,
+                hnsw_params={
+                    'M': settings.LOCAL_HNSW_M,
+                    'ef_construction': settings.LOCAL_HNSW_EF_CONSTRUCTION,
+                    'ef_search': settings.LOCAL_HNSW_EF_SEARCH
+                }
+            )
+        return _local_index
+
+
+def vector_index(data_plane=False):
+    """
+    Return the vector index for the configured VECTOR_BACKEND.
+
+    Both backends expose the same index interface (upsert, delete, list,
+    describe_index_stats, query), so callers do not need to know which one
+    is in use.
+
+    Args:
+        data_plane (bool): For Pinecone, return the client used for bulk
+                           upserts and deletes (gRPC when enabled)
+
+    Raises:
+        ValueError: If VECTOR_BACKEND is not a known backend
+    """
+    if settings.VECTOR_BACKEND not in VECTOR_BACKENDS:
+        raise ValueError(f'Invalid vector backend: {settings.VECTOR_BACKEND}')
+    if settings.VECTOR_BACKEND == 'local':
+        return local_index()
+    if data_plane:
+        return get_pinecone_data_plane()
+    return get_pinecone_index()
+
+
+class LocalRetriever(BaseRetriever):
+    """
+    Retriever over a LocalIndex namespace, returning documents shaped like
+    PineconeVectorStore's: the 'text' metadata field as page content and the
+    remaining metadata as document metadata.
+    """
+    index: Any
+    embeddings: Any
+    namespace: str
+    k: int = 4
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return self._documents(self._query(self.embeddings.embed_query(query)))
+
+    async def _aget_relevant_documents(self, query, *, run_manager=None):
+        vector = await self.embeddings.aembed_query(query)
+        return self._documents(await asyncio.to_thread(self._query, vector))
+
+    def _query(self, vector):
+        return self.index.query(
+            vector=vector,
+            top_k=self.k,
+            namespace=self.namespace,
+            include_metadata=True
+        )
+
+    @staticmethod
+    def _documents(result):
+        documents = []
+        for match in result.matches:
+            metadata = dict(match.metadata)
+            text = metadata.pop('text', '')
+            documents.append(Document(page_content=text, metadata=metadata))
+        return documents
+
+
+def vector_retriever(namespace, embeddings, k=3):
+    """
+    Return a LangChain retriever over a repository namespace for the
+    configured VECTOR_BACKEND.
+
+    Args:
+        namespace (str): Repository namespace 'owner/repo/branch'
+        embeddings (Embeddings): Used to embed the query
+        k (int): Number of documents to retrieve
+    """
+    if settings.VECTOR_BACKEND == 'local':
+        return LocalRetriever(index=local_index(), embeddings=embeddings,
+                              namespace=namespace, k=k)
+
+    docsearch = get_pinecone_vector_store(namespace, embeddings)
+    return docsearch.as_retriever(
+        search_kwargs={
+            'k': k,
+            'namespace': namespace
+        }
+    )
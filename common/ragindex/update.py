@@ -0,0 +1,148 @@
+import os
+from django.conf import settings
+from common.utils import parse_repository_string, is_vectorizable_file
+from common.github import compare_github_commits
+from common.clone.tree import diff_clone_commits
+from common.ragindex.state import get_index_state, set_index_state
+from common.ragindex.catalog import get_catalog
+from common.ragindex.lexical import refresh_lexical_index
+from common.ragindex.vectorize import (
+    VECTORIZE_SOURCES, head_commit, list_files, vectorize_files, vectorize_repository,
+    delete_file_vectors
+)
+
+def update_repository(repository, source='github', progress=None):
+    """
+    Bring a vectorized repository up to date with its branch head.
+
+    The commit recorded at the last vectorize or update is diffed against the
+    current branch head. Added and modified files are re-chunked, re-embedded
+    and upserted, and chunk vectors for removed files are deleted. If no commit is recorded, or the
+    diff is unavailable (e.g. history was rewritten), the whole repository is
+    vectorized instead. Changed files that fail to fetch, embed or upsert
+    keep their previous vectors, and the new commit is then not recorded,
+    so the next update processes them again. A lexical index is refreshed
+    whenever a new commit is recorded, as for vectorize.
+
+    Args:
+        repository (str): Repository string in format 'owner/repo/branch'
+                        (branch is optional, defaults to 'main')
+        source (str): 'github' (default) or 'clone', as for vectorize
+        progress (callable, optional): Pipeline progress callback, as for vectorize
+
+    Returns:
+        dict: A dictionary containing:
+            - On success:
+                {
+                    'status': 'success',
+                    'mode': 'incremental', 'full' or 'up-to-date',
+                    'owner': <owner>,
+                    'repo': <repo>,
+                    'branch': <branch>,
+                    'source': <source>,
+                    'previous_commit': <commit_sha>,
+                    'commit': <commit_sha>,
+                    'processed_files': <number_of_files_upserted>,
+                    'deleted_files': <number_of_files_removed>,
+                    'vectors': <number_of_chunk_vectors_upserted>,
+                    'deleted_vectors': <number_of_chunk_vectors_deleted>,
+                    'embedding_requests': <number_of_embedding_api_calls>,
+                    'embedding_cache_hits': <chunks_served_from_cache>,
+                    'embedding_cache_misses': <chunks_embedded>,
+                    'failed_files': [<paths that could not be fetched, embedded or upserted>],
+                    'commit_recorded': <False when files failed>,
+                    'lexical_index': <'rebuilt', 'deleted' or None>
+                }
+            - On error:
+                {
+                    'error': <error_message>
+                }
+    """
+    owner, repo, branch = parse_repository_string(repository)
+    namespace = f'{owner}/{repo}/{branch}'
+
+    if source not in VECTORIZE_SOURCES:
+        return {'error': f'Invalid source: {source}'}
+
+    state = get_index_state(namespace)
+    if not state or not state['commit']:
+        result = vectorize_repository(repository, source, progress)
+        if 'error' not in result:
+            result['mode'] = 'full'
+        return result
+
+    try:
+        commit = head_commit(repository, source)
+        summary = {
+            'status': 'success',
+            'mode': 'up-to-date',
+            'owner': owner,
+            'repo': repo,
+            'branch': branch,
+            'source': source,
+            'previous_commit': state['commit'],
+            'commit': commit,
+            'processed_files': 0,
+            'deleted_files': 0,
+            'vectors': 0,
+            'deleted_vectors': 0,
+            'embedding_requests': 0,
+            'embedding_cache_hits': 0,
+            'embedding_cache_misses': 0,
+            'failed_files': [],
+            'commit_recorded': True,
+            'lexical_index': None
+        }
+        if commit == state['commit']:
+            return summary
+
+        if source == 'clone':
+            changes = diff_clone_commits(repository, state['commit'], commit)
+        else:
+            changes = compare_github_commits(owner, repo, state['commit'], commit)
+
+        if changes is None:
+            result = vectorize_repository(repository, source, progress)
+            if 'error' not in result:
+                result['mode'] = 'full'
+                result['previous_commit'] = state['commit']
+            return result
+
+        changed, removed = changes
+        changed = set(changed)
+        contents = [file_info for file_info in list_files(repository, source, commit)
+                    if file_info['path'] in changed]
+        vector_ids, counts, stats = vectorize_files(repository, source, contents, progress)
+
+        # drop chunks of changed files that no longer exist (files that shrank
+        # or no longer produce a vector) and every chunk of removed files
+        removed = [path for path in removed if is_vectorizable_file(
+            {'type': 'file', 'name': os.path.basename(path)})]
+        changed_paths = [file_info['path'] for file_info in contents
+                         if is_vectorizable_file(file_info) and file_info['path'] not in stats.failures]
+        deleted_vectors = delete_file_vectors(namespace, changed_paths + removed, vector_ids)
+
+        lexical_index = None
+        if not stats.failures:
+            set_index_state(namespace, commit, source)
+            lexical_index = refresh_lexical_index(repository, commit)
+        get_catalog().record(namespace)
+
+        summary.update({
+            'mode': 'incremental',
+            'processed_files': stats.files_processed,
+            'deleted_files': len(removed),
+            'vectors': len(vector_ids),
+            'deleted_vectors': deleted_vectors,
+            'embedding_requests': counts.requests,
+            'embedding_cache_hits': counts.cache_hits,
+            'embedding_cache_misses': counts.cache_misses,
+            'failed_files': sorted(stats.failures),
+            'commit_recorded': not stats.failures,
+            'lexical_index': lexical_index,
+            'pipeline': stats.as_dict()
+        })
+        return summary
+
+    except Exception as e:
+        return {'error': str(e)}
@@ -0,0 +1,34 @@
+import json
+
+# fixed per-vector protobuf overhead (id/values/metadata field tags and lengths)
+VECTOR_OVERHEAD_BYTES = 32
+
+
+def vector_bytes(vector):
+    """
+    Estimate the serialized size of a vector in an upsert request: 4 bytes
+    per float32 value plus the id and JSON-encoded metadata.
+    """
+    metadata = vector.get('metadata')
+    metadata_bytes = len(json.dumps(metadata, separators=(',', ':')).encode('utf-8')) if metadata else 0
+    return (VECTOR_OVERHEAD_BYTES + 4 * len(vector['values']) +
+            len(vector['id'].encode('utf-8')) + metadata_bytes)
+
+
+def latency_summary(latencies):
+    """
+    Summarize per-batch upsert latencies in milliseconds.
+    """
+    if not latencies:
+        return {'batches': 0}
+    ordered = sorted(latencies)
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 1)
+    return {
+        'batches': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 1),
+        'p50_ms': percentile(0.5),
+        'p95_ms': percentile(0.95),
+        'max_ms': round(ordered[-1] * 1000, 1)
+    }
+
@@ -1,17 +1,177 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
-from common.utils import parse_repository_string, process_file_contents, get_github_contents
-from pinecone import Pinecone
+from common.utils import parse_repository_string, is_vectorizable_file
+from common.github import list_github_tree, download_file_content, get_github_commit
+from common.clone.tree import list_clone_tree, clone_file_reader, clone_head_commit
+from common.llm.embeddings import EmbeddingCounts, get_embedder
+from common.ragindex.state import set_index_state
+from common.ragindex.catalog import get_catalog
+from common.ragindex.lexical import refresh_lexical_index
+from common.ragindex.pipeline import run_pipeline
+from common.ragindex.store import vector_index
 
-pc = Pinecone(api_key=settings.PINECONE_API_KEY)
-index = pc.Index(settings.PINECONE_INDEX)
+VECTORIZE_SOURCES = ['github', 'clone']
 
-def vectorize_repository(repository):
+def head_commit(repository, source):
     """
-    Vectorize a GitHub repository's contents and store in Pinecone.
+    Resolve the commit at the branch head for the given source.
+    """
+    owner, repo, branch = parse_repository_string(repository)
+    if source == 'clone':
+        return clone_head_commit(repository)
+    return get_github_commit(owner, repo, branch)
+
+def list_files(repository, source, commit):
+    """
+    List every file in the repository at a commit.
+    """
+    owner, repo, branch = parse_repository_string(repository)
+    if source == 'clone':
+        return list_clone_tree(repository, commit)
+    return list_github_tree(owner, repo, commit)
+
+def file_fetcher(repository, source):
+    """
+    Return a function that reads one file entry's content from the source.
+    """
+    if source == 'clone':
+        return clone_file_reader(repository)
+    return download_file_content
+
+def chunk_vector_id(namespace, path, chunk):
+    return f'{namespace}/{path}#{chunk}'
+
+async def avectorize_files(repository, source, file_infos, progress=None):
+    """
+    Stream files through the fetch, chunk, embed and upsert pipeline into the
+    repository namespace (see common.ragindex.pipeline).
+
+    Each file is split into chunks (see common.ragindex.chunking) and every
+    chunk becomes one vector with id 'owner/repo/branch/path#n', carrying the
+    file path and line range in its metadata.
+
+    Args:
+        repository (str): Repository string in format 'owner/repo/branch'
+        source (str): 'github' or 'clone'
+        file_infos (list): File entries to vectorize
+        progress (callable, optional): Called with pipeline counters as work
+                                       completes
+
+    Returns:
+        tuple: (vector_ids, counts, stats) where vector_ids are the ids
+               written, counts is the run's EmbeddingCounts and stats is the
+               pipeline's PipelineStats, with the files that failed
+    """
+    owner, repo, branch = parse_repository_string(repository)
+    namespace = f'{owner}/{repo}/{branch}'
+    candidates = [file_info for file_info in file_infos if is_vectorizable_file(file_info)]
+
+    # embed with as few batched requests as possible through the shared
+    # embedder, skipping unchanged content already in the embedding cache,
+    # and count the requests made for this run
+    counts = EmbeddingCounts()
+
+    def make_vector(file, chunk, embedding):
+        return {
+            'id': chunk_vector_id(namespace, file['path'], chunk['chunk']),
+            'values': embedding,
+            'metadata': {
+                'file_name': file['file_name'],
+                'path': file['path'],
+                'chunk': chunk['chunk'],
+                'start_line': chunk['start_line'],
+                'end_line': chunk['end_line'],
+                'owner': owner,
+                'repo': repo,
+                'branch': branch,
+                'download_url': file['download_url'],
+                'text': chunk['text']
+            }
+        }
+
+    index = vector_index(data_plane=True)
+
+    def upsert(batch):
+        index.upsert(vectors=batch, namespace=namespace)
+
+    vector_ids, stats = await run_pipeline(
+        candidates,
+        file_fetcher(repository, source),
+        get_embedder(),
+        upsert,
+        make_vector,
+        progress=progress,
+        counts=counts
+    )
+    return vector_ids, counts, stats
+
+def vectorize_files(repository, source, file_infos, progress=None):
+    """
+    Synchronous entry point for avectorize_files. Called from a thread that
+    is already running an event loop, the pipeline runs on its own loop in a
+    separate thread.
+    """
+    coroutine = avectorize_files(repository, source, file_infos, progress)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='vectorize') as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+def delete_prefixed_vectors(namespace, prefixes, keep_ids=(), keep_prefixes=()):
+    """
+    Delete every vector whose id starts with one of the prefixes, except ids
+    in keep_ids and ids starting with one of keep_prefixes.
+
+    Returns:
+        int: Number of vectors deleted
+    """
+    index = vector_index(data_plane=True)
+    keep_ids = set(keep_ids)
+    keep_prefixes = tuple(keep_prefixes)
+    doomed = []
+    for prefix in prefixes:
+        for ids in index.list(prefix=prefix, namespace=namespace):
+            doomed.extend(i for i in ids
+                          if i not in keep_ids and not (keep_prefixes and i.startswith(keep_prefixes)))
+
+    batch_size = 1000
+    for i in range(0, len(doomed), batch_size):
+        index.delete(ids=doomed[i:i + batch_size], namespace=namespace)
+    return len(doomed)
+
+def delete_file_vectors(namespace, paths, keep_ids=()):
+    """
+    Delete every chunk vector of the given files, except ids in keep_ids.
+    """
+    return delete_prefixed_vectors(
+        namespace, [f'{namespace}/{path}#' for path in paths], keep_ids)
+
+def vectorize_repository(repository, source='github', progress=None):
+    """
+    Vectorize a GitHub repository's contents and store them in the vector index
+    (Pinecone, or the local store when VECTOR_BACKEND is 'local').
+
+    The commit that was indexed is recorded so that later updates only need
+    to process files changed since (see common.ragindex.update). Files that
+    fail to fetch, embed or upsert keep the vectors they already had, and
+    the commit is then not recorded, so the index is not marked current
+    while those files may be stale. A lexical index of the repository is
+    refreshed to match once the commit is recorded (see
+    common.ragindex.lexical.refresh_lexical_index).
 
     Args:
         repository (str): Repository string in format 'owner/repo/branch'
                         (branch is optional, defaults to 'main')
+        source (str): Where file contents are read from:
+                        'github' - the GitHub API (default)
+                        'clone'  - the local clone's object database at the
+                                   branch head, with no network reads
+        progress (callable, optional): Called with a dict of pipeline counters
+                                       as files are fetched, embedded and
+                                       upserted
 
     Returns:
         dict: A dictionary containing:
@@ -19,9 +179,20 @@ def vectorize_repository(repository):
                 {
                     'status': 'success',
                     'processed_files': <number_of_files>,
+                    'vectors': <number_of_chunk_vectors>,
+                    'deleted_vectors': <number_of_stale_vectors_removed>,
                     'owner': <owner>,
                     'repo': <repo>,
-                    'branch': <branch>
+                    'branch': <branch>,
+                    'source': <source>,
+                    'commit': <indexed_commit_sha>,
+                    'embedding_requests': <number_of_embedding_api_calls>,
+                    'embedding_cache_hits': <chunks_served_from_cache>,
+                    'embedding_cache_misses': <chunks_embedded>,
+                    'failed_files': [<paths that could not be fetched, embedded or upserted>],
+                    'commit_recorded': <False when files failed>,
+                    'lexical_index': <'rebuilt', 'deleted' or None>,
+                    'pipeline': <counters and per-stage seconds>
                 }
             - On error:
                 {
@@ -35,50 +206,58 @@ def vectorize_repository(repository):
     """
     owner, repo, branch = parse_repository_string(repository)
 
+    if source not in VECTORIZE_SOURCES:
+        return {'error': f'Invalid source: {source}'}
+
     try:
-        contents = get_github_contents(owner, repo, branch)
-        vectorized_files = []
-
-        for file_info in contents:
-            try:
-                result = process_file_contents(file_info)
-                if result:
-                    vectorized_files.append(result)
-            except Exception as e:
-                # Log the error but continue processing other files
-                print(f'Error processing {file_info["name"]}: {str(e)}')
-
-        if not vectorized_files:
+        commit = head_commit(repository, source)
+        contents = list_files(repository, source, commit)
+        vector_ids, counts, stats = vectorize_files(repository, source, contents, progress)
+
+        if not vector_ids and stats.failures:
+            path, error = next(iter(sorted(stats.failures.items())))
+            return {
+                'error': f'Failed to vectorize {len(stats.failures)} files, '
+                         f'first error in {path}: {error}',
+                'failed_files': sorted(stats.failures)
+            }
+        if not vector_ids:
             return {
                 'error': f'No valid files to process in repository: {owner}/{repo}/{branch}',
                 'github_contents': contents
             }
 
+        # remove vectors of files that no longer exist or have fewer chunks,
+        # keeping those of files that failed in this run
         namespace = f'{owner}/{repo}/{branch}'
-        vectors_to_upsert = [{
-            'id': f'{namespace}/{file["file_name"]}',
-            'values': file['embedding'],
-            'metadata': {
-                'file_name': file['file_name'],
-                'owner': owner,
-                'repo': repo,
-                'branch': branch,
-                'download_url': file['download_url'],
-                'text': file['content']
-            }
-        } for file in vectorized_files]
-
-        batch_size = 100
-        for i in range(0, len(vectors_to_upsert), batch_size):
-            batch = vectors_to_upsert[i:i + batch_size]
-            index.upsert(vectors=batch, namespace=namespace)
+        deleted_vectors = delete_prefixed_vectors(
+            namespace, [f'{namespace}/'], vector_ids,
+            keep_prefixes=[chunk_vector_id(namespace, path, '') for path in stats.failures]
+        )
+        lexical_index = None
+        if not stats.failures:
+            set_index_state(namespace, commit, source)
+            lexical_index = refresh_lexical_index(repository, commit)
+        # kept vectors of failed files are not counted in this run
+        get_catalog().record(namespace, None if stats.failures else len(vector_ids))
 
         return {
             'status': 'success',
-            'processed_files': len(vectorized_files),
+            'processed_files': stats.files_processed,
+            'vectors': len(vector_ids),
+            'deleted_vectors': deleted_vectors,
             'owner': owner,
             'repo': repo,
-            'branch': branch
+            'branch': branch,
+            'source': source,
+            'commit': commit,
+            'embedding_requests': counts.requests,
+            'embedding_cache_hits': counts.cache_hits,
+            'embedding_cache_misses': counts.cache_misses,
+            'failed_files': sorted(stats.failures),
+            'commit_recorded': not stats.failures,
+            'lexical_index': lexical_index,
+            'pipeline': stats.as_dict()
         }
 
     except Exception as e:
@@ -1,7 +1,5 @@
 from django.conf import settings
-from pinecone import Pinecone
-
-pc = Pinecone(api_key=settings.PINECONE_API_KEY)
+from common.clients import get_pinecone
 
 def new_index():
     """
@@ -15,11 +13,18 @@ def new_index():
     Raises:
         Exception: If there's an error accessing the database
     """
-    from pinecone.grpc import PineconeGRPC as Pinecone
     from pinecone import ServerlessSpec
 
+    if settings.VECTOR_BACKEND == 'local':
+        # local namespaces are created on first upsert
+        return {
+            "name": settings.LOCAL_VECTOR_DIR,
+            "dimension": int(settings.EMBEDDING_DIMENSIONS),
+            "metric": "cosine"
+        }
+
     try:
-        pc.create_index(
+        get_pinecone().create_index(
             name=settings.PINECONE_INDEX,
             dimension=int(settings.EMBEDDING_DIMENSIONS),
             metric="cosine",
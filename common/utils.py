@@ -1,10 +1,9 @@
 from django.conf import settings
 import requests
-from openai import OpenAI
 
 
 def get_github_contents(owner, repo, branch='main', path=''):
-    api_url = f'https://api.github.com/repos/{owner}/{repo}/contents/{path}?ref={branch}'
+    api_url = f'{settings.GITHUB_API_URL}/repos/{owner}/{repo}/contents/{path}?ref={branch}'
     headers = {}
     if settings.GITHUB_TOKEN:
         headers['Authorization'] = f"Token {settings.GITHUB_TOKEN}"
@@ -26,44 +25,64 @@ def get_github_contents(owner, repo, branch='main', path=''):
             all_contents.append(item)
     return all_contents
 
-def process_file_contents(file_info):
+def is_vectorizable_file(file_info):
+    """
+    Return True if a GitHub file entry should be embedded for RAG.
+    """
     if file_info['type'] != 'file':
-        return None
+        return False
 
     valid_extensions = ['.md', '.py']
 
-    if not any(file_info['name'].endswith(ext) for ext in valid_extensions):
-        return None
-
-    response = requests.get(file_info['download_url'])
-    if response.status_code != 200:
-        raise Exception(f'Error fetching file content: {response.status_code}')
+    return any(file_info['name'].endswith(ext) for ext in valid_extensions)
 
-    content = response.text
-    truncated_content = content[:80000].strip()
+def prepare_file_contents(file_info, content=None):
+    """
+    Validate a single file for embedding. If content is not supplied it is
+    downloaded from the file's download_url.
 
-    if not truncated_content:
+    Returns None if the file should not be embedded, otherwise a dict with
+    file_name, path, content and download_url.
+    """
+    if not is_vectorizable_file(file_info):
         return None
-    try:
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
-    except Exception as e:
-        raise Exception(f'OpenAI Instantiation error: {str(e)}')
 
+    if content is None:
+        response = requests.get(file_info['download_url'])
+        if response.status_code != 200:
+            raise Exception(f'Error fetching file content: {response.status_code}')
+        content = response.text
 
-    embedding_response = client.embeddings.create(input=truncated_content,
-    model='text-embedding-ada-002')
-    embedding = embedding_response.data[0].embedding
+    content = content.strip()
 
-    if len(embedding) != 1536:
-        raise ValueError(f'Unexpected embedding dimension: {len(embedding)}')
+    if not content:
+        return None
 
     return {
         'file_name': file_info['name'],
-        'content': truncated_content,
-        'download_url': file_info['download_url'],
-        'embedding': embedding
+        'path': file_info.get('path', file_info['name']),
+        'content': content,
+        'download_url': file_info['download_url']
     }
 
+def embed_file_contents(prepared_files, embedder=None):
+    """
+    Embed prepared files with batched requests, adding an 'embedding' to each.
+    """
+    from common.llm.embeddings import get_embedder
+
+    embedder = embedder or get_embedder()
+    embeddings = embedder.embed([file['content'] for file in prepared_files])
+    for file, embedding in zip(prepared_files, embeddings):
+        file['embedding'] = embedding
+    return prepared_files
+
+def process_file_contents(file_info, content=None):
+    prepared = prepare_file_contents(file_info, content)
+    if not prepared:
+        return None
+    return embed_file_contents([prepared])[0]
+
 def parse_repository_string(repo_string):
     """
     Parse a repository string in the format '/owner/repo/branch' or 'owner/repo/branch'.
@@ -34,32 +34,102 @@ environ.Env.read_env(os.path.join(BASE_DIR, 'global', '.env'))
 VALID_EXTENSIONS = ['.md', '.py']
 VALID_FILES = ['pyproject.toml', 'poetry.lock','.gitignore']
 CLONE_AI_ENGINEER_DIR="ai-engineer-data"
+CLONE_LIST_SOURCE = env('CLONE_LIST_SOURCE', default='filesystem')
+CLONE_READ_WORKERS = env.int('CLONE_READ_WORKERS', default=8)
+CLONE_FILE_MAX_BYTES = env.int('CLONE_FILE_MAX_BYTES', default=256 * 1024)
+CLONE_MIRRORS = env.bool('CLONE_MIRRORS', default=True)
+
+# local caches
+CACHE_DIR = os.path.expanduser(env('CACHE_DIR', default='~/ai-engineer-cache'))
+CLONE_SNAPSHOT_CACHE = env.bool('CLONE_SNAPSHOT_CACHE', default=False)
+CLONE_SNAPSHOT_PATH = os.path.join(CACHE_DIR, 'snapshots.sqlite3')
+CLONE_SNAPSHOT_MAX_BYTES = env.int('CLONE_SNAPSHOT_MAX_BYTES', default=256 * 1024 * 1024)
 
 # Server configuration
+WARM_UP_CLIENTS = env.bool('WARM_UP_CLIENTS', default=False)
 API_SERVER_PORT = env('API_SERVER_PORT')
 SECRET_KEY = env('DJANGO_SECRET_KEY')
 
+# Background jobs
+JOB_WORKERS = env.int('JOB_WORKERS', default=2)
+JOB_MAX_QUEUED = env.int('JOB_MAX_QUEUED', default=100)
+
 # GitHub configuration
 GITHUB_CLONE_DIR = os.path.expanduser(env('GITHUB_CLONE_DIR'))
 GITHUB_TOKEN = env('GITHUB_TOKEN', default='')
+GITHUB_API_URL = env('GITHUB_API_URL', default='https://api.github.com')
+GITHUB_RAW_URL = env('GITHUB_RAW_URL', default='https://raw.githubusercontent.com')
+GITHUB_CLONE_URL = env('GITHUB_CLONE_URL', default='https://github.com')
+GITHUB_FETCH_WORKERS = env.int('GITHUB_FETCH_WORKERS', default=8)
 
 # OpenAI configuration
 OPENAI_API_KEY = env('OPENAI_API_KEY')
 
 # Pinecone additional settings
-PINECONE_ENVIRONMENT = env('PINECONE_ENVIRONMENT')
-PINECONE_API_KEY = env('PINECONE_API_KEY')
-PINECONE_INDEX = env('PINECONE_INDEX')
+VECTOR_BACKEND = env('VECTOR_BACKEND', default='pinecone')
+LOCAL_VECTOR_DIR = os.path.expanduser(env('LOCAL_VECTOR_DIR', default=os.path.join(CACHE_DIR, 'vectors')))
+LOCAL_HNSW_THRESHOLD = env.int('LOCAL_HNSW_THRESHOLD', default=50000)
+LOCAL_HNSW_M = env.int('LOCAL_HNSW_M', default=16)
+LOCAL_HNSW_EF_CONSTRUCTION = env.int('LOCAL_HNSW_EF_CONSTRUCTION', default=200)
+LOCAL_HNSW_EF_SEARCH = env.int('LOCAL_HNSW_EF_SEARCH', default=64)
+PINECONE_ENVIRONMENT = env('PINECONE_ENVIRONMENT', default='')
+PINECONE_API_KEY = env('PINECONE_API_KEY', default='')
+PINECONE_INDEX = env('PINECONE_INDEX', default='')
 EMBEDDING_DIMENSIONS = env('EMBEDDING_DIMENSIONS')
+PINECONE_GRPC = env.bool('PINECONE_GRPC', default=True)
+PINECONE_UPSERT_MAX_BYTES = env.int('PINECONE_UPSERT_MAX_BYTES', default=1800000)
+PINECONE_UPSERT_MAX_VECTORS = env.int('PINECONE_UPSERT_MAX_VECTORS', default=1000)
+EMBEDDING_MODEL = env('EMBEDDING_MODEL', default='text-embedding-ada-002')
+EMBEDDING_BATCH_TOKENS = env.int('EMBEDDING_BATCH_TOKENS', default=100000)
+EMBEDDING_BATCH_SIZE = env.int('EMBEDDING_BATCH_SIZE', default=512)
+CHUNK_MAX_TOKENS = env.int('CHUNK_MAX_TOKENS', default=512)
+CHUNK_OVERLAP_TOKENS = env.int('CHUNK_OVERLAP_TOKENS', default=64)
+VECTORIZE_FETCH_CONCURRENCY = env.int('VECTORIZE_FETCH_CONCURRENCY', default=GITHUB_FETCH_WORKERS)
+VECTORIZE_EMBED_CONCURRENCY = env.int('VECTORIZE_EMBED_CONCURRENCY', default=2)
+VECTORIZE_UPSERT_CONCURRENCY = env.int('VECTORIZE_UPSERT_CONCURRENCY', default=4)
+VECTORIZE_QUEUE_SIZE = env.int('VECTORIZE_QUEUE_SIZE', default=256)
+RAGINDEX_STATE_PATH = os.path.join(CACHE_DIR, 'ragindex.sqlite3')
+LEXICAL_INDEX_DIR = os.path.join(CACHE_DIR, 'lexical')
+RAGINDEX_CATALOG_TTL = env.int('RAGINDEX_CATALOG_TTL', default=60)
+EMBEDDING_CACHE = env.bool('EMBEDDING_CACHE', default=True)
+EMBEDDING_CACHE_PATH = os.path.join(CACHE_DIR, 'embeddings.sqlite3')
+EMBEDDING_CACHE_MAX_BYTES = env.int('EMBEDDING_CACHE_MAX_BYTES', default=512 * 1024 * 1024)
+QUERY_EMBEDDING_CACHE_SIZE = env.int('QUERY_EMBEDDING_CACHE_SIZE', default=1024)
+# The answer cache returns an earlier answer for a prompt whose embedding is
+# close to an earlier one. It saves LLM calls on repeated questions, but two
+# prompts can be near neighbours and still ask different things ("add" vs
+# "remove" a flag), and get the other's answer. It is off by default; when
+# enabled, keep the threshold high and raise it further if wrong answers are
+# seen. Answers are keyed on the namespace, its index version and the chat
+# and retrieval config, so config changes never serve stale answers.
+ANSWER_CACHE = env.bool('ANSWER_CACHE', default=False)
+ANSWER_CACHE_THRESHOLD = env.float('ANSWER_CACHE_THRESHOLD', default=0.98)
+ANSWER_CACHE_SIZE = env.int('ANSWER_CACHE_SIZE', default=1024)
 
 # LangChain configuration
+RETRIEVAL_PROMPT_FROM_HUB = env.bool('RETRIEVAL_PROMPT_FROM_HUB', default=False)
 LANGCHAIN_TRACING_V2 = env('LANGCHAIN_TRACING_V2')
 LANGCHAIN_ENDPOINT = env('LANGCHAIN_ENDPOINT')
 LANGCHAIN_API_KEY = env('LANGCHAIN_API_KEY')
 LANGCHAIN_PROJECT = env('LANGCHAIN_PROJECT')
 
+# Agent configuration
+AGENT_MODE = env('AGENT_MODE', default='chain')
+AGENT_SHARD_TOKENS = env.int('AGENT_SHARD_TOKENS', default=20000)
+AGENT_MAP_CONCURRENCY = env.int('AGENT_MAP_CONCURRENCY', default=4)
+AGENT_CONTEXT_TOKENS = env.int('AGENT_CONTEXT_TOKENS', default=60000)
+PROMPT_CONTEXT_TOKENS = env.int('PROMPT_CONTEXT_TOKENS', default=8000)
+CONTEXT_FILE_MAX_TOKENS = env.int('CONTEXT_FILE_MAX_TOKENS', default=4000)
+CONTEXT_RECENT_COMMITS = env.int('CONTEXT_RECENT_COMMITS', default=50)
+AGENT_CHECKPOINT_DB = os.path.expanduser(env('AGENT_CHECKPOINT_DB', default=''))
+
 # Tavily configuration
 TAVILY_API_KEY = env('TAVILY_API_KEY')
+RESEARCH_CONCURRENCY = env.int('RESEARCH_CONCURRENCY', default=4)
+RESEARCH_TIMEOUT = env.float('RESEARCH_TIMEOUT', default=20.0)
+RESEARCH_CACHE = env.bool('RESEARCH_CACHE', default=True)
+RESEARCH_CACHE_PATH = os.path.join(CACHE_DIR, 'research.sqlite3')
+RESEARCH_CACHE_TTL = env.int('RESEARCH_CACHE_TTL', default=7 * 24 * 3600)
 
 
 # Django settings
@@ -106,6 +176,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'global.wsgi.application'
+ASGI_APPLICATION = 'global.asgi.application'
 
 DATABASES = {
     'default': {